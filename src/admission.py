@@ -0,0 +1,108 @@
+''' Ограничение параллельных запросов по маршрутам (admission control).
+
+У каждого шаблона пути своё число одновременно выполняемых запросов и своя очередь. Запрос, которому
+не хватило места в очереди или который прождал дольше queue_timeout, сразу получает 503 с Retry-After,
+а не висит в ожидании соединения из пула. Тяжёлые маршруты (радиус, карта) с меньшим лимитом не могут
+занять весь пул, и дешёвые запросы по ID не стоят за ними в одной очереди. '''
+from starlette.routing import BaseRoute, Match
+from typing import Dict, Iterable, List, Tuple
+import asyncio
+import json
+
+
+class _Gate:
+    __slots__ = ("semaphore", "queue", "active", "waiting", "rejected")
+
+    def __init__(self, concurrency: int, queue: int):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.queue = queue
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    async def enter(self, timeout: float) -> bool:
+        if self.semaphore.locked():
+            if self.waiting >= self.queue:
+                self.rejected += 1
+                return False
+
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self.semaphore.acquire(), timeout)
+            except TimeoutError:
+                self.rejected += 1
+                return False
+            finally:
+                self.waiting -= 1
+        else:
+            await self.semaphore.acquire()
+
+        self.active += 1
+        return True
+
+    def leave(self):
+        self.active -= 1
+        self.semaphore.release()
+
+
+class AdmissionMiddleware:
+    ''' routes — маршруты, которые ограничиваются (api.router.routes); limits — шаблон пути -> (параллельно,
+    очередь), остальные маршруты получают default. Маршрут ищется так же, как его найдёт роутер '''
+    gates: Dict[str, _Gate] = {} # последнего созданного экземпляра, для /metrics
+
+    def __init__(
+        self, app, routes: Iterable[BaseRoute], default: Tuple[int, int],
+        limits: Dict[str, Tuple[int, int]] | None = None, queue_timeout: float = 5.0, retry_after: int = 1
+    ):
+        self.app = app
+        self.routes = list(routes)
+        self.queue_timeout = queue_timeout
+        self.retry_after = str(retry_after)
+        limits = limits or {}
+        self.gates = AdmissionMiddleware.gates = {
+            route.path: _Gate(*limits.get(route.path, default)) for route in self.routes if hasattr(route, "path")
+        }
+
+    def _match(self, scope) -> BaseRoute | None:
+        for route in self.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        route = self._match(scope)
+        gate = self.gates.get(route.path) if route is not None else None
+        if gate is None:
+            return await self.app(scope, receive, send)
+
+        if not await gate.enter(self.queue_timeout):
+            # Роутер до этого запроса не дошёл: шаблон пути для метрик ставится здесь
+            scope["route"] = route
+            return await self._reject(send)
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.leave()
+
+    async def _reject(self, send):
+        body = json.dumps({"status": "failed", "message": "Server is busy, retry later"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", self.retry_after.encode())
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    @classmethod
+    def stats(cls) -> List[Tuple[str, int, int, int]]:
+        ''' (маршрут, выполняется, ждёт, отклонено) '''
+        return [(path, gate.active, gate.waiting, gate.rejected) for path, gate in cls.gates.items()]
@@ -1,9 +1,12 @@
 from logging.config import fileConfig
 
 from sqlalchemy import engine_from_config
+from sqlalchemy import inspect
 from sqlalchemy import pool
 
 from alembic import context
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
 
 config = context.config
 
@@ -16,6 +19,18 @@ from src.config import Config
 target_metadata = Base.metadata
 config.set_main_option("sqlalchemy.url", Config.DB_URL_SYNC)
 
+# Схема, которую до перехода на миграции создавал create_all при старте приложения, совпадает с этой ревизией
+LEGACY_REVISION = "cb83ab378363"
+
+def stamp_legacy_schema(connection) -> None:
+    ''' Таблицы справочника есть, а alembic_version нет — база создана до alembic. Без отметки upgrade head
+    начал бы с CREATE TABLE и упал на существующих таблицах '''
+    inspector = inspect(connection)
+    if not inspector.has_table("alembic_version") and inspector.has_table("organizations"):
+        MigrationContext.configure(connection).stamp(ScriptDirectory.from_config(config), LEGACY_REVISION)
+    # inspect и stamp идут в неявной транзакции: её надо закрыть, миграции открывают свою
+    connection.commit()
+
 def run_migrations_offline() -> None:
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
@@ -38,6 +53,7 @@ def run_migrations_online() -> None:
     )
 
     with connectable.connect() as connection:
+        stamp_legacy_schema(connection)
         context.configure(
             connection=connection, target_metadata=target_metadata,
             include_object=lambda object, name, type_, reflected, compare_to: name != 'spatial_ref_sys'
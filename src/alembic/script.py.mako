@@ -19,7 +19,6 @@ depends_on: Union[str, Sequence[str], None] = ${repr(depends_on)}
 
 
 def upgrade() -> None:
-    op.execute("CREATE EXTENSION IF NOT EXISTS ltree")
     ${upgrades if upgrades else "pass"}
 
 
@@ -0,0 +1,115 @@
+"""org phones
+
+Revision ID: 14296dfdccca
+Revises: ae3f52264448
+Create Date: 2026-10-18 23:02:41.187306
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '14296dfdccca'
+down_revision: Union[str, None] = 'ae3f52264448'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Без внешнего ключа на organizations: иначе TRUNCATE organizations (test_data.py, benchmarks) упал бы.
+    # COLLATE "C": префикс ищется диапазоном digits >= '923' AND digits < '923:', порядок должен быть побайтовым
+    op.create_table('org_phones',
+    sa.Column('digits', sa.String(collation='C'), nullable=False),
+    sa.Column('org_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.PrimaryKeyConstraint('digits', 'org_id')
+    )
+    op.create_index('ix_org_phones_org_id', 'org_phones', ['org_id'], unique=False)
+
+    # '8-923-666-13-13' -> '89236661313'; номера без цифр и повторы внутри одной организации отбрасываются
+    op.execute("""
+        CREATE OR REPLACE FUNCTION phone_digits(phones jsonb) RETURNS text[] AS $$
+            SELECT ARRAY(
+                SELECT DISTINCT regexp_replace(phone, '[^0-9]', '', 'g')
+                FROM jsonb_array_elements_text(
+                    CASE WHEN jsonb_typeof(phones) = 'array' THEN phones ELSE '[]' END
+                ) AS phone
+                WHERE phone ~ '[0-9]'
+            )
+        $$ LANGUAGE sql IMMUTABLE
+    """)
+
+    # Ветки по TG_OP, как у activity_counts_rel_ao_changed. При UPDATE трогаются только организации,
+    # у которых поменялся phone (или id): правка title или b_id таблицу не переписывает
+    op.execute("""
+        CREATE OR REPLACE FUNCTION org_phones_organizations_changed() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                INSERT INTO org_phones (digits, org_id)
+                SELECT unnest(phone_digits(n.phone)), n.id FROM new_rows n
+                ON CONFLICT DO NOTHING;
+            ELSIF TG_OP = 'DELETE' THEN
+                DELETE FROM org_phones p USING old_rows o WHERE p.org_id = o.id;
+            ELSIF TG_OP = 'UPDATE' THEN
+                DELETE FROM org_phones p USING old_rows o
+                WHERE p.org_id = o.id
+                  AND NOT EXISTS (SELECT FROM new_rows n WHERE n.id = o.id AND n.phone = o.phone);
+
+                INSERT INTO org_phones (digits, org_id)
+                SELECT unnest(phone_digits(n.phone)), n.id FROM new_rows n
+                WHERE NOT EXISTS (SELECT FROM old_rows o WHERE o.id = n.id AND o.phone = n.phone)
+                ON CONFLICT DO NOTHING;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+
+    op.execute("""
+        CREATE TRIGGER organizations_phones_ins AFTER INSERT ON organizations
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION org_phones_organizations_changed()
+    """)
+    op.execute("""
+        CREATE TRIGGER organizations_phones_upd AFTER UPDATE ON organizations
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION org_phones_organizations_changed()
+    """)
+    op.execute("""
+        CREATE TRIGGER organizations_phones_del AFTER DELETE ON organizations
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION org_phones_organizations_changed()
+    """)
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION org_phones_truncated() RETURNS trigger AS $$
+        BEGIN
+            TRUNCATE org_phones;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER organizations_phones_trunc AFTER TRUNCATE ON organizations
+        FOR EACH STATEMENT EXECUTE FUNCTION org_phones_truncated()
+    """)
+
+    op.execute("""
+        INSERT INTO org_phones (digits, org_id)
+        SELECT unnest(phone_digits(o.phone)), o.id FROM organizations o
+        ON CONFLICT DO NOTHING
+    """)
+    op.execute("ANALYZE org_phones")
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS organizations_phones_trunc ON organizations")
+    op.execute("DROP FUNCTION IF EXISTS org_phones_truncated()")
+    for suffix in ('ins', 'upd', 'del'):
+        op.execute(f"DROP TRIGGER IF EXISTS organizations_phones_{suffix} ON organizations")
+    op.execute("DROP FUNCTION IF EXISTS org_phones_organizations_changed()")
+    op.execute("DROP FUNCTION IF EXISTS phone_digits(jsonb)")
+    op.drop_index('ix_org_phones_org_id', table_name='org_phones')
+    op.drop_table('org_phones')
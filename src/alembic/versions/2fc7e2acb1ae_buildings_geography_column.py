@@ -0,0 +1,36 @@
+"""buildings geography column
+
+Revision ID: 2fc7e2acb1ae
+Revises: cb83ab378363
+Create Date: 2026-10-18 10:14:52.901733
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import geoalchemy2
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2fc7e2acb1ae'
+down_revision: Union[str, None] = 'cb83ab378363'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # STORED generated column: ADD COLUMN rewrites the table and backfills every existing row
+    op.add_column('buildings', sa.Column(
+        'geog',
+        geoalchemy2.types.Geography(geometry_type='POINT', srid=4326, spatial_index=False),
+        sa.Computed('ST_SetSRID(ST_MakePoint(lon, lat), 4326)::geography', persisted=True),
+        nullable=False
+    ))
+    op.create_index('ix_buildings_geog', 'buildings', ['geog'], unique=False, postgresql_using='gist')
+    op.execute("ANALYZE buildings")
+
+
+def downgrade() -> None:
+    op.drop_index('ix_buildings_geog', table_name='buildings', postgresql_using='gist')
+    op.drop_column('buildings', 'geog')
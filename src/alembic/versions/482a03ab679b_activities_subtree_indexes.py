@@ -0,0 +1,28 @@
+"""activities subtree indexes
+
+Revision ID: 482a03ab679b
+Revises: a72713f58026
+Create Date: 2026-10-18 12:20:44.207561
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '482a03ab679b'
+down_revision: Union[str, None] = 'a72713f58026'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(op.f('ix_activities_label'), 'activities', ['label'], unique=False)
+    op.create_index('ix_activities_path_gist', 'activities', ['path'], unique=False, postgresql_using='gist')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_activities_path_gist', table_name='activities', postgresql_using='gist')
+    op.drop_index(op.f('ix_activities_label'), table_name='activities')
@@ -0,0 +1,39 @@
+"""activities change notifications
+
+Revision ID: 542e388d1832
+Revises: 482a03ab679b
+Create Date: 2026-10-18 13:05:39.771402
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '542e388d1832'
+down_revision: Union[str, None] = '482a03ab679b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE OR REPLACE FUNCTION notify_activities_changed() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('activities_changed', TG_OP);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER activities_changed
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON activities
+        FOR EACH STATEMENT EXECUTE FUNCTION notify_activities_changed()
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS activities_changed ON activities")
+    op.execute("DROP FUNCTION IF EXISTS notify_activities_changed()")
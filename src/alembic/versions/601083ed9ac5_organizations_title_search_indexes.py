@@ -0,0 +1,35 @@
+"""organizations title search indexes
+
+Revision ID: 601083ed9ac5
+Revises: 2fc7e2acb1ae
+Create Date: 2026-10-18 11:03:27.154920
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '601083ed9ac5'
+down_revision: Union[str, None] = '2fc7e2acb1ae'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index(
+        'ix_organizations_title_trgm', 'organizations', ['title'], unique=False,
+        postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'}
+    )
+    op.create_index(
+        'ix_organizations_title_prefix', 'organizations',
+        [sa.text('lower(title) COLLATE "C"'), 'id'], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_organizations_title_prefix', table_name='organizations')
+    op.drop_index('ix_organizations_title_trgm', table_name='organizations', postgresql_using='gin')
@@ -0,0 +1,186 @@
+"""organization documents
+
+Revision ID: 9002c374b300
+Revises: e2389cba9ebf
+Create Date: 2026-10-18 20:05:31.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import geoalchemy2
+import sqlalchemy_utils
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9002c374b300'
+down_revision: Union[str, None] = 'e2389cba9ebf'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# таблица -> операция -> запрос, возвращающий id организаций, чей документ нужно пересобрать.
+# DELETE на buildings и activities не нужен: каскад удаляет строки organizations / rel_ao, и срабатывают их триггеры
+AFFECTED = {
+    'organizations': {
+        'INSERT': "SELECT id FROM new_rows",
+        'UPDATE': "SELECT id FROM new_rows UNION SELECT id FROM old_rows",
+        'DELETE': "SELECT id FROM old_rows",
+    },
+    'rel_ao': {
+        'INSERT': "SELECT org_id FROM new_rows",
+        'UPDATE': "SELECT org_id FROM new_rows UNION SELECT org_id FROM old_rows",
+        'DELETE': "SELECT org_id FROM old_rows",
+    },
+    'buildings': {
+        'UPDATE': "SELECT o.id FROM organizations o JOIN new_rows b ON b.id = o.b_id",
+    },
+    'activities': {
+        'UPDATE': "SELECT r.org_id FROM rel_ao r JOIN new_rows a ON a.id = r.act_id",
+    },
+}
+
+TRANSITION = {
+    'INSERT': "REFERENCING NEW TABLE AS new_rows",
+    'UPDATE': "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows",
+    'DELETE': "REFERENCING OLD TABLE AS old_rows",
+}
+
+SUFFIX = {'INSERT': 'ins', 'UPDATE': 'upd', 'DELETE': 'del'}
+
+
+def _function_sql(table: str, queries: dict) -> str:
+    branches = "\n            ELSIF ".join(
+        f"TG_OP = '{operation}' THEN\n                SELECT array_agg(DISTINCT id) INTO ids FROM ({query}) AS affected(id);"
+        for operation, query in queries.items()
+    )
+    return f"""
+        CREATE OR REPLACE FUNCTION organization_documents_{table}_changed() RETURNS trigger AS $$
+        DECLARE
+            ids int[];
+        BEGIN
+            IF {branches}
+            END IF;
+            IF ids IS NOT NULL THEN
+                PERFORM refresh_organization_documents(ids);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """
+
+
+def upgrade() -> None:
+    # Без внешнего ключа на organizations: иначе TRUNCATE organizations (test_data.py, benchmarks) упал бы
+    op.create_table('organization_documents',
+    sa.Column('org_id', sa.Integer(), nullable=False),
+    sa.Column('b_id', sa.Integer(), nullable=False),
+    sa.Column('geog', geoalchemy2.types.Geography(geometry_type='POINT', srid=4326, spatial_index=False), nullable=False),
+    sa.Column('act_ids', postgresql.ARRAY(sa.Integer()), nullable=False),
+    sa.Column('act_paths', postgresql.ARRAY(sqlalchemy_utils.types.ltree.LtreeType()), nullable=False),
+    sa.Column('doc', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.PrimaryKeyConstraint('org_id')
+    )
+    op.create_index('ix_organization_documents_b_id', 'organization_documents', ['b_id', 'org_id'], unique=False)
+    op.create_index('ix_organization_documents_geog', 'organization_documents', ['geog'], unique=False, postgresql_using='gist')
+    op.create_index('ix_organization_documents_act_ids', 'organization_documents', ['act_ids'], unique=False, postgresql_using='gin')
+    op.create_index('ix_organization_documents_act_paths', 'organization_documents', ['act_paths'], unique=False, postgresql_using='gist')
+
+    # Документ в форме OrganizationOut, как его отдаёт FastAPI по response_model (с null-полями)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION organization_documents_build(ids int[])
+        RETURNS TABLE (org_id int, b_id int, geog geography, act_ids int[], act_paths ltree[], doc jsonb) AS $$
+            SELECT
+                o.id, o.b_id, b.geog,
+                COALESCE(array_agg(a.id ORDER BY a.id) FILTER (WHERE a.id IS NOT NULL), '{}'),
+                COALESCE(array_agg(a.path ORDER BY a.id) FILTER (WHERE a.id IS NOT NULL), '{}'),
+                jsonb_build_object(
+                    'id', o.id,
+                    'title', o.title,
+                    'phone', o.phone,
+                    'building', jsonb_build_object(
+                        'id', b.id, 'addr', b.addr, 'lat', b.lat, 'lon', b.lon, 'organizations', NULL
+                    ),
+                    'activities', COALESCE(
+                        jsonb_agg(
+                            jsonb_build_object('id', a.id, 'label', a.label, 'path', a.path::text, 'organizations', NULL)
+                            ORDER BY a.id
+                        ) FILTER (WHERE a.id IS NOT NULL),
+                        '[]'
+                    ),
+                    'distance', NULL
+                )
+            FROM organizations o
+            JOIN buildings b ON b.id = o.b_id
+            LEFT JOIN rel_ao r ON r.org_id = o.id
+            LEFT JOIN activities a ON a.id = r.act_id
+            WHERE o.id = ANY(ids)
+            GROUP BY o.id, b.id
+        $$ LANGUAGE sql STABLE
+    """)
+
+    # Строки документов блокируются до пересборки, а пересборка идёт отдельным запросом: в READ COMMITTED
+    # он видит правки конкурентной транзакции, которая держала блокировку, и не затирает их старым снимком
+    op.execute("""
+        CREATE OR REPLACE FUNCTION refresh_organization_documents(ids int[]) RETURNS void AS $$
+        BEGIN
+            PERFORM 1 FROM organization_documents WHERE org_id = ANY(ids) ORDER BY org_id FOR UPDATE;
+
+            DELETE FROM organization_documents d
+            WHERE d.org_id = ANY(ids) AND NOT EXISTS (SELECT FROM organizations o WHERE o.id = d.org_id);
+
+            INSERT INTO organization_documents AS d (org_id, b_id, geog, act_ids, act_paths, doc)
+            SELECT * FROM organization_documents_build(ids)
+            ON CONFLICT (org_id) DO UPDATE SET
+                b_id = EXCLUDED.b_id,
+                geog = EXCLUDED.geog,
+                act_ids = EXCLUDED.act_ids,
+                act_paths = EXCLUDED.act_paths,
+                doc = EXCLUDED.doc
+            WHERE d.doc IS DISTINCT FROM EXCLUDED.doc;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+
+    for table, queries in AFFECTED.items():
+        op.execute(_function_sql(table, queries))
+        for operation in queries:
+            op.execute(f"""
+                CREATE TRIGGER {table}_documents_{SUFFIX[operation]} AFTER {operation} ON {table}
+                {TRANSITION[operation]}
+                FOR EACH STATEMENT EXECUTE FUNCTION organization_documents_{table}_changed()
+            """)
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION organization_documents_truncated() RETURNS trigger AS $$
+        BEGIN
+            TRUNCATE organization_documents;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER organizations_documents_trunc AFTER TRUNCATE ON organizations
+        FOR EACH STATEMENT EXECUTE FUNCTION organization_documents_truncated()
+    """)
+
+    op.execute("SELECT refresh_organization_documents(ARRAY(SELECT id FROM organizations))")
+    op.execute("ANALYZE organization_documents")
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS organizations_documents_trunc ON organizations")
+    op.execute("DROP FUNCTION IF EXISTS organization_documents_truncated()")
+    for table, queries in AFFECTED.items():
+        for operation in queries:
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_documents_{SUFFIX[operation]} ON {table}")
+        op.execute(f"DROP FUNCTION IF EXISTS organization_documents_{table}_changed()")
+    op.execute("DROP FUNCTION IF EXISTS refresh_organization_documents(int[])")
+    op.execute("DROP FUNCTION IF EXISTS organization_documents_build(int[])")
+    op.drop_index('ix_organization_documents_act_paths', table_name='organization_documents', postgresql_using='gist')
+    op.drop_index('ix_organization_documents_act_ids', table_name='organization_documents', postgresql_using='gin')
+    op.drop_index('ix_organization_documents_geog', table_name='organization_documents', postgresql_using='gist')
+    op.drop_index('ix_organization_documents_b_id', table_name='organization_documents')
+    op.drop_table('organization_documents')
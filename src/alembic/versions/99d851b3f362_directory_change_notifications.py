@@ -0,0 +1,84 @@
+"""directory change notifications
+
+Revision ID: 99d851b3f362
+Revises: 542e388d1832
+Create Date: 2026-10-18 14:12:09.385116
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '99d851b3f362'
+down_revision: Union[str, None] = '542e388d1832'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# таблица -> {тег в payload: колонка}; одно уведомление на statement, а не на строку
+TABLES = {
+    'organizations': {'org': 'id', 'building': 'b_id'},
+    'buildings': {'building': 'id'},
+    'rel_ao': {'org': 'org_id'},
+}
+
+
+def _function_sql(table: str, tags: dict) -> str:
+    columns = ", ".join(tags.values())
+    fields = ", ".join(f"'{tag}', json_agg(DISTINCT {column})" for tag, column in tags.items())
+    select = f"SELECT json_build_object('table', '{table}', {fields})::text INTO payload FROM"
+    return f"""
+        CREATE OR REPLACE FUNCTION notify_{table}_changed() RETURNS trigger AS $$
+        DECLARE
+            payload text;
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                {select} new_rows;
+            ELSIF TG_OP = 'DELETE' THEN
+                {select} old_rows;
+            ELSIF TG_OP = 'UPDATE' THEN
+                {select} (SELECT {columns} FROM new_rows UNION ALL SELECT {columns} FROM old_rows) AS changed;
+            END IF;
+            -- pg_notify ограничен 8000 байт: крупные правки превращаются в полный сброс кэша
+            IF payload IS NULL OR octet_length(payload) > 7900 THEN
+                payload := json_build_object('table', '{table}', 'all', true)::text;
+            END IF;
+            PERFORM pg_notify('directory_changed', payload);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """
+
+
+def upgrade() -> None:
+    for table, tags in TABLES.items():
+        op.execute(_function_sql(table, tags))
+        op.execute(f"""
+            CREATE TRIGGER {table}_changed_ins AFTER INSERT ON {table}
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION notify_{table}_changed()
+        """)
+        op.execute(f"""
+            CREATE TRIGGER {table}_changed_upd AFTER UPDATE ON {table}
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION notify_{table}_changed()
+        """)
+        op.execute(f"""
+            CREATE TRIGGER {table}_changed_del AFTER DELETE ON {table}
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION notify_{table}_changed()
+        """)
+        op.execute(f"""
+            CREATE TRIGGER {table}_changed_trunc AFTER TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION notify_{table}_changed()
+        """)
+
+
+def downgrade() -> None:
+    for table in TABLES:
+        for suffix in ('ins', 'upd', 'del', 'trunc'):
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_changed_{suffix} ON {table}")
+        op.execute(f"DROP FUNCTION IF EXISTS notify_{table}_changed()")
@@ -0,0 +1,28 @@
+"""keyset pagination indexes
+
+Revision ID: a72713f58026
+Revises: 601083ed9ac5
+Create Date: 2026-10-18 11:48:05.630112
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a72713f58026'
+down_revision: Union[str, None] = '601083ed9ac5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_organizations_b_id', 'organizations', ['b_id', 'id'], unique=False)
+    op.create_index('ix_rel_ao_act_id', 'rel_ao', ['act_id', 'org_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_rel_ao_act_id', table_name='rel_ao')
+    op.drop_index('ix_organizations_b_id', table_name='organizations')
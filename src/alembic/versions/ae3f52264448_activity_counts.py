@@ -0,0 +1,221 @@
+"""activity counts
+
+Revision ID: ae3f52264448
+Revises: 9002c374b300
+Create Date: 2026-10-18 21:34:12.640913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ae3f52264448'
+down_revision: Union[str, None] = '9002c374b300'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Правка rel_ao больше этого числа строк (массовая загрузка) пересчитывает затронутые узлы целиком,
+# а не по дельтам: так дешевле, чем проверять каждую пару (организация, предок)
+BULK_ROWS = 10000
+
+
+def upgrade() -> None:
+    # Без внешнего ключа на activities: иначе TRUNCATE activities (test_data.py, benchmarks) упал бы
+    op.create_table('activity_counts',
+    sa.Column('act_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('direct', sa.Integer(), server_default=sa.text('0'), nullable=False),
+    sa.Column('subtree', sa.Integer(), server_default=sa.text('0'), nullable=False),
+    sa.PrimaryKeyConstraint('act_id')
+    )
+
+    # Точные значения для узлов ids: subtree — различные организации по всему поддереву узла
+    op.execute("""
+        CREATE OR REPLACE FUNCTION activity_counts_build(ids int[])
+        RETURNS TABLE (act_id int, direct int, subtree int) AS $$
+            SELECT
+                anc.id,
+                (SELECT count(*) FROM rel_ao r WHERE r.act_id = anc.id)::int,
+                (
+                    SELECT count(DISTINCT r.org_id) FROM activities a JOIN rel_ao r ON r.act_id = a.id
+                    WHERE a.path <@ anc.path
+                )::int
+            FROM activities anc
+            WHERE anc.id = ANY(ids)
+        $$ LANGUAGE sql STABLE
+    """)
+
+    # Как refresh_organization_documents: строки блокируются, пересчёт идёт отдельным запросом со свежим снимком
+    op.execute("""
+        CREATE OR REPLACE FUNCTION refresh_activity_counts(ids int[]) RETURNS void AS $$
+        BEGIN
+            PERFORM 1 FROM activity_counts WHERE act_id = ANY(ids) ORDER BY act_id FOR UPDATE;
+
+            DELETE FROM activity_counts c
+            WHERE c.act_id = ANY(ids) AND NOT EXISTS (SELECT FROM activities a WHERE a.id = c.act_id);
+
+            INSERT INTO activity_counts AS c (act_id, direct, subtree)
+            SELECT * FROM activity_counts_build(ids)
+            ON CONFLICT (act_id) DO UPDATE SET direct = EXCLUDED.direct, subtree = EXCLUDED.subtree
+            WHERE (c.direct, c.subtree) IS DISTINCT FROM (EXCLUDED.direct, EXCLUDED.subtree);
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+
+    # Дельты по добавленным (sign = 1) или удалённым (sign = -1) строкам rel_ao. Организация меняет subtree
+    # предка, только если других её связей (кроме изменённых) в поддереве этого предка нет; формула одна
+    # для обоих направлений: после INSERT изменённые строки в rel_ao есть и исключаются, после DELETE их уже нет
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION activity_counts_apply(org_ids int[], act_ids int[], sign int) RETURNS void AS $$
+        BEGIN
+            IF cardinality(org_ids) > {BULK_ROWS} THEN
+                PERFORM refresh_activity_counts(ARRAY(
+                    SELECT DISTINCT anc.id FROM activities a JOIN activities anc ON anc.path @> a.path
+                    WHERE a.id = ANY(act_ids)
+                ));
+                RETURN;
+            END IF;
+
+            -- Правки одной организации идут по очереди: иначе две транзакции, добавляющие ей деятельности
+            -- из одного поддерева, не увидят строк друг друга и обе прибавят единицу общему предку
+            PERFORM 1 FROM organizations WHERE id = ANY(org_ids) ORDER BY id FOR NO KEY UPDATE;
+
+            INSERT INTO activity_counts AS c (act_id, direct, subtree)
+            SELECT
+                anc.id,
+                sign * count(*) FILTER (WHERE anc.id = ch.act_id),
+                sign * count(DISTINCT ch.org_id) FILTER (
+                    WHERE NOT EXISTS (
+                        SELECT FROM rel_ao r JOIN activities other ON other.id = r.act_id
+                        WHERE r.org_id = ch.org_id AND other.path <@ anc.path
+                          AND (r.org_id, r.act_id) NOT IN (SELECT * FROM unnest(org_ids, act_ids))
+                    )
+                )
+            FROM unnest(org_ids, act_ids) AS ch(org_id, act_id)
+            JOIN activities a ON a.id = ch.act_id
+            JOIN activities anc ON anc.path @> a.path
+            GROUP BY anc.id
+            ORDER BY anc.id
+            ON CONFLICT (act_id) DO UPDATE SET
+                direct = c.direct + EXCLUDED.direct,
+                subtree = c.subtree + EXCLUDED.subtree;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+
+    # Ветки по TG_OP: запрос к transition table, которой у этого триггера нет, нельзя даже планировать
+    op.execute("""
+        CREATE OR REPLACE FUNCTION activity_counts_rel_ao_changed() RETURNS trigger AS $$
+        DECLARE
+            org_ids int[];
+            act_ids int[];
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                SELECT array_agg(org_id), array_agg(act_id) INTO org_ids, act_ids FROM new_rows;
+                IF org_ids IS NOT NULL THEN
+                    PERFORM activity_counts_apply(org_ids, act_ids, 1);
+                END IF;
+            ELSIF TG_OP = 'DELETE' THEN
+                SELECT array_agg(org_id), array_agg(act_id) INTO org_ids, act_ids FROM old_rows;
+                IF org_ids IS NOT NULL THEN
+                    PERFORM activity_counts_apply(org_ids, act_ids, -1);
+                END IF;
+            ELSIF TG_OP = 'UPDATE' THEN
+                -- rel_ao обычно не обновляют, а пересоздают: здесь проще пересчитать затронутые узлы
+                PERFORM refresh_activity_counts(ARRAY(
+                    SELECT DISTINCT anc.id
+                    FROM (SELECT act_id FROM new_rows UNION SELECT act_id FROM old_rows) AS r
+                    JOIN activities a ON a.id = r.act_id
+                    JOIN activities anc ON anc.path @> a.path
+                ));
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+
+    # Новая деятельность без организаций строки не требует (её нет — значит нули). Перенос и удаление
+    # меняют поддеревья старых и новых предков; строки rel_ao удалённой деятельности до этого уходят каскадом,
+    # но их дельты предкам не достаются (деятельности уже нет), поэтому предки пересчитываются здесь
+    op.execute("""
+        CREATE OR REPLACE FUNCTION activity_counts_activities_changed() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'UPDATE' THEN
+                PERFORM refresh_activity_counts(ARRAY(
+                    SELECT DISTINCT anc.id
+                    FROM new_rows n JOIN old_rows o USING (id)
+                    JOIN activities anc ON anc.path @> n.path OR anc.path @> o.path
+                    WHERE n.path IS DISTINCT FROM o.path
+                ));
+            ELSIF TG_OP = 'DELETE' THEN
+                PERFORM refresh_activity_counts(
+                    ARRAY(SELECT id FROM old_rows)
+                    || ARRAY(SELECT DISTINCT anc.id FROM old_rows o JOIN activities anc ON anc.path @> o.path)
+                );
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+
+    op.execute("""
+        CREATE TRIGGER rel_ao_counts_ins AFTER INSERT ON rel_ao
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION activity_counts_rel_ao_changed()
+    """)
+    op.execute("""
+        CREATE TRIGGER rel_ao_counts_upd AFTER UPDATE ON rel_ao
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION activity_counts_rel_ao_changed()
+    """)
+    op.execute("""
+        CREATE TRIGGER rel_ao_counts_del AFTER DELETE ON rel_ao
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION activity_counts_rel_ao_changed()
+    """)
+    op.execute("""
+        CREATE TRIGGER activities_counts_upd AFTER UPDATE ON activities
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION activity_counts_activities_changed()
+    """)
+    op.execute("""
+        CREATE TRIGGER activities_counts_del AFTER DELETE ON activities
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION activity_counts_activities_changed()
+    """)
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION activity_counts_truncated() RETURNS trigger AS $$
+        BEGIN
+            TRUNCATE activity_counts;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    for table in ('rel_ao', 'activities'):
+        op.execute(f"""
+            CREATE TRIGGER {table}_counts_trunc AFTER TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION activity_counts_truncated()
+        """)
+
+    op.execute("SELECT refresh_activity_counts(ARRAY(SELECT id FROM activities))")
+    op.execute("ANALYZE activity_counts")
+
+
+def downgrade() -> None:
+    for table in ('rel_ao', 'activities'):
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_counts_trunc ON {table}")
+    op.execute("DROP FUNCTION IF EXISTS activity_counts_truncated()")
+    op.execute("DROP TRIGGER IF EXISTS activities_counts_del ON activities")
+    op.execute("DROP TRIGGER IF EXISTS activities_counts_upd ON activities")
+    op.execute("DROP FUNCTION IF EXISTS activity_counts_activities_changed()")
+    for suffix in ('ins', 'upd', 'del'):
+        op.execute(f"DROP TRIGGER IF EXISTS rel_ao_counts_{suffix} ON rel_ao")
+    op.execute("DROP FUNCTION IF EXISTS activity_counts_rel_ao_changed()")
+    op.execute("DROP FUNCTION IF EXISTS activity_counts_apply(int[], int[], int)")
+    op.execute("DROP FUNCTION IF EXISTS refresh_activity_counts(int[])")
+    op.execute("DROP FUNCTION IF EXISTS activity_counts_build(int[])")
+    op.drop_table('activity_counts')
@@ -0,0 +1,72 @@
+"""initial schema
+
+Revision ID: cb83ab378363
+Revises:
+Create Date: 2026-10-18 10:02:11.418305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlalchemy_utils
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateSequence, DropSequence
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'cb83ab378363'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS ltree")
+    op.execute("CREATE EXTENSION IF NOT EXISTS postgis")
+    op.execute(CreateSequence(sa.Sequence('activities_id_seq')))
+    op.execute(CreateSequence(sa.Sequence('buildings_id_seq')))
+    op.execute(CreateSequence(sa.Sequence('organizations_id_seq')))
+    op.create_table('activities',
+    sa.Column('id', sa.Integer(), server_default=sa.text("nextval('activities_id_seq')"), nullable=False),
+    sa.Column('label', sa.String(), nullable=False),
+    sa.Column('path', sqlalchemy_utils.types.ltree.LtreeType(), nullable=False),
+    sa.CheckConstraint('nlevel(path) <= 3', name='ck_activity_path_nlevel'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_activities_path'), 'activities', ['path'], unique=False)
+    op.create_table('buildings',
+    sa.Column('id', sa.Integer(), server_default=sa.text("nextval('buildings_id_seq')"), nullable=False),
+    sa.Column('addr', sa.String(), nullable=False),
+    sa.Column('lat', sa.Float(), nullable=False),
+    sa.Column('lon', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('addr')
+    )
+    op.create_table('organizations',
+    sa.Column('id', sa.Integer(), server_default=sa.text("nextval('organizations_id_seq')"), nullable=False),
+    sa.Column('title', sa.String(), nullable=False),
+    sa.Column('phone', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('b_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['b_id'], ['buildings.id'], ondelete='CASCADE', onupdate='RESTRICT'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('title')
+    )
+    op.create_table('rel_ao',
+    sa.Column('org_id', sa.Integer(), nullable=False),
+    sa.Column('act_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['act_id'], ['activities.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['org_id'], ['organizations.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('org_id', 'act_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('rel_ao')
+    op.drop_table('organizations')
+    op.drop_table('buildings')
+    op.drop_index(op.f('ix_activities_path'), table_name='activities')
+    op.drop_table('activities')
+    op.execute(DropSequence(sa.Sequence('organizations_id_seq')))
+    op.execute(DropSequence(sa.Sequence('buildings_id_seq')))
+    op.execute(DropSequence(sa.Sequence('activities_id_seq')))
@@ -0,0 +1,87 @@
+"""data version
+
+Revision ID: e2389cba9ebf
+Revises: 99d851b3f362
+Create Date: 2026-10-18 18:40:52.104377
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2389cba9ebf'
+down_revision: Union[str, None] = '99d851b3f362'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+TABLES = ('organizations', 'buildings', 'activities', 'rel_ao')
+
+
+def upgrade() -> None:
+    op.create_table('data_version',
+    sa.Column('id', sa.Boolean(), server_default=sa.text('true'), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.Column('changed_at', sa.DateTime(timezone=True), nullable=False),
+    sa.CheckConstraint('id', name='ck_data_version_single_row'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute("INSERT INTO data_version (version, changed_at) VALUES (1, now())")
+
+    # Одна строка-счётчик: statement, не менявший строк, версию не двигает.
+    # Строка блокируется до конца транзакции, то есть пишущие транзакции идут по очереди — правки редкие
+    op.execute("""
+        CREATE OR REPLACE FUNCTION bump_data_version() RETURNS trigger AS $$
+        DECLARE
+            new_version bigint;
+            new_changed_at timestamptz;
+        BEGIN
+            -- Вложенные IF: запрос к transition table, которой у этого триггера нет, нельзя даже планировать
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                IF NOT EXISTS (SELECT FROM new_rows) THEN
+                    RETURN NULL;
+                END IF;
+            ELSIF TG_OP = 'DELETE' THEN
+                IF NOT EXISTS (SELECT FROM old_rows) THEN
+                    RETURN NULL;
+                END IF;
+            END IF;
+
+            UPDATE data_version SET version = version + 1, changed_at = now()
+            RETURNING version, changed_at INTO new_version, new_changed_at;
+            PERFORM pg_notify('data_version', new_version || ' ' || extract(epoch FROM new_changed_at));
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    for table in TABLES:
+        op.execute(f"""
+            CREATE TRIGGER {table}_version_ins AFTER INSERT ON {table}
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version()
+        """)
+        op.execute(f"""
+            CREATE TRIGGER {table}_version_upd AFTER UPDATE ON {table}
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version()
+        """)
+        op.execute(f"""
+            CREATE TRIGGER {table}_version_del AFTER DELETE ON {table}
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version()
+        """)
+        op.execute(f"""
+            CREATE TRIGGER {table}_version_trunc AFTER TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version()
+        """)
+
+
+def downgrade() -> None:
+    for table in TABLES:
+        for suffix in ('ins', 'upd', 'del', 'trunc'):
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_version_{suffix} ON {table}")
+    op.execute("DROP FUNCTION IF EXISTS bump_data_version()")
+    op.drop_table('data_version')
@@ -1,16 +1,32 @@
-from fastapi import APIRouter, Query, Request, Security, Depends
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Query, Request, Security, Depends, Body
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.exceptions import HTTPException
 from fastapi.security import APIKeyHeader
 from datetime import datetime
-from typing import List
+from typing import Any, AsyncIterator, Callable, FrozenSet, Iterable, List, Literal, Optional
+import tempfile
+import asyncio
+import math
+import asyncpg
 import jwt
 
-from database.dao import Database
-from database.models import ActivityOut, OrganizationOut, BuildingOut
+from database.dao import Database, normalize_phone
+from database.activity_tree import ActivityTree
+from database.bulk import import_files
+from database.models import (
+    ActivityOut, OrganizationOut, BuildingOut, ActivityNodeOut, ActivityFacetOut, Page, BatchIn, BatchOut, ClustersOut,
+    ORGANIZATION_FIELDS, ORGANIZATION_DEFAULT, BUILDING_FIELDS, BUILDING_DEFAULT, sparse_model
+)
+from pydantic import BaseModel
 from config import Config
 
-router = APIRouter()
+async def request_session():
+    # Все вызовы Database внутри запроса идут через одну сессию: соединение из пула берётся один раз
+    async with Database.request_scope():
+        yield
+
+
+router = APIRouter(dependencies=[Depends(request_session)])
 
 
 # auth placeholder -------
@@ -20,17 +36,181 @@ api_key_header = APIKeyHeader(name=API_KEY_NAME, auto_error=False)
 SECRET = Config.SECRET
 ALGO = "HS256"
 
-def check_key(api_key: str = Security(api_key_header)):
+def key_scope(api_key: str | None) -> str | None:
     try:
-        data = jwt.decode(api_key, SECRET, algorithms=[ALGO])
+        return jwt.decode(api_key, SECRET, algorithms=[ALGO]).get("scope")
     except jwt.PyJWTError:
+        return None
+
+def check_key(api_key: str = Security(api_key_header)):
+    if key_scope(api_key) != "api-access":
         raise HTTPException(401, "Неверный API-ключ")
-    if data.get("scope") != "api-access":
+    return api_key
+
+def check_admin_key(api_key: str = Security(api_key_header)):
+    # Админский токен через /api/token не выдаётся: подписывается тем же SECRET со scope "admin"
+    scope = key_scope(api_key)
+    if scope is None:
         raise HTTPException(401, "Неверный API-ключ")
+    if scope != "admin":
+        raise HTTPException(403, "Недостаточно прав")
     return api_key
 # auth placeholder -------
 
 
+class PageQuery:
+    def __init__(
+        self,
+        limit: int = Query(Config.PAGE_SIZE, ge=1, le=Config.PAGE_MAX_SIZE, description="Размер страницы"),
+        cursor: Optional[str] = Query(None, description="Курсор следующей страницы из next_cursor")
+    ):
+        self.limit = limit
+        self.cursor = cursor
+
+
+class BBoxQuery:
+    def __init__(
+        self,
+        min_lon: float = Query(..., alias="minLon", ge=-180, le=180, description="Западная граница, долгота"),
+        min_lat: float = Query(..., alias="minLat", ge=-90, le=90, description="Южная граница, широта"),
+        max_lon: float = Query(..., alias="maxLon", ge=-180, le=180, description="Восточная граница, долгота"),
+        max_lat: float = Query(..., alias="maxLat", ge=-90, le=90, description="Северная граница, широта")
+    ):
+        self.min_lon = min_lon
+        self.min_lat = min_lat
+        self.max_lon = max_lon
+        self.max_lat = max_lat
+
+    def invalid(self) -> JSONResponse | None:
+        # Бокс через антимеридиан клиент присылает двумя запросами
+        if self.min_lon <= self.max_lon and self.min_lat <= self.max_lat:
+            return None
+        
+        return JSONResponse(
+            {
+                'status': 'failed',
+                'message': 'Invalid bbox: min must not exceed max'
+            }, status_code=400
+        )
+
+
+def limit_radius(radius: float) -> tuple[float, JSONResponse | None]:
+    ''' Радиус больше MAX_RADIUS отклоняется с 400 или, при RADIUS_CLAMP, урезается до MAX_RADIUS '''
+    if radius <= Config.MAX_RADIUS:
+        return radius, None
+    if Config.RADIUS_CLAMP:
+        return Config.MAX_RADIUS, None
+    
+    return radius, JSONResponse(
+        {
+            'status': 'failed',
+            'message': f'Radius is limited to {Config.MAX_RADIUS:g} m'
+        }, status_code=400
+    )
+
+
+class FieldsQuery:
+    ''' ?fields=id,title — отдать только эти поля, ?include=activities — добавить поля к обычному набору.
+    Без обоих параметров зависимость возвращает None, и ответ собирается как раньше '''
+    
+    def __init__(self, allowed: Iterable[str], default: FrozenSet[str]):
+        self.allowed = tuple(allowed)
+        self.default = default
+    
+    def __call__(
+        self,
+        fields: Optional[str] = Query(None, description="Поля ответа через запятую, остальные не читаются из базы"),
+        include: Optional[str] = Query(None, description="Поля через запятую, добавляемые к fields или к обычному набору")
+    ) -> FrozenSet[str] | None:
+        if fields is None and include is None:
+            return None
+        
+        requested = _split_fields(fields) if fields is not None else set(self.default)
+        requested |= _split_fields(include)
+        if unknown := requested.difference(self.allowed):
+            raise HTTPException(
+                400, f"Неизвестные поля: {', '.join(sorted(unknown))}; доступны: {', '.join(self.allowed)}"
+            )
+        if not requested:
+            raise HTTPException(400, "Пустой набор полей")
+        return frozenset(requested)
+
+def _split_fields(value: str | None) -> set[str]:
+    return {name.strip() for name in (value or "").split(",") if name.strip()}
+
+organization_fields = FieldsQuery(ORGANIZATION_FIELDS, ORGANIZATION_DEFAULT)
+building_fields = FieldsQuery(BUILDING_FIELDS, BUILDING_DEFAULT)
+
+def out_model(base: type[BaseModel], fields: FrozenSet[str] | None) -> type[BaseModel]:
+    return base if fields is None else sparse_model(base, fields)
+
+def _dump(out: type[BaseModel], model: Any, distance: float | None = None) -> dict:
+    if distance is not None:
+        return out.model_validate(model).model_copy(update={"distance": distance}).model_dump(exclude_none=True)
+    return out.model_validate(model).model_dump(exclude_none=True)
+
+def _fieldset_response(body: dict, fields: FrozenSet[str] | None) -> Any:
+    # Урезанный ответ не проходит проверку полным response_model (нет обязательных полей) — отдаётся мимо неё
+    return body if fields is None else JSONResponse(body)
+
+
+NDJSON = "application/x-ndjson"
+_NDJSON_CHUNK = 64 * 1024
+
+STREAM_DESCRIPTION = (
+    "С заголовком Accept: application/x-ndjson — все найденные (но не больше STREAM_MAX_ROWS) "
+    "по одной на строку, начиная с cursor; limit и next_cursor не используются."
+)
+
+# Маршруты, отдающие JSON или NDJSON по Accept: ConditionalMiddleware ставит им Vary: Accept и ETag варианта
+NEGOTIATED = ("/api/organization/activity/", "/api/organization/inRadius/", "/api/buildings/inRadius/")
+
+def accept_variant(accept: str) -> str | None:
+    return "ndjson" if NDJSON in accept else None
+
+def wants_ndjson(req: Request) -> bool:
+    return accept_variant(req.headers.get("accept", "")) is not None
+
+async def _ndjson(first: Any, rows: AsyncIterator[Any], dump: Callable[[Any], str]) -> AsyncIterator[bytes]:
+    # Первая строка уходит сразу (время до первого байта), дальше строки копятся до _NDJSON_CHUNK байт
+    try:
+        yield dump(first).encode() + b"\n"
+        chunk = bytearray()
+        async for row in rows:
+            chunk += dump(row).encode()
+            chunk += b"\n"
+            if len(chunk) >= _NDJSON_CHUNK:
+                yield bytes(chunk)
+                chunk.clear()
+        if chunk:
+            yield bytes(chunk)
+    finally:
+        await rows.aclose()
+
+async def ndjson_response(rows: AsyncIterator[Any], dump: Callable[[Any], str]) -> Response:
+    ''' Первая строка читается до ответа: ошибка запроса (например, кривой курсор) и пустой результат
+    отдаются обычными 400/404, а не обрывом уже начатого потока '''
+    try:
+        first = await anext(rows, None)
+    except BaseException:
+        await rows.aclose()
+        raise
+    
+    if first is None:
+        await rows.aclose()
+        return JSONResponse(
+            {
+                'status': 'failed',
+                'message': 'Not Found'
+            }, status_code=404
+        )
+    
+    return StreamingResponse(_ndjson(first, rows, dump), media_type=NDJSON)
+
+def _org_line(out: type[BaseModel], model: Any, distance: float | None = None) -> str:
+    return out.model_validate(model).model_copy(update={"distance": distance}).model_dump_json(exclude_none=True)
+
+
 @router.get(
     "/api/token",
     summary="Получить токен"
@@ -51,20 +231,36 @@ async def get_token(
 @router.get(
     '/api/organization/',
     summary="Поиск организаций по названию",
-    response_model=List[OrganizationOut],
+    response_model=Page[OrganizationOut],
     status_code=200,
     dependencies=[Depends(check_key)]
 )
 async def search_for_organizations_h(
     req: Request,
-    query: str = Query(..., description="Подстрока для поиска в названии организации")
+    query: str = Query(..., min_length=1, description="Подстрока для поиска в названии организации"),
+    limit: int = Query(..., ge=1, le=Config.PAGE_MAX_SIZE, description="Размер страницы"),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы из next_cursor"),
+    prefix: bool = Query(
+        False,
+        description=(
+            "Если True — ищет только по началу названия (быстрый режим для автодополнения).\n\n"
+            "Если False — ищет подстроку, результаты отсортированы по похожести."
+        )
+    ),
+    fields: FrozenSet[str] | None = Depends(organization_fields)
 ) -> JSONResponse:
-    
-    result = await Database.search_for_organizations(query)
-    if result: 
-        result = [OrganizationOut.model_validate(model).model_dump(exclude_none=True) for model in result]
+    if Config.ORG_DOCUMENTS and fields is None:
+        body = await Database.search_for_organizations_json(query, limit, cursor, prefix)
+        if body is not None:
+            return Response(body, media_type="application/json")
+    else:
+        result, next_cursor = await Database.search_for_organizations(query, limit, cursor, prefix, fields=fields)
         
-        return result
+        if result: 
+            out = out_model(OrganizationOut, fields)
+            result = [_dump(out, model) for model in result]
+            
+            return _fieldset_response({"items": result, "next_cursor": next_cursor}, fields)
     
     return JSONResponse(
         {
@@ -84,12 +280,18 @@ async def search_for_organizations_h(
 )
 async def organization_by_self_id(
     req: Request,
-    org_id: int = Query(..., description="ID организации")
+    org_id: int = Query(..., description="ID организации"),
+    fields: FrozenSet[str] | None = Depends(organization_fields)
 ) -> JSONResponse:
-    model = await Database.get_organization_by_id(org_id)
-    if model: 
-        model = OrganizationOut.model_validate(model).model_dump(exclude_none=True)
-        return model
+    if Config.RAW_JSON and fields is None:
+        body = await Database.get_organization_by_id_json(org_id)
+        if body is not None:
+            return Response(body, media_type="application/json")
+    else:
+        model = await Database.get_organization_by_id(org_id, fields=fields)
+        if model: 
+            model = _dump(out_model(OrganizationOut, fields), model)
+            return _fieldset_response(model, fields)
     
     return JSONResponse(
         {
@@ -103,20 +305,30 @@ async def organization_by_self_id(
 @router.get(
     '/api/organization/buildingId/',
     summary="Получить организации в здании",
-    response_model=List[OrganizationOut],
+    response_model=Page[OrganizationOut],
     status_code=200,
     dependencies=[Depends(check_key)]
 )
 async def organizations_by_building_id(
     req: Request,
-    building_id: int = Query(..., description="ID здания")
+    building_id: int = Query(..., description="ID здания"),
+    page: PageQuery = Depends(),
+    fields: FrozenSet[str] | None = Depends(organization_fields)
 ) -> JSONResponse:
-    result = await Database.get_organizations_by_bid(building_id)
-    
-    if result: 
-        result = [OrganizationOut.model_validate(model).model_dump(exclude_none=True) for model in result]
+    if Config.RAW_JSON and fields is None:
+        body = await Database.get_organizations_by_bid_json(building_id, page.limit, page.cursor)
+        if body is not None:
+            return Response(body, media_type="application/json")
+    else:
+        result, next_cursor = await Database.get_organizations_by_bid(
+            building_id, page.limit, page.cursor, fields=fields
+        )
         
-        return result
+        if result: 
+            out = out_model(OrganizationOut, fields)
+            result = [_dump(out, model) for model in result]
+            
+            return _fieldset_response({"items": result, "next_cursor": next_cursor}, fields)
     
     return JSONResponse(
         {
@@ -128,7 +340,8 @@ async def organizations_by_building_id(
 @router.get(
     '/api/organization/activity/',
     summary="Получить организации по деятельности",
-    response_model=List[OrganizationOut],
+    description=STREAM_DESCRIPTION,
+    response_model=Page[OrganizationOut],
     status_code=200,
     dependencies=[Depends(check_key)]
 )
@@ -141,15 +354,77 @@ async def organizations_by_activity_label(
             "Если True — ищет строго по лейблу.\n\n"
             "Если False — включает потомков или совпадающих по иерархии."
         )
-    )
+    ),
+    page: PageQuery = Depends(),
+    fields: FrozenSet[str] | None = Depends(organization_fields)
 ) -> JSONResponse:
+    out = out_model(OrganizationOut, fields)
+    if wants_ndjson(req):
+        return await ndjson_response(
+            Database.stream_organizations_by_activity(
+                label, Config.STREAM_MAX_ROWS, page.cursor, strict=strict, batch=Config.STREAM_BATCH, fields=fields
+            ),
+            lambda model: _org_line(out, model)
+        )
     
-    result = await Database.get_organizations_by_activity(label, strict=strict)
+    if Config.RAW_JSON and fields is None:
+        body = await Database.get_organizations_by_activity_json(label, page.limit, page.cursor, strict=strict)
+        if body is not None:
+            return Response(body, media_type="application/json")
+    else:
+        result, next_cursor = await Database.get_organizations_by_activity(
+            label, page.limit, page.cursor, strict=strict, fields=fields
+        )
+        
+        if result: 
+            result = [_dump(out, model) for model in result]
+            
+            return _fieldset_response({"items": result, "next_cursor": next_cursor}, fields)
     
-    if result: 
-        result = [OrganizationOut.model_validate(model).model_dump(exclude_none=True) for model in result]
+    return JSONResponse(
+        {
+            'status': 'failed',
+            'message': 'Not Found'
+        }, status_code=404
+    )
+
+
+@router.get(
+    '/api/organization/phone/',
+    summary="Получить организации по номеру телефона",
+    response_model=Page[OrganizationOut],
+    status_code=200,
+    dependencies=[Depends(check_key)]
+)
+async def organizations_by_phone_h(
+    req: Request,
+    phone: str = Query(..., description="Номер в любом формате, сравниваются только цифры: 8-923-666-13-13"),
+    prefix: bool = Query(False, description="Если True — номера, начинающиеся с этих цифр"),
+    page: PageQuery = Depends(),
+    fields: FrozenSet[str] | None = Depends(organization_fields)
+) -> JSONResponse:
+    if not normalize_phone(phone):
+        return JSONResponse(
+            {
+                'status': 'failed',
+                'message': 'Phone must contain digits'
+            }, status_code=400
+        )
+    
+    if Config.RAW_JSON and fields is None:
+        body = await Database.get_organizations_by_phone_json(phone, page.limit, page.cursor, prefix=prefix)
+        if body is not None:
+            return Response(body, media_type="application/json")
+    else:
+        result, next_cursor = await Database.get_organizations_by_phone(
+            phone, page.limit, page.cursor, prefix=prefix, fields=fields
+        )
         
-        return result
+        if result: 
+            out = out_model(OrganizationOut, fields)
+            result = [_dump(out, model) for model in result]
+            
+            return _fieldset_response({"items": result, "next_cursor": next_cursor}, fields)
     
     return JSONResponse(
         {
@@ -162,7 +437,8 @@ async def organizations_by_activity_label(
 @router.get(
     '/api/organization/inRadius/',
     summary="Получить организации в радиусе",
-    response_model=List[OrganizationOut],
+    description=STREAM_DESCRIPTION,
+    response_model=Page[OrganizationOut],
     status_code=200,
     dependencies=[Depends(check_key)]
 )
@@ -170,14 +446,36 @@ async def organizations_in_radius_m(
     req: Request,
     radius: float = Query(..., description="Радиус в метрах"),
     lat: float = Query(..., description="Широта точки"),
-    lon: float = Query(..., description="Долгота точки")
+    lon: float = Query(..., description="Долгота точки"),
+    page: PageQuery = Depends(),
+    fields: FrozenSet[str] | None = Depends(organization_fields)
 ) -> JSONResponse:
-    result = await Database.organizations_within_radius(lat, lon, radius)
+    radius, error = limit_radius(radius)
+    if error is not None:
+        return error
     
-    if result: 
-        result = [OrganizationOut.model_validate(model).model_dump(exclude_none=True) for model in result]
+    out = out_model(OrganizationOut, fields)
+    if wants_ndjson(req):
+        return await ndjson_response(
+            Database.stream_organizations_within_radius(
+                lat, lon, radius, Config.STREAM_MAX_ROWS, page.cursor, batch=Config.STREAM_BATCH, fields=fields
+            ),
+            lambda row: _org_line(out, *row)
+        )
+    
+    if Config.ORG_DOCUMENTS and fields is None:
+        body = await Database.organizations_within_radius_json(lat, lon, radius, page.limit, page.cursor)
+        if body is not None:
+            return Response(body, media_type="application/json")
+    else:
+        result, next_cursor = await Database.organizations_within_radius(
+            lat, lon, radius, page.limit, page.cursor, fields=fields
+        )
         
-        return result
+        if result: 
+            result = [_dump(out, model, distance) for model, distance in result]
+            
+            return _fieldset_response({"items": result, "next_cursor": next_cursor}, fields)
     
     return JSONResponse(
         {
@@ -189,7 +487,8 @@ async def organizations_in_radius_m(
 @router.get(
     '/api/buildings/inRadius/',
     summary="Получить здания в радиусе",
-    response_model=List[BuildingOut],
+    description=STREAM_DESCRIPTION,
+    response_model=Page[BuildingOut],
     status_code=200,
     dependencies=[Depends(check_key)]
 )
@@ -197,14 +496,145 @@ async def buildings_in_radius_m(
     req: Request,
     radius: float = Query(..., description="Радиус в метрах"),
     lat: float = Query(..., description="Широта точки"),
-    lon: float = Query(..., description="Долгота точки")
+    lon: float = Query(..., description="Долгота точки"),
+    page: PageQuery = Depends(),
+    fields: FrozenSet[str] | None = Depends(building_fields)
+) -> JSONResponse:
+    radius, error = limit_radius(radius)
+    if error is not None:
+        return error
+    
+    out = out_model(BuildingOut, fields)
+    if wants_ndjson(req):
+        return await ndjson_response(
+            Database.stream_buildings_within_radius(
+                lat, lon, radius, Config.STREAM_MAX_ROWS, page.cursor, batch=Config.STREAM_BATCH, fields=fields
+            ),
+            lambda model: out.model_validate(model).model_dump_json(exclude_none=True)
+        )
+    
+    result, next_cursor = await Database.buildings_within_radius(
+        lat, lon, radius, page.limit, page.cursor, fields=fields
+    )
+    
+    if result: 
+        result = [_dump(out, model) for model in result]
+        
+        return _fieldset_response({"items": result, "next_cursor": next_cursor}, fields)
+    
+    return JSONResponse(
+        {
+            'status': 'failed',
+            'message': 'Not Found'
+        }, status_code=404
+    )
+
+
+@router.get(
+    '/api/buildings/bbox/',
+    summary="Получить здания в прямоугольнике карты",
+    response_model=Page[BuildingOut],
+    status_code=200,
+    dependencies=[Depends(check_key)]
+)
+async def buildings_in_bbox_h(
+    req: Request,
+    bbox: BBoxQuery = Depends(),
+    page: PageQuery = Depends(),
+    fields: FrozenSet[str] | None = Depends(building_fields)
 ) -> JSONResponse:
-    result = await Database.buildings_within_radius(lat, lon, radius)
+    if (error := bbox.invalid()) is not None:
+        return error
+    
+    result, next_cursor = await Database.buildings_in_bbox(
+        bbox.min_lon, bbox.min_lat, bbox.max_lon, bbox.max_lat, page.limit, page.cursor, fields=fields
+    )
     
     if result: 
-        result = [BuildingOut.model_validate(model).model_dump(exclude_none=True) for model in result]
+        out = out_model(BuildingOut, fields)
+        result = [_dump(out, model) for model in result]
+        
+        return _fieldset_response({"items": result, "next_cursor": next_cursor}, fields)
+    
+    return JSONResponse(
+        {
+            'status': 'failed',
+            'message': 'Not Found'
+        }, status_code=404
+    )
+
+
+@router.get(
+    '/api/buildings/clusters/',
+    summary="Кластеры зданий для карты",
+    description="Здания прямоугольника, сгруппированные в ячейки сетки: чем меньше zoom, тем крупнее ячейки.",
+    response_model=ClustersOut,
+    status_code=200,
+    dependencies=[Depends(check_key)]
+)
+async def building_clusters_h(
+    req: Request,
+    bbox: BBoxQuery = Depends(),
+    zoom: int = Query(..., ge=0, le=22, description="Масштаб карты, как у тайлов (0 — весь мир)")
+) -> JSONResponse:
+    if (error := bbox.invalid()) is not None:
+        return error
+    
+    cell = 360 / 2 ** zoom / Config.CLUSTER_GRID
+    cells = (math.floor(bbox.max_lon / cell) - math.floor(bbox.min_lon / cell) + 1) \
+        * (math.floor(bbox.max_lat / cell) - math.floor(bbox.min_lat / cell) + 1)
+    if cells > Config.CLUSTER_MAX_CELLS:
+        return JSONResponse(
+            {
+                'status': 'failed',
+                'message': f'Too many cells ({cells}), lower zoom or shrink bbox'
+            }, status_code=400
+        )
+    
+    result = await Database.building_clusters(bbox.min_lon, bbox.min_lat, bbox.max_lon, bbox.max_lat, cell)
+    
+    if result:
+        return {"cell_deg": cell, "items": result}
+    
+    return JSONResponse(
+        {
+            'status': 'failed',
+            'message': 'Not Found'
+        }, status_code=404
+    )
+
+
+@router.get(
+    '/api/organization/nearest/',
+    summary="Получить ближайшие организации",
+    response_model=Page[OrganizationOut],
+    status_code=200,
+    dependencies=[Depends(check_key)]
+)
+async def nearest_organizations_h(
+    req: Request,
+    lat: float = Query(..., description="Широта точки"),
+    lon: float = Query(..., description="Долгота точки"),
+    limit: int = Query(20, ge=1, le=Config.PAGE_MAX_SIZE, description="Количество организаций"),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы из next_cursor"),
+    label: Optional[str] = Query(
+        None,
+        description="Название деятельности, учитываются и её потомки"
+    ),
+    fields: FrozenSet[str] | None = Depends(organization_fields)
+) -> JSONResponse:
+    if Config.ORG_DOCUMENTS and fields is None:
+        body = await Database.nearest_organizations_json(lat, lon, limit, cursor, label)
+        if body is not None:
+            return Response(body, media_type="application/json")
+    else:
+        result, next_cursor = await Database.nearest_organizations(lat, lon, limit, cursor, label, fields=fields)
         
-        return result
+        if result: 
+            out = out_model(OrganizationOut, fields)
+            result = [_dump(out, model, distance) for model, distance in result]
+            
+            return _fieldset_response({"items": result, "next_cursor": next_cursor}, fields)
     
     return JSONResponse(
         {
@@ -212,3 +642,172 @@ async def buildings_in_radius_m(
             'message': 'Not Found'
         }, status_code=404
     )
+
+
+@router.get(
+    '/api/activities/tree',
+    summary="Дерево деятельностей",
+    response_model=List[ActivityNodeOut],
+    status_code=200,
+    dependencies=[Depends(check_key)]
+)
+async def activities_tree(
+    req: Request
+) -> Response:
+    # Отдаётся готовый JSON из памяти процесса, база не затрагивается
+    if ActivityTree.loaded():
+        return Response(ActivityTree.tree_json(), media_type="application/json")
+    
+    return JSONResponse(
+        {
+            'status': 'failed',
+            'message': 'Activity tree is not loaded'
+        }, status_code=503
+    )
+
+
+@router.get(
+    '/api/activities/facets',
+    summary="Дерево деятельностей с числом организаций",
+    description=(
+        "Без параметров — по всему справочнику из заранее посчитанной activity_counts. "
+        "С lat, lon и radius или с minLon, minLat, maxLon и maxLat — только организации в этой области."
+    ),
+    response_model=List[ActivityFacetOut],
+    status_code=200,
+    dependencies=[Depends(check_key)]
+)
+async def activity_facets(
+    req: Request,
+    lat: Optional[float] = Query(None, ge=-90, le=90, description="Широта центра"),
+    lon: Optional[float] = Query(None, ge=-180, le=180, description="Долгота центра"),
+    radius: Optional[float] = Query(None, gt=0, description="Радиус в метрах"),
+    min_lon: Optional[float] = Query(None, alias="minLon", ge=-180, le=180, description="Западная граница, долгота"),
+    min_lat: Optional[float] = Query(None, alias="minLat", ge=-90, le=90, description="Южная граница, широта"),
+    max_lon: Optional[float] = Query(None, alias="maxLon", ge=-180, le=180, description="Восточная граница, долгота"),
+    max_lat: Optional[float] = Query(None, alias="maxLat", ge=-90, le=90, description="Северная граница, широта")
+) -> Response:
+    if not ActivityTree.loaded():
+        return JSONResponse(
+            {
+                'status': 'failed',
+                'message': 'Activity tree is not loaded'
+            }, status_code=503
+        )
+    
+    circle = (lat, lon, radius)
+    box = (min_lon, min_lat, max_lon, max_lat)
+    in_circle = any(value is not None for value in circle)
+    in_box = any(value is not None for value in box)
+    if (in_circle and in_box) or (in_circle and None in circle) or (in_box and None in box):
+        return JSONResponse(
+            {
+                'status': 'failed',
+                'message': 'Pass either lat, lon and radius or minLon, minLat, maxLon and maxLat'
+            }, status_code=400
+        )
+    
+    if in_circle:
+        radius, error = limit_radius(radius)
+        if error is not None:
+            return error
+        counts = await Database.activity_counts_within_radius(lat, lon, radius)
+    elif in_box:
+        if (error := BBoxQuery(*box).invalid()) is not None:
+            return error
+        counts = await Database.activity_counts_in_bbox(*box)
+    else:
+        counts = await Database.activity_counts()
+    
+    return Response(ActivityTree.facets_json(counts), media_type="application/json")
+
+
+def _batch_too_large(batch: BatchIn) -> JSONResponse | None:
+    if len(batch.ids) <= Config.BATCH_MAX_SIZE:
+        return None
+    
+    return JSONResponse(
+        {
+            'status': 'failed',
+            'message': f'Batch is limited to {Config.BATCH_MAX_SIZE} ids'
+        }, status_code=413
+    )
+
+
+@router.post(
+    '/api/organization/batch',
+    summary="Получить организации по списку ID",
+    response_model=BatchOut[OrganizationOut],
+    status_code=200,
+    dependencies=[Depends(check_key)]
+)
+async def organizations_batch(
+    req: Request,
+    batch: BatchIn = Body(...),
+    fields: FrozenSet[str] | None = Depends(organization_fields)
+) -> JSONResponse:
+    if (error := _batch_too_large(batch)) is not None:
+        return error
+    
+    if Config.RAW_JSON and fields is None:
+        return Response(await Database.get_organizations_by_ids_json(batch.ids), media_type="application/json")
+    
+    found, missing = await Database.get_organizations_by_ids(batch.ids, fields=fields)
+    out = out_model(OrganizationOut, fields)
+    return _fieldset_response(
+        {
+            "items": {org_id: _dump(out, model) for org_id, model in found.items()},
+            "missing": missing
+        }, fields
+    )
+
+
+@router.post(
+    '/api/buildings/batch',
+    summary="Получить здания по списку ID",
+    response_model=BatchOut[BuildingOut],
+    status_code=200,
+    dependencies=[Depends(check_key)]
+)
+async def buildings_batch(
+    req: Request,
+    batch: BatchIn = Body(...),
+    fields: FrozenSet[str] | None = Depends(building_fields)
+) -> JSONResponse:
+    if (error := _batch_too_large(batch)) is not None:
+        return error
+    
+    found, missing = await Database.get_buildings_by_ids(batch.ids, fields=fields)
+    out = out_model(BuildingOut, fields)
+    return _fieldset_response(
+        {
+            "items": {building_id: _dump(out, model) for building_id, model in found.items()},
+            "missing": missing
+        }, fields
+    )
+
+
+@router.post(
+    '/api/admin/import/{kind}',
+    summary="Массовая загрузка снимка справочника",
+    status_code=200,
+    dependencies=[Depends(check_admin_key)]
+)
+async def bulk_import_h(
+    req: Request,
+    kind: Literal["buildings", "activities", "organizations", "rel_ao"],
+    format: Literal["csv", "ndjson"] = Query("csv", description="Формат тела запроса")
+) -> JSONResponse:
+    # Тело пишется на диск по мере приёма, в памяти не копится; дальше — тот же путь, что у bulk_import.py
+    with tempfile.NamedTemporaryFile(suffix=f".{format}") as tmp:
+        async for chunk in req.stream():
+            await asyncio.to_thread(tmp.write, chunk)
+        await asyncio.to_thread(tmp.flush)
+        
+        conn = await asyncpg.connect(Config.DB_URL_SYNC)
+        try:
+            reports = await import_files(conn, [(kind, tmp.name, format)])
+        finally:
+            await conn.close()
+    
+    return reports[0].as_dict()
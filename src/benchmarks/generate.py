@@ -0,0 +1,208 @@
+''' Детерминированный генератор справочника масштаба города. Один и тот же --seed и --scale всегда дают
+одинаковые файлы, поэтому результаты нагрузочных прогонов можно сравнивать между коммитами.
+
+    cd src && python -m benchmarks.generate --scale 1 --out bench_data --load --truncate
+
+- здания собраны в районы (кластеры) вокруг центра города, плотность районов неравномерная;
+- дерево деятельностей максимальной разрешённой глубины (ck_activity_path_nlevel — 3 уровня), широкое;
+- число организаций на здание и популярность деятельностей распределены по Ципфу (длинный хвост).
+
+Загрузка идёт через database.bulk (COPY в staging-таблицы), тем же путём, что и bulk_import.py.
+'''
+from typing import Any, Dict, Iterable, List, Tuple
+import argparse
+import asyncio
+import asyncpg
+import itertools
+import json
+import math
+import os
+import random
+
+from config import Config
+from database.bulk import import_files
+
+# Базовые объёмы для --scale 1
+BUILDINGS = 20_000
+ORGANIZATIONS = 100_000
+DISTRICTS = 40
+
+CENTER = (55.7558, 37.6173)
+CITY_RADIUS_DEG = 0.25
+DEPTH = 3 # ck_activity_path_nlevel
+PHONE_SAMPLES = 1000 # организаций, чьи номера попадают в manifest.json
+
+_ROOTS = (
+    "Еда", "Медицина", "Образование", "Автомобили", "Строительство", "Финансы", "Красота", "Спорт",
+    "Торговля", "Связь", "Транспорт", "Недвижимость", "Юристы", "Туризм", "Развлечения", "Бытовые услуги"
+)
+_ADJECTIVES = (
+    "Северный", "Южный", "Городской", "Народный", "Первый", "Новый", "Старый", "Центральный", "Быстрый",
+    "Добрый", "Светлый", "Большой", "Малый", "Столичный", "Речной", "Лесной", "Солнечный", "Звёздный"
+)
+_NOUNS = (
+    "Альянс", "Маяк", "Квартал", "Двор", "Дом", "Союз", "Мир", "Ключ", "Парус", "Берег", "Сад", "Мост",
+    "Вектор", "Полюс", "Бриз", "Очаг", "Остров", "Рынок", "Центр", "Угол"
+)
+_STREETS = (
+    "Ленина", "Пушкина", "Гагарина", "Мира", "Садовая", "Лесная", "Школьная", "Советская", "Полевая",
+    "Набережная", "Зелёная", "Заводская", "Молодёжная", "Речная", "Озёрная", "Парковая"
+)
+
+
+def _zipf_cum_weights(n: int, s: float) -> List[float]:
+    return list(itertools.accumulate(1 / (rank ** s) for rank in range(1, n + 1)))
+
+
+def _districts(rng: random.Random, count: int) -> List[Tuple[float, float, float]]:
+    ''' (lat, lon, разброс в градусах): центральные районы плотнее и компактнее окраин '''
+    districts = []
+    for _ in range(count):
+        distance = CITY_RADIUS_DEG * math.sqrt(rng.random())
+        angle = rng.uniform(0, 2 * math.pi)
+        lat = CENTER[0] + distance * math.sin(angle)
+        lon = CENTER[1] + distance * math.cos(angle) / math.cos(math.radians(CENTER[0]))
+        districts.append((lat, lon, 0.004 + 0.02 * distance / CITY_RADIUS_DEG))
+    return districts
+
+
+def buildings(rng: random.Random, count: int, districts: int) -> Iterable[Dict[str, Any]]:
+    centers = _districts(rng, districts)
+    cum_weights = _zipf_cum_weights(len(centers), 0.9)
+    for building_id, (lat, lon, spread) in enumerate(rng.choices(centers, cum_weights=cum_weights, k=count), start=1):
+        yield {
+            "id": building_id,
+            "addr": f"ул. {rng.choice(_STREETS)}, дом {building_id}",
+            "lat": round(rng.gauss(lat, spread), 6),
+            "lon": round(rng.gauss(lon, spread / math.cos(math.radians(lat))), 6)
+        }
+
+
+def activities(rng: random.Random, fanout: int) -> List[Dict[str, Any]]:
+    ''' Полное дерево глубины DEPTH; ширина узлов случайна в пределах [fanout / 2, fanout] '''
+    nodes = []
+    level = [(str(i), root) for i, root in enumerate(_ROOTS, start=1)]
+    for depth in range(1, DEPTH + 1):
+        next_level = []
+        for path, label in level:
+            nodes.append({"id": len(nodes) + 1, "label": label, "path": path})
+            if depth < DEPTH:
+                for child in range(1, rng.randint(max(fanout // 2, 1), fanout) + 1):
+                    next_level.append((f"{path}.{child}", f"{label}: {rng.choice(_NOUNS).lower()} {child}"))
+        level = next_level
+    return nodes
+
+
+def organizations(rng: random.Random, count: int, building_count: int) -> Iterable[Dict[str, Any]]:
+    # Перемешанные ранги: популярные здания разбросаны по городу, а не собраны в начале id
+    ranks = list(range(1, building_count + 1))
+    rng.shuffle(ranks)
+    building_ids = rng.choices(ranks, cum_weights=_zipf_cum_weights(building_count, 0.8), k=count)
+    for org_id, building_id in enumerate(building_ids, start=1):
+        yield {
+            "id": org_id,
+            "title": f"{rng.choice(_ADJECTIVES)} {rng.choice(_NOUNS)} №{org_id}",
+            "phone": [f"8-9{rng.randint(10, 99)}-{rng.randint(100, 999)}-{rng.randint(10, 99)}-{rng.randint(10, 99)}"
+                      for _ in range(rng.choice((1, 1, 2, 3)))],
+            "b_id": building_id
+        }
+
+
+def relations(rng: random.Random, org_count: int, activity_ids: List[int]) -> Iterable[Dict[str, Any]]:
+    ranks = list(activity_ids)
+    rng.shuffle(ranks)
+    cum_weights = _zipf_cum_weights(len(ranks), 1.1)
+    for org_id in range(1, org_count + 1):
+        for act_id in sorted(set(rng.choices(ranks, cum_weights=cum_weights, k=rng.choice((1, 1, 2, 3))))):
+            yield {"org_id": org_id, "act_id": act_id}
+
+
+def _write(path: str, rows: Iterable[Dict[str, Any]]) -> int:
+    count = 0
+    with open(path, "w", encoding="utf-8") as file:
+        for row in rows:
+            file.write(json.dumps(row, ensure_ascii=False, separators=(",", ":")))
+            file.write("\n")
+            count += 1
+    return count
+
+
+def generate(out: str, scale: float, seed: int) -> Dict[str, Any]:
+    ''' Пишет <kind>.ndjson и manifest.json в out. Каждая сущность получает свой rng, производный от seed,
+    чтобы изменение генератора одной сущности не сдвигало остальные '''
+    os.makedirs(out, exist_ok=True)
+    building_count = max(int(BUILDINGS * scale), 1)
+    org_count = max(int(ORGANIZATIONS * scale), 1)
+    districts = max(int(DISTRICTS * math.sqrt(scale)), 1)
+    fanout = max(int(8 * scale ** (1 / 3)), 2)
+
+    acts = activities(random.Random(f"{seed}:activities"), fanout)
+    counts = {
+        "buildings": _write(
+            os.path.join(out, "buildings.ndjson"),
+            buildings(random.Random(f"{seed}:buildings"), building_count, districts)
+        ),
+        "activities": _write(os.path.join(out, "activities.ndjson"), acts),
+        "organizations": _write(
+            os.path.join(out, "organizations.ndjson"),
+            organizations(random.Random(f"{seed}:organizations"), org_count, building_count)
+        ),
+        "rel_ao": _write(
+            os.path.join(out, "rel_ao.ndjson"),
+            relations(random.Random(f"{seed}:rel_ao"), org_count, [act["id"] for act in acts])
+        )
+    }
+
+    # Всё, что нужно нагрузочному прогону, чтобы строить запросы, попадающие в данные
+    manifest = {
+        "seed": seed,
+        "scale": scale,
+        "counts": counts,
+        "center": CENTER,
+        "radius_deg": CITY_RADIUS_DEG,
+        "labels": [act["label"] for act in acts],
+        "title_words": [*_ADJECTIVES, *_NOUNS],
+        # Тот же rng, что у organizations.ndjson: номера первых организаций, для поиска по телефону
+        "phones": [
+            phone
+            for org in itertools.islice(
+                organizations(random.Random(f"{seed}:organizations"), org_count, building_count), PHONE_SAMPLES
+            )
+            for phone in org["phone"]
+        ]
+    }
+    with open(os.path.join(out, "manifest.json"), "w", encoding="utf-8") as file:
+        json.dump(manifest, file, ensure_ascii=False, indent=2)
+    return manifest
+
+
+async def load(out: str, truncate: bool) -> List[Dict[str, Any]]:
+    conn = await asyncpg.connect(Config.DB_URL_SYNC)
+    try:
+        async with conn.transaction():
+            if truncate:
+                await conn.execute("TRUNCATE rel_ao, organizations, buildings, activities")
+            reports = await import_files(conn, [
+                (kind, os.path.join(out, f"{kind}.ndjson"), "ndjson")
+                for kind in ("buildings", "activities", "organizations", "rel_ao")
+            ])
+        await conn.execute("ANALYZE buildings, activities, organizations, rel_ao")
+    finally:
+        await conn.close()
+    return [report.as_dict() for report in reports]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=float, default=1.0, help=f"1.0 — {BUILDINGS} зданий, {ORGANIZATIONS} организаций")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default="bench_data", help="Каталог для NDJSON файлов и manifest.json")
+    parser.add_argument("--load", action="store_true", help="Загрузить сгенерированное в базу из Config")
+    parser.add_argument("--truncate", action="store_true", help="Перед загрузкой удалить текущий справочник")
+    args = parser.parse_args()
+
+    manifest = generate(args.out, args.scale, args.seed)
+    print(json.dumps(manifest["counts"], ensure_ascii=False))
+    if args.load:
+        for report in asyncio.run(load(args.out, args.truncate)):
+            print(json.dumps(report, ensure_ascii=False))
@@ -0,0 +1,286 @@
+''' Нагрузочный прогон всех маршрутов api.router при фиксированной конкурентности.
+Данные — из benchmarks.generate (запросы строятся по его manifest.json), сервер — запущенный отдельно.
+
+    cd src && python -m benchmarks.generate --scale 1 --out bench_data --load --truncate
+    cd src && uvicorn start:app --port 8000
+    cd src && python -m benchmarks.load --manifest bench_data/manifest.json --out bench_$(git rev-parse --short HEAD).json
+    cd src && python -m benchmarks.load ... --baseline bench_<старый коммит>.json
+
+Последовательность запросов каждого потока детерминирована (--seed), поэтому прогоны на разных коммитах
+нагружают сервер одинаково. Только stdlib на стороне клиента, чтобы клиент не мерил сам себя.
+'''
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+from urllib.parse import urlencode, urlsplit
+import argparse
+import http.client
+import json
+import math
+import random
+import statistics
+import subprocess
+import time
+
+from api import router
+
+# (method, path, body) одного запроса
+Request = Tuple[str, str, bytes | None]
+Scenario = Callable[[random.Random, Dict[str, Any]], Request]
+
+# Маршруты, которые сознательно не нагружаются
+SKIPPED = {
+    "POST /api/admin/import/{kind}": "изменяет справочник, меряется через bulk_import.py"
+}
+
+
+def _point(rng: random.Random, manifest: Dict[str, Any]) -> Dict[str, float]:
+    lat, lon = manifest["center"]
+    radius = manifest["radius_deg"] * math.sqrt(rng.random())
+    angle = rng.uniform(0, 2 * math.pi)
+    return {
+        "lat": round(lat + radius * math.sin(angle), 6),
+        "lon": round(lon + radius * math.cos(angle) / math.cos(math.radians(lat)), 6)
+    }
+
+
+def _bbox(rng: random.Random, manifest: Dict[str, Any], span: float) -> Dict[str, float]:
+    # Окно карты примерно span градусов по долготе вокруг случайной точки города
+    point = _point(rng, manifest)
+    half_lon, half_lat = span / 2, span / 4
+    return {
+        "minLon": round(point["lon"] - half_lon, 6), "minLat": round(point["lat"] - half_lat, 6),
+        "maxLon": round(point["lon"] + half_lon, 6), "maxLat": round(point["lat"] + half_lat, 6)
+    }
+
+
+def _get(path: str, **params: Any) -> Request:
+    return "GET", f"{path}?{urlencode(params)}", None
+
+
+def _facets(rng: random.Random, manifest: Dict[str, Any]) -> Request:
+    # Поровну: весь справочник (готовые счётчики), радиус и окно карты (подсчёт на лету)
+    scope = rng.randrange(3)
+    if scope == 0:
+        return "GET", "/api/activities/facets", None
+    if scope == 1:
+        return _get("/api/activities/facets", radius=rng.choice((500, 1000, 3000)), **_point(rng, manifest))
+    return _get("/api/activities/facets", **_bbox(rng, manifest, rng.uniform(0.005, 0.05)))
+
+
+def _phone(rng: random.Random, manifest: Dict[str, Any]) -> Request:
+    # Поровну: точный номер в формате справочника и начало номера (первые 5-7 цифр)
+    phone = rng.choice(manifest["phones"])
+    if rng.random() < 0.5:
+        return _get("/api/organization/phone/", phone=phone)
+    digits = "".join(char for char in phone if char.isdigit())
+    return _get("/api/organization/phone/", phone=digits[:rng.randint(5, 7)], prefix="true", limit=20)
+
+
+def _ids(rng: random.Random, count: int, size: int) -> bytes:
+    return json.dumps({"ids": [rng.randint(1, count) for _ in range(size)]}).encode()
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "GET /api/token": lambda rng, m: ("GET", "/api/token", None),
+    "GET /api/organization/": lambda rng, m: _get(
+        "/api/organization/",
+        **(
+            {"query": rng.choice(m["title_words"])[:3].lower(), "prefix": "true"} if rng.random() < 0.5
+            else {"query": rng.choice(m["title_words"])[1:5].lower(), "prefix": "false"}
+        ),
+        limit=20
+    ),
+    "GET /api/organization/id/": lambda rng, m: _get(
+        "/api/organization/id/", org_id=rng.randint(1, m["counts"]["organizations"])
+    ),
+    "GET /api/organization/buildingId/": lambda rng, m: _get(
+        "/api/organization/buildingId/", building_id=rng.randint(1, m["counts"]["buildings"])
+    ),
+    "GET /api/organization/activity/": lambda rng, m: _get(
+        "/api/organization/activity/", label=rng.choice(m["labels"]), strict=str(rng.random() < 0.3).lower()
+    ),
+    "GET /api/organization/phone/": _phone,
+    "GET /api/organization/inRadius/": lambda rng, m: _get(
+        "/api/organization/inRadius/", radius=rng.choice((200, 500, 1000, 3000)), **_point(rng, m)
+    ),
+    "GET /api/buildings/inRadius/": lambda rng, m: _get(
+        "/api/buildings/inRadius/", radius=rng.choice((200, 500, 1000, 3000)), **_point(rng, m)
+    ),
+    "GET /api/buildings/bbox/": lambda rng, m: _get("/api/buildings/bbox/", **_bbox(rng, m, rng.uniform(0.005, 0.05))),
+    "GET /api/buildings/clusters/": lambda rng, m: (
+        lambda zoom: _get("/api/buildings/clusters/", zoom=zoom, **_bbox(rng, m, 360 / 2 ** zoom * 3))
+    )(rng.randint(9, 15)),
+    "GET /api/organization/nearest/": lambda rng, m: _get(
+        "/api/organization/nearest/", limit=20, **_point(rng, m),
+        **({"label": rng.choice(m["labels"])} if rng.random() < 0.3 else {})
+    ),
+    "GET /api/activities/tree": lambda rng, m: ("GET", "/api/activities/tree", None),
+    "GET /api/activities/facets": _facets,
+    "POST /api/organization/batch": lambda rng, m: (
+        "POST", "/api/organization/batch", _ids(rng, m["counts"]["organizations"], 50)
+    ),
+    "POST /api/buildings/batch": lambda rng, m: (
+        "POST", "/api/buildings/batch", _ids(rng, m["counts"]["buildings"], 50)
+    ),
+}
+
+
+def routes() -> List[str]:
+    ''' Все маршруты router; если для нового маршрута нет сценария, прогон падает, а не молча его пропускает '''
+    found = [f"{method} {route.path}" for route in router.routes for method in sorted(route.methods)]
+    missing = [route for route in found if route not in SCENARIOS and route not in SKIPPED]
+    if missing:
+        raise SystemExit(f"no load scenario for: {', '.join(missing)}")
+    return [route for route in found if route in SCENARIOS]
+
+
+def _percentile(timings: List[float], q: float) -> float:
+    return timings[max(math.ceil(len(timings) * q) - 1, 0)]
+
+
+def _worker(
+    url: str, token: str, scenario: Scenario, manifest: Dict[str, Any], seed: str, warmup: float, duration: float
+) -> Tuple[List[float], Dict[int, int], int]:
+    rng = random.Random(seed)
+    parts = urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+    headers = {"X-API-KEY": token, "Content-Type": "application/json"}
+    timings, statuses, errors = [], {}, 0
+
+    started = time.perf_counter()
+    measure_from = started + warmup
+    deadline = measure_from + duration
+    try:
+        while (now := time.perf_counter()) < deadline:
+            method, path, body = scenario(rng, manifest)
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                status = None
+            elapsed = time.perf_counter() - now
+
+            if now < measure_from:
+                continue
+            if status is None:
+                errors += 1
+                continue
+            timings.append(elapsed)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        conn.close()
+    return timings, statuses, errors
+
+
+def run_route(
+    url: str, token: str, route: str, manifest: Dict[str, Any], concurrency: int, warmup: float, duration: float,
+    seed: int
+) -> Dict[str, Any]:
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(
+            lambda worker: _worker(
+                url, token, SCENARIOS[route], manifest, f"{seed}:{route}:{worker}", warmup, duration
+            ),
+            range(concurrency)
+        ))
+
+    timings = sorted(timing for result in results for timing in result[0])
+    statuses: Dict[str, int] = {}
+    for _, worker_statuses, _ in results:
+        for status, count in worker_statuses.items():
+            statuses[str(status)] = statuses.get(str(status), 0) + count
+    errors = sum(result[2] for result in results)
+
+    if not timings:
+        return {"requests": 0, "errors": errors, "statuses": statuses}
+    return {
+        "requests": len(timings),
+        "errors": errors,
+        "statuses": statuses,
+        "rps": round(len(timings) / duration, 1),
+        "p50_ms": round(_percentile(timings, 0.50) * 1000, 3),
+        "p95_ms": round(_percentile(timings, 0.95) * 1000, 3),
+        "p99_ms": round(_percentile(timings, 0.99) * 1000, 3),
+        "mean_ms": round(statistics.fmean(timings) * 1000, 3),
+        "max_ms": round(timings[-1] * 1000, 3)
+    }
+
+
+def _token(url: str) -> str:
+    parts = urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+    try:
+        conn.request("GET", "/api/token")
+        return json.loads(conn.getresponse().read())["api_key"]
+    finally:
+        conn.close()
+
+
+def _commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    lines = [f"{'route':<40} {'p50':>16} {'p99':>16} {'rps':>16}"]
+    for route, current in report["routes"].items():
+        before = baseline["routes"].get(route)
+        if not before or not before.get("requests") or not current.get("requests"):
+            continue
+        cells = [
+            f"{before[key]:.1f}->{current[key]:.1f}".rjust(16)
+            for key in ("p50_ms", "p99_ms", "rps")
+        ]
+        lines.append(f"{route:<40} {' '.join(cells)}")
+    return lines
+
+
+def main(args: argparse.Namespace):
+    with open(args.manifest, encoding="utf-8") as file:
+        manifest = json.load(file)
+    selected = [route for route in routes() if not args.route or route in args.route]
+    token = _token(args.url)
+
+    report = {
+        "commit": _commit(),
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "dataset": {key: manifest[key] for key in ("seed", "scale", "counts")},
+        "concurrency": args.concurrency,
+        "warmup_s": args.warmup,
+        "duration_s": args.duration,
+        "seed": args.seed,
+        "routes": {}
+    }
+    for route in selected:
+        report["routes"][route] = run_route(
+            args.url, token, route, manifest, args.concurrency, args.warmup, args.duration, args.seed
+        )
+        print(route, json.dumps(report["routes"][route]))
+
+    with open(args.out, "w", encoding="utf-8") as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            print("\n".join(compare(report, json.load(file))))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--manifest", default="bench_data/manifest.json")
+    parser.add_argument("--out", default="bench.json", help="Куда записать результаты")
+    parser.add_argument("--baseline", help="Результаты прошлого прогона для сравнения")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=float, default=3.0, help="Секунд прогрева на маршрут, не учитываются")
+    parser.add_argument("--duration", type=float, default=20.0, help="Секунд замера на маршрут")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--route", action="append", help="Прогнать только этот маршрут, например 'GET /api/token'")
+    main(parser.parse_args())
@@ -0,0 +1,373 @@
+''' Проверка планов запросов методов Database на синтетическом справочнике.
+Каждый метод вызывается как в приложении, все его запросы перехватываются и повторяются под
+EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON). План проверяется: ожидаемые индексы используются, seq scan по
+organizations/buildings/organization_documents/org_phones нет, буферы и недооценка числа строк — в пределах бюджета.
+
+    cd src && python -m benchmarks.generate --scale 1 --out bench_data --load --truncate
+    cd src && python -m benchmarks.plans --manifest bench_data/manifest.json --out plans_$(git rev-parse --short HEAD).json
+    cd src && python -m benchmarks.plans ... --baseline plans_<старый коммит>.json
+
+Код выхода 1, если хоть один план не прошёл проверку; для такого метода печатается дерево плана или,
+с --baseline, diff формы плана против прошлого прогона. Бюджеты буферов рассчитаны на --scale 1
+(для другого масштаба — --buffers-factor). Запросы только читают, но ANALYZE их действительно выполняет.
+'''
+from dataclasses import dataclass
+from sqlalchemy import event
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+import argparse
+import asyncio
+import difflib
+import json
+import sys
+import time
+
+from config import Config
+from database.dao import Database, normalize_phone
+from database.activity_tree import ActivityTree
+from benchmarks.load import _commit
+
+# seq scan по этим таблицам на справочнике масштаба города — всегда регрессия
+NO_SEQ_SCAN = ("organizations", "buildings", "organization_documents", "org_phones")
+
+
+@dataclass
+class Case:
+    name: str
+    call: Callable[[Dict[str, Any]], Any] # manifest -> корутина или асинхронный итератор (stream_*)
+    indexes: Tuple[str, ...] = () # должны встретиться хотя бы в одном из запросов метода
+    buffers: int = 1000 # shared hit + read по всем запросам метода, в блоках
+    documents: bool = False # Database.use_documents на время вызова
+
+
+def _center(m: Dict[str, Any]) -> Tuple[float, float]:
+    return tuple(m["center"])
+
+
+def _window(m: Dict[str, Any], span: float) -> Tuple[float, float, float, float]:
+    lat, lon = _center(m)
+    return lon - span / 2, lat - span / 4, lon + span / 2, lat + span / 4
+
+
+def _leaf(m: Dict[str, Any]) -> str:
+    # Последняя сгенерированная деятельность — самая глубокая ветка дерева
+    return m["labels"][-1]
+
+
+def _org_ids(m: Dict[str, Any]) -> List[int]:
+    step = max(m["counts"]["organizations"] // 50, 1)
+    return list(range(1, m["counts"]["organizations"] + 1, step))[:50]
+
+
+def _building_ids(m: Dict[str, Any]) -> List[int]:
+    step = max(m["counts"]["buildings"] // 50, 1)
+    return list(range(1, m["counts"]["buildings"] + 1, step))[:50]
+
+
+CASES: List[Case] = [
+    Case("get_organization_by_id", lambda m: Database.get_organization_by_id(1), ("organizations_pkey",), 50),
+    Case("get_organization_by_id_json", lambda m: Database.get_organization_by_id_json(1), ("organizations_pkey",), 50),
+    Case(
+        "get_organization_by_id_json[documents]", lambda m: Database.get_organization_by_id_json(1),
+        ("organization_documents_pkey",), 20, documents=True
+    ),
+    Case(
+        "get_organizations_by_bid", lambda m: Database.get_organizations_by_bid(1, 50),
+        ("ix_organizations_b_id",), 300
+    ),
+    Case(
+        "get_organizations_by_bid_json", lambda m: Database.get_organizations_by_bid_json(1, 50),
+        ("ix_organizations_b_id",), 300
+    ),
+    Case(
+        "get_organizations_by_bid_json[documents]", lambda m: Database.get_organizations_by_bid_json(1, 50),
+        ("ix_organization_documents_b_id",), 100, documents=True
+    ),
+    Case(
+        "get_organizations_by_activity", lambda m: Database.get_organizations_by_activity(_leaf(m), 50),
+        ("ix_rel_ao_act_id",), 2000
+    ),
+    Case(
+        "get_organizations_by_activity_json", lambda m: Database.get_organizations_by_activity_json(_leaf(m), 50),
+        ("ix_rel_ao_act_id",), 2000
+    ),
+    Case(
+        "get_organizations_by_activity_json[documents]",
+        lambda m: Database.get_organizations_by_activity_json(_leaf(m), 50),
+        ("ix_organization_documents_act_ids",), 2000, documents=True
+    ),
+    Case(
+        "stream_organizations_by_activity",
+        lambda m: Database.stream_organizations_by_activity(_leaf(m), 1000, batch=Config.STREAM_BATCH),
+        ("ix_rel_ao_act_id",), 10000
+    ),
+    Case(
+        "get_organizations_by_phone", lambda m: Database.get_organizations_by_phone(m["phones"][0], 50),
+        ("org_phones_pkey",), 100
+    ),
+    Case(
+        "get_organizations_by_phone[prefix]",
+        lambda m: Database.get_organizations_by_phone(normalize_phone(m["phones"][0])[:5], 50, prefix=True),
+        ("org_phones_pkey",), 1000
+    ),
+    Case(
+        "get_organizations_by_phone_json", lambda m: Database.get_organizations_by_phone_json(m["phones"][0], 50),
+        ("org_phones_pkey",), 100
+    ),
+    Case(
+        "get_organizations_by_phone_json[documents]",
+        lambda m: Database.get_organizations_by_phone_json(m["phones"][0], 50),
+        ("org_phones_pkey", "organization_documents_pkey"), 100, documents=True
+    ),
+    Case(
+        "search_for_organizations[prefix]",
+        lambda m: Database.search_for_organizations(m["title_words"][0][:3].lower(), 20, prefix=True),
+        ("ix_organizations_title_prefix",), 1000
+    ),
+    Case(
+        "search_for_organizations[substring]",
+        lambda m: Database.search_for_organizations(m["title_words"][0][1:5].lower(), 20),
+        ("ix_organizations_title_trgm",), 3000
+    ),
+    Case(
+        "search_for_organizations_json[documents]",
+        lambda m: Database.search_for_organizations_json(m["title_words"][0][:3].lower(), 20, prefix=True),
+        ("ix_organizations_title_prefix", "organization_documents_pkey"), 1000, documents=True
+    ),
+    Case(
+        "organizations_within_radius", lambda m: Database.organizations_within_radius(*_center(m), 1000, 50),
+        ("ix_buildings_geog", "ix_organizations_b_id"), 5000
+    ),
+    Case(
+        "organizations_within_radius_json[documents]",
+        lambda m: Database.organizations_within_radius_json(*_center(m), 1000, 50),
+        ("ix_organization_documents_geog",), 5000, documents=True
+    ),
+    Case(
+        "stream_organizations_within_radius",
+        lambda m: Database.stream_organizations_within_radius(*_center(m), 1000, 1000, batch=Config.STREAM_BATCH),
+        ("ix_buildings_geog", "ix_organizations_b_id"), 10000
+    ),
+    Case(
+        "buildings_within_radius", lambda m: Database.buildings_within_radius(*_center(m), 1000, 50),
+        ("ix_buildings_geog",), 2000
+    ),
+    Case(
+        "stream_buildings_within_radius",
+        lambda m: Database.stream_buildings_within_radius(*_center(m), 1000, 1000, batch=Config.STREAM_BATCH),
+        ("ix_buildings_geog",), 5000
+    ),
+    Case(
+        "buildings_in_bbox", lambda m: Database.buildings_in_bbox(*_window(m, 0.02), 50),
+        ("ix_buildings_geog",), 2000
+    ),
+    Case(
+        # Окно zoom 12 на три тайла, как в benchmarks.load; ячейка — CLUSTER_GRID на тайл
+        "building_clusters", lambda m: Database.building_clusters(*_window(m, 360 / 2 ** 12 * 3), 360 / 2 ** 12 / 8),
+        ("ix_buildings_geog",), 20000
+    ),
+    Case("activity_counts", lambda m: Database.activity_counts(), (), 200),
+    Case(
+        "activity_counts_within_radius", lambda m: Database.activity_counts_within_radius(*_center(m), 1000),
+        ("ix_buildings_geog", "ix_organizations_b_id"), 20000
+    ),
+    Case(
+        "activity_counts_in_bbox", lambda m: Database.activity_counts_in_bbox(*_window(m, 0.02)),
+        ("ix_buildings_geog", "ix_organizations_b_id"), 20000
+    ),
+    Case(
+        "nearest_organizations", lambda m: Database.nearest_organizations(*_center(m), 20),
+        ("ix_buildings_geog",), 1000
+    ),
+    Case(
+        "nearest_organizations_json[documents]", lambda m: Database.nearest_organizations_json(*_center(m), 20),
+        ("ix_organization_documents_geog",), 500, documents=True
+    ),
+    Case(
+        "get_organizations_by_ids", lambda m: Database.get_organizations_by_ids(_org_ids(m)),
+        ("organizations_pkey",), 1000
+    ),
+    Case(
+        "get_organizations_by_ids_json", lambda m: Database.get_organizations_by_ids_json(_org_ids(m)),
+        ("organizations_pkey",), 1000
+    ),
+    Case(
+        "get_buildings_by_ids", lambda m: Database.get_buildings_by_ids(_building_ids(m)),
+        ("buildings_pkey",), 300
+    ),
+]
+
+_captured: List[Tuple[str, Any]] | None = None
+
+
+def _capture(conn, cursor, statement, parameters, context, executemany):
+    if _captured is not None:
+        _captured.append((statement, parameters))
+
+
+async def statements(case: Case, manifest: Dict[str, Any]) -> List[Tuple[str, Any]]:
+    ''' Запросы, которые метод отправил в базу, в порядке отправки (с selectinload их несколько) '''
+    global _captured
+    Database.use_documents(case.documents)
+    _captured = []
+    try:
+        result = case.call(manifest)
+        if hasattr(result, "__aiter__"):
+            async for _ in result:
+                pass
+        else:
+            await result
+        return _captured
+    finally:
+        _captured = None
+
+
+async def explain(statement: str, parameters: Any) -> Dict[str, Any]:
+    # Текст и параметры — уже в виде драйвера ($1, $2, ...), как их отправил asyncpg
+    async with Database._engine.connect() as conn:
+        result = await conn.exec_driver_sql(
+            f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {statement}", tuple(parameters or ())
+        )
+        plan = result.scalar_one()
+    return (json.loads(plan) if isinstance(plan, str) else plan)[0]
+
+
+def _nodes(node: Dict[str, Any], depth: int = 0) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    yield depth, node
+    for child in node.get("Plans", ()):
+        yield from _nodes(child, depth + 1)
+
+
+def _shape(node: Dict[str, Any]) -> str:
+    text = node["Node Type"]
+    if "Index Name" in node:
+        text += f" using {node['Index Name']}"
+    if "Relation Name" in node:
+        text += f" on {node['Relation Name']}"
+    return text
+
+
+def _buffers(node: Dict[str, Any]) -> int:
+    return node.get("Shared Hit Blocks", 0) + node.get("Shared Read Blocks", 0)
+
+
+def shape_lines(plans: List[Dict[str, Any]]) -> List[str]:
+    ''' Форма плана без чисел: её diff между прогонами показывает только смену узлов и индексов '''
+    lines = []
+    for number, plan in enumerate(plans, 1):
+        lines.append(f"#{number}")
+        lines.extend(f"{'  ' * (depth + 1)}{_shape(node)}" for depth, node in _nodes(plan["Plan"]))
+    return lines
+
+
+def annotated_lines(plans: List[Dict[str, Any]]) -> List[str]:
+    lines = []
+    for number, plan in enumerate(plans, 1):
+        lines.append(f"#{number} execution {plan.get('Execution Time', 0):.3f} ms")
+        lines.extend(
+            f"{'  ' * (depth + 1)}{_shape(node)} "
+            f"(rows {node['Plan Rows']} est / {node.get('Actual Rows', 0)} actual x{node.get('Actual Loops', 0)}, "
+            f"buffers {_buffers(node)})"
+            for depth, node in _nodes(plan["Plan"])
+        )
+    return lines
+
+
+def check(case: Case, plans: List[Dict[str, Any]], buffers_factor: float, max_misestimate: float) -> List[str]:
+    problems = []
+    used = set()
+    for number, plan in enumerate(plans, 1):
+        for _, node in _nodes(plan["Plan"]):
+            if "Index Name" in node:
+                used.add(node["Index Name"])
+            if node["Node Type"] == "Seq Scan" and node.get("Relation Name") in NO_SEQ_SCAN:
+                problems.append(f"#{number}: Seq Scan on {node['Relation Name']}")
+            # Только недооценка: переоценка под Limit (чтение останавливается раньше) — норма
+            if node.get("Actual Loops", 0) and node.get("Actual Rows", 0) > max(node["Plan Rows"], 1) * max_misestimate:
+                problems.append(
+                    f"#{number}: {_shape(node)} estimated {node['Plan Rows']} rows, got {node['Actual Rows']}"
+                )
+
+    missing = [index for index in case.indexes if index not in used]
+    if missing:
+        problems.append(f"expected index not used: {', '.join(missing)}")
+
+    buffers = sum(_buffers(plan["Plan"]) for plan in plans)
+    budget = case.buffers * buffers_factor
+    if buffers > budget:
+        problems.append(f"{buffers} buffers over budget {budget:g}")
+    if not plans:
+        problems.append("no queries captured")
+    return problems
+
+
+async def run_case(case: Case, manifest: Dict[str, Any], buffers_factor: float, max_misestimate: float) -> Dict[str, Any]:
+    plans = [await explain(statement, parameters) for statement, parameters in await statements(case, manifest)]
+    return {
+        "problems": check(case, plans, buffers_factor, max_misestimate),
+        "buffers": sum(_buffers(plan["Plan"]) for plan in plans),
+        "execution_ms": round(sum(plan.get("Execution Time", 0) for plan in plans), 3),
+        "shape": shape_lines(plans),
+        "annotated": annotated_lines(plans)
+    }
+
+
+async def main(args: argparse.Namespace) -> int:
+    with open(args.manifest, encoding="utf-8") as file:
+        manifest = json.load(file)
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)["cases"]
+
+    await Database.init(Config.DB_URL, 1)
+    # Как в приложении: поддерево деятельности разрешается в памяти, в запрос уходит список id
+    await ActivityTree.load(Database._sessionmaker)
+    event.listen(Database._engine.sync_engine, "before_cursor_execute", _capture)
+    report = {
+        "commit": _commit(),
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "dataset": {key: manifest[key] for key in ("seed", "scale", "counts")},
+        "cases": {}
+    }
+    failed = 0
+    try:
+        for case in CASES:
+            if args.case and case.name not in args.case:
+                continue
+            result = report["cases"][case.name] = await run_case(case, manifest, args.buffers_factor, args.max_misestimate)
+            before = baseline.get(case.name, {}).get("shape")
+            changed = before is not None and before != result["shape"]
+            status = "FAIL" if result["problems"] else "changed" if changed else "ok"
+            print(f"{status:<8} {case.name:<48} buffers={result['buffers']} ms={result['execution_ms']}")
+            if not result["problems"]:
+                continue
+
+            failed += 1
+            for problem in result["problems"]:
+                print(f"         - {problem}")
+            if changed:
+                print("\n".join(difflib.unified_diff(before, result["shape"], "baseline", "current", lineterm="")))
+            print("\n".join(result["annotated"]))
+    finally:
+        Database.use_documents(Config.ORG_DOCUMENTS)
+        await Database.close()
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+    print(f"{len(report['cases']) - failed}/{len(report['cases'])} plans ok")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--manifest", default="bench_data/manifest.json")
+    parser.add_argument("--out", help="Куда записать планы (для --baseline следующего прогона)")
+    parser.add_argument("--baseline", help="Планы прошлого прогона: при провале печатается diff формы плана")
+    parser.add_argument("--buffers-factor", type=float, default=1.0, help="Множитель бюджетов буферов")
+    parser.add_argument(
+        "--max-misestimate", type=float, default=100.0,
+        help="Во сколько раз фактическое число строк узла может превышать оценку планировщика"
+    )
+    parser.add_argument("--case", action="append", help="Проверить только этот метод, например buildings_in_bbox")
+    sys.exit(asyncio.run(main(parser.parse_args())))
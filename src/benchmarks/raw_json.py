@@ -0,0 +1,96 @@
+''' Сравнение двух путей чтения организаций по зданию: ORM + pydantic и JSON, собранный postgres.
+
+    cd src && python -m benchmarks.raw_json --buildings 50 --iterations 20 --limit 50
+'''
+from pydantic import TypeAdapter
+from sqlalchemy.future import select
+from sqlalchemy import func
+from typing import Awaitable, Callable, List
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from config import Config
+from database.dao import Database
+from database.models import OrganizationOut, Page
+from database.orm import OrgORM
+
+_page = TypeAdapter(Page[OrganizationOut])
+
+
+async def orm_path(building_id: int, limit: int) -> bytes:
+    result, next_cursor = await Database.get_organizations_by_bid(building_id, limit)
+    items = [OrganizationOut.model_validate(model).model_dump(exclude_none=True) for model in result]
+    # Повторная валидация и сериализация по response_model, как это делает FastAPI
+    return _page.dump_json(_page.validate_python({"items": items, "next_cursor": next_cursor}))
+
+
+async def raw_path(building_id: int, limit: int) -> bytes:
+    return await Database.get_organizations_by_bid_json(building_id, limit) or b""
+
+
+def _normalized(body: bytes) -> dict:
+    # Порядок activities у selectinload не определён, у raw пути — по id
+    doc = json.loads(body)
+    for item in doc["items"]:
+        item["activities"].sort(key=lambda act: act["id"])
+    return doc
+
+
+async def measure(
+    fn: Callable[[int, int], Awaitable[bytes]], building_ids: List[int], limit: int, iterations: int
+) -> dict:
+    timings = []
+    size = 0
+    cpu_started = time.process_time()
+    for _ in range(iterations):
+        for building_id in building_ids:
+            started = time.perf_counter()
+            size += len(await fn(building_id, limit))
+            timings.append(time.perf_counter() - started)
+    cpu = time.process_time() - cpu_started
+
+    timings.sort()
+    return {
+        "calls": len(timings),
+        "p50_ms": round(statistics.median(timings) * 1000, 3),
+        "p95_ms": round(timings[int(len(timings) * 0.95) - 1] * 1000, 3),
+        "mean_ms": round(statistics.fmean(timings) * 1000, 3),
+        "cpu_per_call_ms": round(cpu / len(timings) * 1000, 3),
+        "avg_bytes": size // len(timings)
+    }
+
+
+async def main(args: argparse.Namespace):
+    await Database.init(Config.DB_URL, Config.DB_MAXCON)
+    try:
+        async with Database._sessionmaker() as session:
+            building_ids = (await session.execute(
+                select(OrgORM.b_id)
+                .group_by(OrgORM.b_id)
+                .order_by(func.count().desc())
+                .limit(args.buildings)
+            )).scalars().all()
+
+        # Оба пути должны отдавать одинаковые документы
+        for building_id in building_ids:
+            if _normalized(await orm_path(building_id, args.limit)) != _normalized(await raw_path(building_id, args.limit)):
+                raise SystemExit(f"documents differ for building {building_id}")
+
+        report = {
+            "orm": await measure(orm_path, building_ids, args.limit, args.iterations),
+            "raw_json": await measure(raw_path, building_ids, args.limit, args.iterations)
+        }
+        print(json.dumps(report, indent=2))
+    finally:
+        await Database.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--buildings", type=int, default=50, help="Сколько самых населённых зданий опрашивать")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=50, help="Размер страницы")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,41 @@
+''' Загрузка снимка справочника из CSV/NDJSON.
+
+    cd src && python bulk_import.py buildings=buildings.csv activities=activities.csv \\
+        organizations=organizations.ndjson rel_ao=rel_ao.csv
+
+Все файлы применяются в одной транзакции. Формат определяется по расширению (.ndjson/.jsonl или CSV),
+его можно задать явно: organizations=orgs.txt:ndjson
+'''
+import argparse
+import asyncio
+import asyncpg
+import json
+
+from config import Config
+from database.bulk import import_files, detect_format
+
+
+def _source(value: str):
+    try:
+        kind, path = value.split("=", 1)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected kind=path, got {value!r}")
+    path, _, fmt = path.rpartition(":") if path.endswith((":csv", ":ndjson")) else (path, "", "")
+    return kind, path, fmt or detect_format(path)
+
+
+async def main(args: argparse.Namespace):
+    conn = await asyncpg.connect(Config.DB_URL_SYNC)
+    try:
+        reports = await import_files(conn, args.sources)
+    finally:
+        await conn.close()
+
+    for report in reports:
+        print(json.dumps(report.as_dict(), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("sources", nargs="+", type=_source, metavar="kind=path[:format]")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,30 @@
+''' Сверка organization_documents с organizations, buildings, activities и rel_ao.
+
+    cd src && python check_documents.py          # только отчёт, код выхода 1 при расхождениях
+    cd src && python check_documents.py --fix    # заодно пересобрать расходящиеся документы
+'''
+import argparse
+import asyncio
+import asyncpg
+import json
+import sys
+
+from config import Config
+from database.documents import check_documents
+
+
+async def main(args: argparse.Namespace) -> int:
+    conn = await asyncpg.connect(Config.DB_URL_SYNC)
+    try:
+        report = await check_documents(conn, fix=args.fix)
+    finally:
+        await conn.close()
+
+    print(json.dumps(report.as_dict(), ensure_ascii=False))
+    return 0 if report.consistent() or report.fixed else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fix", action="store_true", help="Пересобрать найденные документы")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,126 @@
+''' Сжатие ответов по Accept-Encoding: brotli (если установлен пакет brotli), иначе gzip.
+
+Ответы меньше minimum_size уходят как есть. Потоковые ответы (NDJSON) сжимаются по кусочкам, каждый кусок
+сбрасывается в сеть сразу (sync flush), поэтому сжатие не откладывает первые строки до конца выборки. '''
+from functools import partial
+from typing import Callable
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError: # br не предлагается, остаётся gzip
+    brotli = None
+
+
+def _accepted(header: str) -> dict[str, float]:
+    # "gzip;q=0.8, br" -> {"gzip": 0.8, "br": 1.0}
+    accepted = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding:
+            accepted[coding.lower()] = q
+    return accepted
+
+
+def negotiate(header: str) -> str | None:
+    ''' Кодировка ответа: br, gzip или None (без сжатия). При равном q предпочитается br '''
+    accepted = _accepted(header)
+    available = ("br", "gzip") if brotli is not None else ("gzip",)
+    scores = [(accepted.get(coding, accepted.get("*", 0.0)), coding) for coding in available]
+    q, coding = max(scores, key=lambda score: score[0])
+    return coding if q > 0 else None
+
+
+def _gzip(level: int) -> Callable[[bytes, bool], bytes]:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS) # 16+: заголовок gzip
+    def compress(body: bytes, more_body: bool) -> bytes:
+        return compressor.compress(body) + compressor.flush(zlib.Z_SYNC_FLUSH if more_body else zlib.Z_FINISH)
+    return compress
+
+
+def _brotli(quality: int) -> Callable[[bytes, bool], bytes]:
+    compressor = brotli.Compressor(mode=brotli.MODE_TEXT, quality=quality)
+    def compress(body: bytes, more_body: bool) -> bytes:
+        return compressor.process(body) + (compressor.flush() if more_body else compressor.finish())
+    return compress
+
+
+class _Responder:
+    ''' Один ответ: http.response.start придерживается до первого куска тела — по нему решается, сжимать ли
+    (уже сжатый ответ, text/event-stream и короткий целиком ответ уходят как есть) '''
+
+    def __init__(self, send, coding: str, compressor: Callable[[], Callable[[bytes, bool], bytes]], minimum_size: int):
+        self.send = send
+        self.coding = coding
+        self.compressor = compressor
+        self.minimum_size = minimum_size
+        self.start = None
+        self.compress = None
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            self.start = message
+            return
+
+        if self.start is not None:
+            start, self.start = self.start, None
+            if message["type"] == "http.response.body":
+                start, message = self._begin(start, message)
+            await self.send(start)
+        elif self.compress is not None and message["type"] == "http.response.body":
+            message = {**message, "body": self.compress(message.get("body", b""), message.get("more_body", False))}
+        await self.send(message)
+
+    def _begin(self, start, message):
+        headers = MutableHeaders(raw=list(start.get("headers", ())))
+        body, more_body = message.get("body", b""), message.get("more_body", False)
+        if (
+            "content-encoding" in headers or headers.get("content-type", "").startswith("text/event-stream")
+            or (not more_body and len(body) < self.minimum_size)
+        ):
+            return start, message
+
+        self.compress = self.compressor()
+        body = self.compress(body, more_body)
+        headers["Content-Encoding"] = self.coding
+        headers.add_vary_header("Accept-Encoding")
+        if more_body:
+            del headers["Content-Length"]
+        else:
+            headers["Content-Length"] = str(len(body))
+        return {**start, "headers": headers.raw}, {**message, "body": body}
+
+
+class CompressionMiddleware:
+    ''' Вместо starlette GZipMiddleware: он знает только gzip, не учитывает q=0 и копит поток в буфере.
+    Только публичный ASGI и zlib/brotli, без внутренних классов starlette '''
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        coding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if coding is None:
+            return await self.app(scope, receive, send)
+
+        if coding == "br":
+            compressor = partial(_brotli, self.brotli_quality)
+        else:
+            compressor = partial(_gzip, self.gzip_level)
+        await self.app(scope, receive, _Responder(send, coding, compressor, self.minimum_size))
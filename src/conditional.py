@@ -0,0 +1,97 @@
+''' Условные GET-запросы: ETag и Last-Modified по версии справочника, 304 до обращения к базе '''
+from email.utils import parsedate_to_datetime
+from typing import Callable, Iterable, Tuple
+
+from database.data_version import DataVersion
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # Слабое сравнение (RFC 9110): W/ не учитывается
+    if header.strip() == "*":
+        return True
+    own = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == own for candidate in header.split(","))
+
+
+def _variant_etag(etag: str, variant: str | None) -> str:
+    # W/"v5" -> W/"v5-ndjson": у каждого представления по Accept свой ETag
+    return etag if variant is None else f'{etag[:-1]}-{variant}"'
+
+
+def _not_modified_since(header: str, last_modified: str) -> bool:
+    try:
+        return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+
+
+class ConditionalMiddleware:
+    ''' Только GET под prefix, кроме exclude. 304 отдаётся лишь запросу с действующим ключом (authorized),
+    иначе обработчик сам ответит 401. ETag берётся до вызова обработчика: если данные поменялись во время
+    запроса, ответ получит старый ETag и будет перезапрошен. Новая версия появляется только после того, как
+    процесс перезагрузил дерево деятельностей и сбросил кэш (DataVersion.before_bump), поэтому и ответы из
+    памяти процесса под новым ETag уже новые.
+
+    Пути из negotiated выбирают представление по Accept: любой их ответ получает Vary: Accept,
+    а ETag — суффикс варианта (variant(accept), None — обычный JSON) '''
+
+    def __init__(
+        self, app, authorized: Callable[[str | None], bool], cache_control: str,
+        prefix: str = "/api/", exclude: Iterable[str] = (),
+        negotiated: Iterable[str] = (), variant: Callable[[str], str | None] = lambda accept: None
+    ):
+        self.app = app
+        self.authorized = authorized
+        self.cache_control = cache_control.encode() if cache_control else None
+        self.prefix = prefix
+        self.exclude = tuple(exclude)
+        self.negotiated = frozenset(negotiated)
+        self.variant = variant
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http" or scope["method"] != "GET"
+            or not scope["path"].startswith(self.prefix) or scope["path"].startswith(self.exclude)
+        ):
+            return await self.app(scope, receive, send)
+
+        etag = DataVersion.etag()
+        negotiated = scope["path"] in self.negotiated
+        if etag is None and not negotiated:
+            return await self.app(scope, receive, send)
+
+        headers = {name.decode("latin-1"): value.decode("latin-1") for name, value in scope["headers"]}
+        vary = [(b"vary", b"Accept")] if negotiated else []
+        cache_headers = vary
+
+        if etag is not None:
+            if negotiated:
+                etag = _variant_etag(etag, self.variant(headers.get("accept", "")))
+            last_modified = DataVersion.last_modified()
+            cache_headers = [*self._headers(etag, last_modified), *vary]
+
+            if_none_match = headers.get("if-none-match")
+            if_modified_since = headers.get("if-modified-since")
+            not_modified = (
+                _etag_matches(if_none_match, etag) if if_none_match is not None
+                else if_modified_since is not None and _not_modified_since(if_modified_since, last_modified)
+            )
+            if not_modified and self.authorized(headers.get("x-api-key")):
+                await send({"type": "http.response.start", "status": 304, "headers": cache_headers})
+                await send({"type": "http.response.body", "body": b""})
+                return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                extra = cache_headers if message["status"] == 200 else vary
+                if extra:
+                    message = {**message, "headers": [*message.get("headers", ()), *extra]}
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    def _headers(self, etag: str, last_modified: str) -> list[Tuple[bytes, bytes]]:
+        headers = [(b"etag", etag.encode()), (b"last-modified", last_modified.encode())]
+        if self.cache_control is not None:
+            headers.append((b"cache-control", self.cache_control))
+        return headers
@@ -0,0 +1,135 @@
+from dataclasses import dataclass, field
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.future import select
+from loguru import logger
+from typing import Dict, List, Tuple
+import json
+
+from database.orm import ActORM
+from metrics import instrumented
+
+
+@dataclass(frozen=True)
+class _Snapshot:
+    ids_by_label: Dict[str, Tuple[int, ...]] = field(default_factory=dict)
+    subtree_by_path: Dict[str, Tuple[int, ...]] = field(default_factory=dict)
+    subtree_by_label: Dict[str, Tuple[int, ...]] = field(default_factory=dict)
+    depth: Dict[int, int] = field(default_factory=dict)
+    tree_json: bytes = b"[]"
+
+
+class ActivityTree:
+    ''' Таблица activities маленькая и почти не меняется: держим её целиком в памяти процесса.
+    Снимок пересобирается целиком и подменяется одной операцией, читатели никогда не видят его наполовину. '''
+    _sessionmaker: async_sessionmaker | None = None
+    _snapshot: _Snapshot | None = None
+    _refreshing = False
+    _dirty = False
+
+    @classmethod
+    async def load(cls, sessionmaker: async_sessionmaker):
+        cls._sessionmaker = sessionmaker
+        await cls.refresh()
+
+    @classmethod
+    @instrumented
+    async def refresh(cls):
+        async with cls._sessionmaker() as session:
+            rows = (await session.execute(
+                select(ActORM.id, ActORM.label, ActORM.path)
+                .order_by(ActORM.path)
+            )).all()
+
+        cls._snapshot = cls._build([(act_id, label, path.path) for act_id, label, path in rows])
+        logger.info("[+] Activity tree loaded: {} nodes;", len(rows))
+
+    @classmethod
+    async def on_change(cls, payload: str | None):
+        # Пачка уведомлений от одной массовой правки схлопывается в одну-две перезагрузки
+        if cls._refreshing:
+            cls._dirty = True
+            return
+
+        cls._refreshing = True
+        try:
+            while True:
+                cls._dirty = False
+                await cls.refresh()
+                if not cls._dirty:
+                    break
+        finally:
+            cls._refreshing = False
+
+    @classmethod
+    def loaded(cls) -> bool:
+        return cls._snapshot is not None
+
+    @classmethod
+    def ids(cls, label: str) -> Tuple[int, ...]:
+        return cls._snapshot.ids_by_label.get(label, ())
+
+    @classmethod
+    def subtree_ids(cls, label: str) -> Tuple[int, ...]:
+        return cls._snapshot.subtree_by_label.get(label, ())
+
+    @classmethod
+    def subtree(cls, path: str) -> Tuple[int, ...]:
+        return cls._snapshot.subtree_by_path.get(path, ())
+
+    @classmethod
+    def depth(cls, act_id: int) -> int | None:
+        return cls._snapshot.depth.get(act_id)
+
+    @classmethod
+    def tree_json(cls) -> bytes:
+        return cls._snapshot.tree_json
+
+    @classmethod
+    def facets_json(cls, counts: Dict[int, Tuple[int, int]]) -> bytes:
+        ''' Дерево с (direct, subtree) у каждого узла из counts; узлов, которых там нет, — с нулями '''
+        roots = json.loads(cls._snapshot.tree_json)
+        stack = list(roots)
+        while stack:
+            node = stack.pop()
+            node["direct"], node["subtree"] = counts.get(node["id"], (0, 0))
+            stack.extend(node["children"])
+        return json.dumps(roots, ensure_ascii=False, separators=(",", ":")).encode()
+
+    @staticmethod
+    def _build(rows: List[Tuple[int, str, str]]) -> _Snapshot:
+        ids_by_label: Dict[str, List[int]] = {}
+        subtree_by_path: Dict[str, List[int]] = {}
+        depth: Dict[int, int] = {}
+        path_by_id: Dict[int, str] = {}
+        nodes: Dict[str, dict] = {}
+        roots: List[dict] = []
+
+        # rows отсортированы по path, значит родитель всегда обработан раньше потомков
+        for act_id, label, path in rows:
+            labels = path.split(".")
+            depth[act_id] = len(labels)
+            path_by_id[act_id] = path
+            ids_by_label.setdefault(label, []).append(act_id)
+
+            for i in range(1, len(labels) + 1):
+                subtree_by_path.setdefault(".".join(labels[:i]), []).append(act_id)
+
+            node = {"id": act_id, "label": label, "path": path, "depth": len(labels), "children": []}
+            nodes[path] = node
+            parent = nodes.get(".".join(labels[:-1]))
+            (parent["children"] if parent is not None else roots).append(node)
+
+        subtree_by_label: Dict[str, Tuple[int, ...]] = {}
+        for label, act_ids in ids_by_label.items():
+            merged = set()
+            for act_id in act_ids:
+                merged.update(subtree_by_path[path_by_id[act_id]])
+            subtree_by_label[label] = tuple(sorted(merged))
+
+        return _Snapshot(
+            ids_by_label={label: tuple(act_ids) for label, act_ids in ids_by_label.items()},
+            subtree_by_path={path: tuple(act_ids) for path, act_ids in subtree_by_path.items()},
+            subtree_by_label=subtree_by_label,
+            depth=depth,
+            tree_json=json.dumps(roots, ensure_ascii=False, separators=(",", ":")).encode()
+        )
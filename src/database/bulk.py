@@ -0,0 +1,321 @@
+''' Массовая загрузка справочника: файл читается потоково, пачками уходит через COPY во временную
+staging-таблицу и затем одним INSERT ... ON CONFLICT переносится в рабочую таблицу.
+Память не зависит от размера файла: в ней держится только текущая пачка. '''
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+from loguru import logger
+import asyncio
+import asyncpg
+import csv
+import json
+import re
+import time
+
+BATCH_SIZE = 10_000
+MAX_ERRORS = 20
+
+_LTREE = re.compile(r"^[A-Za-z0-9_-]+(\.[A-Za-z0-9_-]+){0,2}$") # ck_activity_path_nlevel: не глубже 3 уровней
+INT4_MIN, INT4_MAX = -2**31, 2**31 - 1
+
+
+class RejectedRow(ValueError):
+    pass
+
+
+@dataclass
+class ImportReport:
+    kind: str
+    read: int = 0
+    rejected: int = 0 # не прошли разбор/валидацию в python
+    staged: int = 0
+    applied: int = 0 # вставлено или изменено
+    skipped: int = 0 # дубли по id, конфликты уникальности, битые ссылки и строки без изменений
+    seconds: float = 0.0
+    errors: List[str] = field(default_factory=list) # до MAX_ERRORS: ошибки разбора, затем строки, отброшенные upsert
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "read": self.read,
+            "rejected": self.rejected,
+            "staged": self.staged,
+            "applied": self.applied,
+            "skipped": self.skipped,
+            "seconds": round(self.seconds, 3),
+            "rows_per_second": round(self.read / self.seconds) if self.seconds else None,
+            "errors": self.errors
+        }
+
+
+def _int(value: Any) -> int:
+    if isinstance(value, bool):
+        raise RejectedRow(f"not an integer: {value!r}")
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise RejectedRow(f"not an integer: {value!r}")
+    if not INT4_MIN <= number <= INT4_MAX:
+        # Колонки integer: такое значение уронило бы весь COPY, а не одну строку
+        raise RejectedRow(f"out of range: {value!r}")
+    return number
+
+
+def _float(value: Any, bound: float) -> float:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise RejectedRow(f"not a number: {value!r}")
+    if not -bound <= number <= bound:
+        raise RejectedRow(f"out of range: {value!r}")
+    return number
+
+
+def _text(value: Any) -> str:
+    if not isinstance(value, str) or not value.strip():
+        raise RejectedRow(f"empty text: {value!r}")
+    return value
+
+
+def _phones(value: Any) -> str:
+    # В CSV телефоны приходят JSON-массивом или через ';', в NDJSON — массивом
+    if isinstance(value, str):
+        try:
+            value = json.loads(value) if value.lstrip().startswith("[") else value.split(";")
+        except ValueError:
+            raise RejectedRow(f"bad phone list: {value!r}")
+    if not isinstance(value, list) or not all(isinstance(phone, str) for phone in value):
+        raise RejectedRow(f"bad phone list: {value!r}")
+    return json.dumps([phone.strip() for phone in value if phone.strip()], ensure_ascii=False)
+
+
+def _path(value: Any) -> str:
+    if not isinstance(value, str) or not _LTREE.match(value):
+        raise RejectedRow(f"bad activity path: {value!r}")
+    return value
+
+
+@dataclass(frozen=True)
+class _Kind:
+    table: str
+    columns: Tuple[str, ...]
+    stage_types: Tuple[str, ...]
+    parse: Callable[[Dict[str, Any]], Tuple[Any, ...]]
+    upsert: str
+    sequence: str | None
+    dropped: str | None = None # (n, причина) строк staging, которые upsert отбросит; выполняется до него, $1 — лимит
+
+
+KINDS: Dict[str, _Kind] = {
+    "buildings": _Kind(
+        table="buildings",
+        columns=("id", "addr", "lat", "lon"),
+        stage_types=("integer", "text", "double precision", "double precision"),
+        parse=lambda row: (_int(row["id"]), _text(row["addr"]), _float(row["lat"], 90), _float(row["lon"], 180)),
+        upsert="""
+            WITH src AS (
+                SELECT DISTINCT ON (id) id, addr, lat, lon FROM stage_buildings ORDER BY id, n DESC
+            )
+            INSERT INTO buildings (id, addr, lat, lon)
+            SELECT s.id, s.addr, s.lat, s.lon FROM src s
+            WHERE NOT EXISTS (SELECT 1 FROM buildings b WHERE b.addr = s.addr AND b.id <> s.id)
+              AND NOT EXISTS (SELECT 1 FROM src o WHERE o.addr = s.addr AND o.id <> s.id)
+            ON CONFLICT (id) DO UPDATE SET addr = EXCLUDED.addr, lat = EXCLUDED.lat, lon = EXCLUDED.lon
+            WHERE (buildings.addr, buildings.lat, buildings.lon)
+                IS DISTINCT FROM (EXCLUDED.addr, EXCLUDED.lat, EXCLUDED.lon)
+        """,
+        sequence="buildings_id_seq",
+        dropped="""
+            WITH src AS (
+                SELECT DISTINCT ON (id) n, id, addr FROM stage_buildings ORDER BY id, n DESC
+            )
+            SELECT s.n, 'building ' || s.id || ': addr ' || quote_literal(s.addr) || ' is used by another building'
+            FROM src s
+            WHERE EXISTS (SELECT 1 FROM buildings b WHERE b.addr = s.addr AND b.id <> s.id)
+               OR EXISTS (SELECT 1 FROM src o WHERE o.addr = s.addr AND o.id <> s.id)
+            ORDER BY s.n LIMIT $1
+        """
+    ),
+    "activities": _Kind(
+        table="activities",
+        columns=("id", "label", "path"),
+        stage_types=("integer", "text", "text"),
+        parse=lambda row: (_int(row["id"]), _text(row["label"]), _path(row["path"])),
+        upsert="""
+            WITH src AS (
+                SELECT DISTINCT ON (id) id, label, path::ltree AS path FROM stage_activities ORDER BY id, n DESC
+            )
+            INSERT INTO activities (id, label, path)
+            SELECT s.id, s.label, s.path FROM src s
+            ON CONFLICT (id) DO UPDATE SET label = EXCLUDED.label, path = EXCLUDED.path
+            WHERE (activities.label, activities.path) IS DISTINCT FROM (EXCLUDED.label, EXCLUDED.path)
+        """,
+        sequence="activities_id_seq"
+    ),
+    "organizations": _Kind(
+        table="organizations",
+        columns=("id", "title", "phone", "b_id"),
+        stage_types=("integer", "text", "jsonb", "integer"),
+        parse=lambda row: (_int(row["id"]), _text(row["title"]), _phones(row["phone"]), _int(row["b_id"])),
+        upsert="""
+            WITH src AS (
+                SELECT DISTINCT ON (id) id, title, phone, b_id FROM stage_organizations ORDER BY id, n DESC
+            )
+            INSERT INTO organizations (id, title, phone, b_id)
+            SELECT s.id, s.title, s.phone, s.b_id FROM src s
+            WHERE EXISTS (SELECT 1 FROM buildings b WHERE b.id = s.b_id)
+              AND NOT EXISTS (SELECT 1 FROM organizations o WHERE o.title = s.title AND o.id <> s.id)
+              AND NOT EXISTS (SELECT 1 FROM src o WHERE o.title = s.title AND o.id <> s.id)
+            ON CONFLICT (id) DO UPDATE SET title = EXCLUDED.title, phone = EXCLUDED.phone, b_id = EXCLUDED.b_id
+            WHERE (organizations.title, organizations.phone, organizations.b_id)
+                IS DISTINCT FROM (EXCLUDED.title, EXCLUDED.phone, EXCLUDED.b_id)
+        """,
+        sequence="organizations_id_seq",
+        dropped="""
+            WITH src AS (
+                SELECT DISTINCT ON (id) n, id, title, b_id FROM stage_organizations ORDER BY id, n DESC
+            )
+            SELECT s.n, 'organization ' || s.id || ': ' || CASE
+                WHEN NOT EXISTS (SELECT 1 FROM buildings b WHERE b.id = s.b_id) THEN 'unknown building ' || s.b_id
+                ELSE 'title ' || quote_literal(s.title) || ' is used by another organization'
+            END
+            FROM src s
+            WHERE NOT EXISTS (SELECT 1 FROM buildings b WHERE b.id = s.b_id)
+               OR EXISTS (SELECT 1 FROM organizations o WHERE o.title = s.title AND o.id <> s.id)
+               OR EXISTS (SELECT 1 FROM src o WHERE o.title = s.title AND o.id <> s.id)
+            ORDER BY s.n LIMIT $1
+        """
+    ),
+    "rel_ao": _Kind(
+        table="rel_ao",
+        columns=("org_id", "act_id"),
+        stage_types=("integer", "integer"),
+        parse=lambda row: (_int(row["org_id"]), _int(row["act_id"])),
+        upsert="""
+            INSERT INTO rel_ao (org_id, act_id)
+            SELECT DISTINCT s.org_id, s.act_id FROM stage_rel_ao s
+            WHERE EXISTS (SELECT 1 FROM organizations o WHERE o.id = s.org_id)
+              AND EXISTS (SELECT 1 FROM activities a WHERE a.id = s.act_id)
+            ON CONFLICT DO NOTHING
+        """,
+        sequence=None,
+        dropped="""
+            SELECT s.n, 'organization ' || s.org_id || ', activity ' || s.act_id || ': ' || CASE
+                WHEN NOT EXISTS (SELECT 1 FROM organizations o WHERE o.id = s.org_id) THEN 'unknown organization'
+                ELSE 'unknown activity'
+            END
+            FROM stage_rel_ao s
+            WHERE NOT EXISTS (SELECT 1 FROM organizations o WHERE o.id = s.org_id)
+               OR NOT EXISTS (SELECT 1 FROM activities a WHERE a.id = s.act_id)
+            ORDER BY s.n LIMIT $1
+        """
+    ),
+}
+
+# Порядок применения внутри одной транзакции: сначала то, на что ссылаются
+ORDER = ("buildings", "activities", "organizations", "rel_ao")
+
+
+def detect_format(path: str) -> str:
+    return "ndjson" if path.endswith((".ndjson", ".jsonl")) else "csv"
+
+
+def _rows(path: str, fmt: str) -> Iterator[Tuple[int, Dict[str, Any] | None, str | None]]:
+    ''' (номер строки, запись или None, ошибка разбора) '''
+    with open(path, encoding="utf-8", newline="") as file:
+        if fmt == "csv":
+            reader = csv.DictReader(file)
+            for row in reader:
+                yield reader.line_num, row, None
+        else:
+            for n, line in enumerate(file, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    yield n, None, f"bad json: {e}"
+                    continue
+                if not isinstance(row, dict):
+                    yield n, None, "not an object"
+                    continue
+                yield n, row, None
+
+
+def _records(kind: _Kind, path: str, fmt: str, report: ImportReport) -> Iterator[Tuple[Any, ...]]:
+    for n, row, error in _rows(path, fmt):
+        report.read += 1
+        if error is None:
+            try:
+                yield (n, *kind.parse(row))
+                continue
+            except KeyError as e:
+                error = f"missing column {e}"
+            except RejectedRow as e:
+                error = str(e)
+
+        report.rejected += 1
+        if len(report.errors) < MAX_ERRORS:
+            report.errors.append(f"line {n}: {error}")
+
+
+def _take(records: Iterator[Tuple[Any, ...]], size: int) -> List[Tuple[Any, ...]]:
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            break
+    return batch
+
+
+async def _load(conn: asyncpg.Connection, name: str, path: str, fmt: str) -> ImportReport:
+    kind = KINDS[name]
+    report = ImportReport(name)
+    started = time.perf_counter()
+    stage = f"stage_{kind.table}"
+
+    columns = ", ".join(f"{column} {tp}" for column, tp in zip(kind.columns, kind.stage_types))
+    await conn.execute(f"CREATE TEMP TABLE {stage} (n bigint, {columns}) ON COMMIT DROP")
+
+    records = _records(kind, path, fmt, report)
+    while True:
+        # Разбор пачки — CPU работа, уводим её из event loop
+        batch = await asyncio.to_thread(_take, records, BATCH_SIZE)
+        if not batch:
+            break
+        await conn.copy_records_to_table(stage, records=batch, columns=("n", *kind.columns))
+        report.staged += len(batch)
+        logger.debug("[bulk] {}: staged {} rows;", name, report.staged)
+
+    await conn.execute(f"ANALYZE {stage}")
+    if kind.dropped is not None and len(report.errors) < MAX_ERRORS:
+        # До upsert: после него конфликт с только что вставленными строками уже не отличить
+        for n, reason in await conn.fetch(kind.dropped, MAX_ERRORS - len(report.errors)):
+            report.errors.append(f"line {n}: {reason}")
+    status = await conn.execute(kind.upsert)
+    report.applied = int(status.rsplit(" ", 1)[-1])
+    report.skipped = report.staged - report.applied
+
+    if kind.sequence is not None:
+        # id приходят из файла, последовательность нужно догнать вручную
+        await conn.execute(
+            f"SELECT setval('{kind.sequence}', GREATEST((SELECT max(id) FROM {kind.table}), 1))"
+        )
+
+    report.seconds = time.perf_counter() - started
+    logger.info("[bulk] {};", report.as_dict())
+    return report
+
+
+async def import_files(conn: asyncpg.Connection, sources: List[Tuple[str, str, str]]) -> List[ImportReport]:
+    ''' sources: [(kind, path, format)]. Всё применяется в одной транзакции — либо целиком, либо никак '''
+    for name, _, fmt in sources:
+        if name not in KINDS:
+            raise ValueError(f"unknown kind {name!r}, expected one of {', '.join(ORDER)}")
+        if fmt not in ("csv", "ndjson"):
+            raise ValueError(f"unknown format {fmt!r}, expected csv or ndjson")
+
+    reports = []
+    async with conn.transaction():
+        for name, path, fmt in sorted(sources, key=lambda source: ORDER.index(source[0])):
+            reports.append(await _load(conn, name, path, fmt))
+    return reports
@@ -0,0 +1,129 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Set, Tuple
+import time
+
+MISSING = object()
+
+
+class CacheBackend(ABC):
+    ''' Интерфейс кэша перед методами Database.
+    Внешний (общий для процессов) бэкенд должен хранить значения сериализуемыми — в него стоит класть только bytes. '''
+
+    @abstractmethod
+    async def get(self, key: str) -> Any:
+        ''' Значение или MISSING '''
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, tags: Iterable[str], since: int) -> None:
+        ''' since — version(), прочитанная до похода в базу: если с тех пор была инвалидация, значение
+        могло устареть ещё до записи, и его нужно отбросить '''
+
+    @abstractmethod
+    async def invalidate(self, tags: Iterable[str]) -> None:
+        ...
+
+    @abstractmethod
+    async def clear(self) -> None:
+        ...
+
+    @abstractmethod
+    def version(self) -> int:
+        ...
+
+    @abstractmethod
+    def stats(self) -> Dict[str, int]:
+        ...
+
+
+@dataclass
+class _Entry:
+    value: Any
+    expires: float
+    tags: Tuple[str, ...]
+
+
+class LRUCache(CacheBackend):
+    ''' Ограниченный LRU с TTL внутри процесса. Все операции синхронные, поэтому atomic относительно event loop '''
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._keys_by_tag: Dict[str, Set[str]] = {}
+        self._version = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    async def get(self, key: str) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return MISSING
+
+        if entry.expires <= time.monotonic():
+            self._drop(key)
+            self.expirations += 1
+            self.misses += 1
+            return MISSING
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.value
+
+    async def set(self, key: str, value: Any, tags: Iterable[str], since: int) -> None:
+        if since != self._version or self.maxsize <= 0:
+            return
+
+        if key in self._entries:
+            self._drop(key)
+
+        tags = tuple(tags)
+        self._entries[key] = _Entry(value, time.monotonic() + self.ttl, tags)
+        for tag in tags:
+            self._keys_by_tag.setdefault(tag, set()).add(key)
+
+        while len(self._entries) > self.maxsize:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    async def invalidate(self, tags: Iterable[str]) -> None:
+        self._version += 1
+        for tag in tags:
+            for key in self._keys_by_tag.pop(tag, ()):
+                if key in self._entries:
+                    self._drop(key)
+                    self.invalidations += 1
+
+    async def clear(self) -> None:
+        self._version += 1
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+        self._keys_by_tag.clear()
+
+    def version(self) -> int:
+        return self._version
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations
+        }
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key)
+        for tag in entry.tags:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
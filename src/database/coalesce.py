@@ -0,0 +1,69 @@
+''' Склейка одинаковых параллельных запросов (single-flight).
+
+Пока запрос с ключом K выполняется, остальные вызовы с тем же ключом не идут в базу, а ждут его результат.
+Готовый результат нигде не хранится: следующий вызов после завершения снова идёт в базу, поэтому
+устаревших данных склейка не отдаёт — это не кэш, а защита пула от волны одинаковых запросов. '''
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+import asyncio
+
+
+class _Abandoned(Exception):
+    ''' Первый вызвавший отменён (клиент закрыл соединение), результата не будет '''
+
+
+class SingleFlight:
+    ''' Запрос выполняет сам первый вызвавший, в своей задаче и со своей сессией запроса (request_scope,
+    реплика, statement_timeout); остальные ждут его future. Если первого отменили, ждавшие не получают
+    чужую отмену, а повторяют запрос сами — первый из них становится новым ведущим. Все операции
+    синхронны относительно event loop '''
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._flights: Dict[Hashable, asyncio.Future] = {}
+
+        self.flights: Dict[str, int] = {} # метод -> запросов, реально ушедших в базу
+        self.coalesced: Dict[str, int] = {} # метод -> вызовов, дождавшихся чужого запроса
+
+    async def run(self, name: str, key: Hashable, load: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.enabled:
+            return await load()
+
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.coalesced[name] = self.coalesced.get(name, 0) + 1
+            try:
+                # shield: отмена одного ожидающего не трогает общий future
+                return await asyncio.shield(flight)
+            except _Abandoned:
+                return await self.run(name, key, load)
+
+        flight = asyncio.get_running_loop().create_future()
+        self._flights[key] = flight
+        self.flights[name] = self.flights.get(name, 0) + 1
+        try:
+            result = await load()
+        except asyncio.CancelledError:
+            self._fail(flight, _Abandoned())
+            raise
+        except Exception as e:
+            self._fail(flight, e)
+            raise
+        else:
+            flight.set_result(result)
+            return result
+        finally:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def forget(self):
+        ''' После изменения данных новые вызовы не присоединяются к запросам, начатым до него '''
+        self._flights.clear()
+
+    def stats(self) -> Tuple[Dict[str, int], Dict[str, int]]:
+        return self.flights, self.coalesced
+
+    @staticmethod
+    def _fail(flight: asyncio.Future, exc: BaseException):
+        flight.set_exception(exc)
+        # Исключение уже получил первый вызвавший; без этого asyncio ругается, если ждавших не было
+        flight.exception()
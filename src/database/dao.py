@@ -1,182 +1,1048 @@
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.orm import joinedload, selectinload
-from sqlalchemy import func, cast, text
+from sqlalchemy.orm import joinedload, selectinload, contains_eager, aliased, load_only, noload
+from sqlalchemy import Select, Row, func, cast, text, exists, tuple_, or_, and_, any_, false, bindparam, null, literal_column, case, Integer, Float, Text
+from sqlalchemy.dialects.postgresql import ARRAY, aggregate_order_by
 from geoalchemy2 import Geography
 from loguru import logger
-from typing import List
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Dict, FrozenSet, List, Tuple
+import asyncio
+import functools
+import inspect
+import json
+import math
+import re
 
 from database.orm import (
-    Base, OrgORM, ActORM, BuildORM
+    Base, OrgORM, ActORM, BuildORM, Relationship_AO, OrgDocumentORM, ActivityCountORM, OrgPhoneORM
 )
+from database.pagination import decode_cursor, split_page, keyset_page, keyset_after
+from database.activity_tree import ActivityTree
+from database.cache import CacheBackend, LRUCache, MISSING
+from database.coalesce import SingleFlight
+from database.replicas import Replicas
+from metrics import Metrics, TimedPool, instrumented, current_method
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _geog_point(lat: float, lon: float):
+    # Точка запроса приводится к geography один раз, колонка buildings.geog уже хранится готовой
+    return cast(func.ST_SetSRID(func.ST_MakePoint(lon, lat), 4326), Geography(srid=4326))
+
+def _in_bbox(min_lon: float, min_lat: float, max_lon: float, max_lat: float):
+    # && по GiST ix_buildings_geog отбирает кандидатов, BETWEEN по lat/lon оставляет ровно прямоугольник.
+    # Стороны geography-конверта — дуги большого круга, а не параллели: у широкого бокса они отходят
+    # от параллели до (Δlon²/8) радиан, поэтому конверт для индекса расширен по широте на этот запас
+    pad = math.degrees(math.radians(max_lon - min_lon) ** 2 / 8)
+    envelope = cast(
+        func.ST_MakeEnvelope(min_lon, max(min_lat - pad, -90), max_lon, min(max_lat + pad, 90), 4326),
+        Geography(srid=4326)
+    )
+    return and_(
+        BuildORM.geog.op("&&")(envelope),
+        BuildORM.lat.between(min_lat, max_lat),
+        BuildORM.lon.between(min_lon, max_lon)
+    )
+
+def _id_array(name: str, ids: List[int] | None = None):
+    # Один параметр-массив (= ANY($1)) вместо IN со своим плейсхолдером на каждый id
+    return any_(bindparam(name, ids, type_=ARRAY(Integer)))
+
+def _in_activity_subtree(label: str, strict: bool = False):
+    # Организация привязана к деятельности с этим лейблом или (strict=False) к любому её потомку.
+    # EXISTS вместо JOIN: организация попадает в выборку один раз, сколько бы деятельностей ни совпало
+    if ActivityTree.loaded():
+        # Поддерево уже разрешено в памяти, в postgres уходит только список id
+        act_ids = ActivityTree.ids(label) if strict else ActivityTree.subtree_ids(label)
+        if not act_ids:
+            return false()
+        return exists().where(
+            Relationship_AO.org_id == OrgORM.id,
+            Relationship_AO.act_id == _id_array("act_ids", list(act_ids))
+        )
+    
+    if strict:
+        return exists().where(
+            Relationship_AO.org_id == OrgORM.id,
+            Relationship_AO.act_id == ActORM.id,
+            ActORM.label == label
+        )
+    
+    parent = aliased(ActORM)
+    return exists().where(
+        Relationship_AO.org_id == OrgORM.id,
+        Relationship_AO.act_id == ActORM.id,
+        ActORM.path.descendant_of(parent.path),
+        parent.label == label
+    )
+
+def _key(name: str):
+    # Ключи json_build_object литералами: параметр неизвестного типа в VARIADIC "any" postgres не примет
+    return literal_column(f"'{name}'")
+
+def _org_document():
+    # Документ в форме OrganizationOut (включая null-поля, которые FastAPI отдаёт по response_model),
+    # собирается самим postgres: на стороне python нет ни ORM объектов, ни pydantic моделей
+    activities = (
+        select(func.coalesce(
+            func.json_agg(
+                aggregate_order_by(
+                    func.json_build_object(
+                        _key("id"), ActORM.id,
+                        _key("label"), ActORM.label,
+                        _key("path"), cast(ActORM.path, Text),
+                        _key("organizations"), null()
+                    ),
+                    ActORM.id
+                )
+            ),
+            literal_column("'[]'::json")
+        ))
+        .join(Relationship_AO, Relationship_AO.act_id == ActORM.id)
+        .where(Relationship_AO.org_id == OrgORM.id)
+        .scalar_subquery()
+    )
+    return cast(func.json_build_object(
+        _key("id"), OrgORM.id,
+        _key("title"), OrgORM.title,
+        _key("phone"), OrgORM.phone,
+        _key("building"), func.json_build_object(
+            _key("id"), BuildORM.id,
+            _key("addr"), BuildORM.addr,
+            _key("lat"), BuildORM.lat,
+            _key("lon"), BuildORM.lon,
+            _key("organizations"), null()
+        ),
+        _key("activities"), activities,
+        _key("distance"), null()
+    ), Text)
+
+def _page_json(docs: List[str], next_cursor: str | None) -> bytes:
+    return (
+        '{"items":[' + ",".join(docs) + '],"next_cursor":' + json.dumps(next_cursor) + '}'
+    ).encode()
+
+def _batch_json(docs: List[Tuple[int, str]], missing: List[int]) -> bytes:
+    items = ",".join(f'"{org_id}":{doc}' for org_id, doc in docs)
+    return ('{"items":{' + items + '},"missing":' + json.dumps(missing) + '}').encode()
+
+Fields = FrozenSet[str] | None # поля ответа из ?fields=&include=, None — полная модель
+
+def _org_options(fields: Fields, building: Any = joinedload) -> tuple:
+    ''' Загрузка под поля ответа: ненужные колонки не читаются, ненужные связи не грузятся.
+    building — joinedload или contains_eager, если здание уже присоединено ради расстояния '''
+    if fields is None:
+        return selectinload(OrgORM.activities), building(OrgORM.building)
+    
+    # b_id нужен всегда: по нему ставятся теги кэша
+    columns = [getattr(OrgORM, name) for name in ("title", "phone") if name in fields]
+    return (
+        load_only(OrgORM.id, OrgORM.b_id, *columns),
+        building(OrgORM.building) if "building" in fields else noload(OrgORM.building),
+        selectinload(OrgORM.activities) if "activities" in fields else noload(OrgORM.activities)
+    )
+
+def _building_options(fields: Fields) -> tuple:
+    # В полном BuildingOut организаций нет, поэтому без fields здание грузится без связей
+    if fields is None:
+        return ()
+    
+    columns = [getattr(BuildORM, name) for name in ("addr", "lat", "lon") if name in fields]
+    if "organizations" in fields:
+        orgs = selectinload(BuildORM.orgs).load_only(OrgORM.id, OrgORM.b_id, OrgORM.title, OrgORM.phone)
+    else:
+        orgs = noload(BuildORM.orgs)
+    return load_only(BuildORM.id, *columns), orgs
+
+def _fields_key(fields: Fields) -> str:
+    return "" if fields is None else ":" + ",".join(sorted(fields))
+
+# Горячие запросы собираются один раз при импорте (или при первом вызове с новым набором полей):
+# на вызов остаётся подстановка параметров, а скомпилированный SQL берётся из кэша движка по готовому ключу
+@functools.cache
+def _org_by_id(fields: Fields) -> Select:
+    return select(OrgORM).where(OrgORM.id == bindparam("org_id")).options(*_org_options(fields))
+
+@functools.cache
+def _orgs_by_bid(fields: Fields) -> Tuple[Select, Select]:
+    stmt = (
+        select(OrgORM)
+        .where(OrgORM.b_id == bindparam("building_id"))
+        .options(*_org_options(fields))
+        .order_by(OrgORM.id)
+        .limit(bindparam("limit", type_=Integer))
+    )
+    return stmt, stmt.where(OrgORM.id > bindparam("after_id"))
+
+@functools.cache
+def _orgs_by_ids(fields: Fields) -> Select:
+    return select(OrgORM).where(OrgORM.id == _id_array("org_ids")).options(*_org_options(fields))
+
+@functools.cache
+def _buildings_by_ids(fields: Fields) -> Select:
+    return select(BuildORM).where(BuildORM.id == _id_array("building_ids")).options(*_building_options(fields))
+
+_ORG_BY_ID_JSON = (
+    select(OrgORM.b_id, _org_document().label("doc"))
+    .join(OrgORM.building)
+    .where(OrgORM.id == bindparam("org_id"))
+)
+
+_ORGS_BY_BID_JSON = (
+    select(OrgORM.id, _org_document().label("doc"))
+    .join(OrgORM.building)
+    .where(OrgORM.b_id == bindparam("building_id"))
+    .order_by(OrgORM.id)
+    .limit(bindparam("limit", type_=Integer))
+)
+_ORGS_BY_BID_JSON_AFTER = _ORGS_BY_BID_JSON.where(OrgORM.id > bindparam("after_id"))
+
+
+_ORGS_BY_IDS_JSON = (
+    select(OrgORM.id, _org_document().label("doc"))
+    .join(OrgORM.building)
+    .where(OrgORM.id == _id_array("org_ids"))
+)
+
+
+# Режим документов (Database.use_documents): те же (id, doc), но из одной таблицы organization_documents
+_DOC = cast(OrgDocumentORM.doc, Text)
+
+_DOC_BY_ID = select(OrgDocumentORM.b_id, _DOC.label("doc")).where(OrgDocumentORM.org_id == bindparam("org_id"))
+
+_DOCS_BY_BID = (
+    select(OrgDocumentORM.org_id.label("id"), _DOC.label("doc"))
+    .where(OrgDocumentORM.b_id == bindparam("building_id"))
+    .order_by(OrgDocumentORM.org_id)
+    .limit(bindparam("limit", type_=Integer))
+)
+_DOCS_BY_BID_AFTER = _DOCS_BY_BID.where(OrgDocumentORM.org_id > bindparam("after_id"))
+
+_DOCS_BY_IDS = (
+    select(OrgDocumentORM.org_id.label("id"), _DOC.label("doc"))
+    .where(OrgDocumentORM.org_id == _id_array("org_ids"))
+)
+
+def _doc_in_activity_subtree(label: str, strict: bool = False):
+    # То же, что _in_activity_subtree, но по массивам документа: act_ids && (GIN) или act_paths ? lquery[] (GiST)
+    if ActivityTree.loaded():
+        act_ids = ActivityTree.ids(label) if strict else ActivityTree.subtree_ids(label)
+        if not act_ids:
+            return false()
+        return OrgDocumentORM.act_ids.overlap(bindparam("act_ids", list(act_ids), type_=ARRAY(Integer)))
+    
+    if strict:
+        return OrgDocumentORM.act_ids.overlap(
+            select(func.array_agg(ActORM.id)).where(ActORM.label == label).scalar_subquery()
+        )
+    
+    # 'a.b.*' совпадает с самим a.b и всеми его потомками
+    return OrgDocumentORM.act_paths.op("?")(
+        select(func.array_agg(literal_column("(activities.path::text || '.*')::lquery")))
+        .select_from(ActORM)
+        .where(ActORM.label == label)
+        .scalar_subquery()
+    )
+
+def _doc_with_distance(distance):
+    # distance в документе хранится как null и подставляется на лету
+    return cast(
+        func.jsonb_set(OrgDocumentORM.doc, literal_column("'{distance}'"), func.to_jsonb(distance)), Text
+    )
+
+
+def _title_search(query: str, cursor: str | None, prefix: bool) -> Tuple[Any, List[Any], tuple]:
+    ''' (sort_key, условия WHERE, ORDER BY) поиска по названию, курсор уже учтён в условиях '''
+    if prefix:
+        # Автодополнение: упорядоченный проход по ix_organizations_title_prefix. Префикс — диапазоном, как
+        # в _has_phone: LIKE с параметром в общем плане подготовленного запроса индекс не использует.
+        # lower() базы, а не str.lower(), чтобы граница совпадала с выражением индекса; U+10FFFF — наибольший
+        # символ, в порядке "C" все строки с префиксом лежат до prefix || U+10FFFF
+        sort_key = func.lower(OrgORM.title).collate("C")
+        lowered = func.lower(query)
+        where = [sort_key >= lowered, sort_key < lowered.concat(chr(0x10FFFF))]
+        if cursor is not None:
+            after_key, after_id = decode_cursor(cursor, str, int)
+            where.append(tuple_(sort_key, OrgORM.id) > tuple_(after_key, after_id))
+        return sort_key, where, (sort_key, OrgORM.id)
+    
+    # ILIKE '%...%' обслуживается GIN индексом ix_organizations_title_trgm
+    sort_key = func.similarity(OrgORM.title, query)
+    where = [OrgORM.title.ilike(f"%{_escape_like(query)}%")]
+    if cursor is not None:
+        after_key, after_id = decode_cursor(cursor, float, int)
+        where.append(or_(
+            sort_key < after_key,
+            and_(sort_key == after_key, OrgORM.id > after_id)
+        ))
+    return sort_key, where, (sort_key.desc(), OrgORM.id)
+
+def _orgs_by_activity(label: str, strict: bool = False, fields: Fields = None) -> Select:
+    return select(OrgORM).where(_in_activity_subtree(label, strict=strict)).options(*_org_options(fields))
+
+def normalize_phone(phone: str) -> str:
+    ''' Только цифры, как их хранит org_phones (функция phone_digits в postgres) '''
+    return re.sub(r"[^0-9]", "", phone)
+
+def _has_phone(org_id, digits: str, prefix: bool = False):
+    # EXISTS по PK org_phones (digits, org_id). Префикс — диапазоном, а не LIKE: ':' идёт сразу за '9',
+    # а LIKE с параметром в общем плане подготовленного запроса индекс не использует
+    if prefix:
+        match = and_(OrgPhoneORM.digits >= digits, OrgPhoneORM.digits < digits + ":")
+    else:
+        match = OrgPhoneORM.digits == digits
+    return exists().where(OrgPhoneORM.org_id == org_id, match)
+
+def _orgs_by_phone(digits: str, prefix: bool = False, fields: Fields = None) -> Select:
+    return select(OrgORM).where(_has_phone(OrgORM.id, digits, prefix)).options(*_org_options(fields))
+
+def _orgs_within_radius(lat: float, lon: float, radius: float, fields: Fields = None) -> Tuple[Select, tuple]:
+    ''' Организации в радиусе с расстоянием и ключ их порядка (distance, id) '''
+    point = _geog_point(lat, lon)
+    distance = func.ST_Distance(BuildORM.geog, point)
+    stmt = (
+        select(OrgORM, distance.label("distance"))
+        .join(OrgORM.building)
+        .options(*_org_options(fields, building=contains_eager))
+        .where(
+            func.ST_DWithin(BuildORM.geog, point, radius)
+        )
+    )
+    return stmt, (distance, OrgORM.id)
+
+def _buildings_within_radius(lat: float, lon: float, radius: float, fields: Fields = None) -> Tuple[Select, tuple]:
+    point = _geog_point(lat, lon)
+    distance = func.ST_Distance(BuildORM.geog, point)
+    stmt = (
+        select(BuildORM, distance.label("distance"))
+        .where(func.ST_DWithin(BuildORM.geog, point, radius))
+        .options(*_building_options(fields))
+    )
+    return stmt, (distance, BuildORM.id)
+
+def _activity_counts_where(*where) -> Select:
+    ''' (act_id, direct, subtree) по организациям, чьи здания проходят where: как activity_counts,
+    но на лету. Организация попадает в subtree предка один раз, сколько бы её деятельностей в нём ни было '''
+    anc = aliased(ActORM)
+    return (
+        select(
+            anc.id.label("act_id"),
+            func.count().filter(ActORM.id == anc.id).label("direct"),
+            func.count(OrgORM.id.distinct()).label("subtree")
+        )
+        .select_from(OrgORM)
+        .join(OrgORM.building)
+        .join(Relationship_AO, Relationship_AO.org_id == OrgORM.id)
+        .join(ActORM, ActORM.id == Relationship_AO.act_id)
+        .join(anc, ActORM.path.descendant_of(anc.path))
+        .where(*where)
+        .group_by(anc.id)
+    )
+
+_SET_TIMEOUT = text("SELECT set_config('statement_timeout', :value, true)")
+
+_ACTIVITY_COUNTS = select(ActivityCountORM.act_id, ActivityCountORM.direct, ActivityCountORM.subtree)
+
+
+def _id_page(stmt, after_stmt, limit: int, cursor: str | None, **params: Any):
+    ''' Готовый запрос страницы по id и его параметры: с курсором — вариант с id > after_id '''
+    params["limit"] = limit + 1
+    if cursor is None:
+        return stmt, params
+    params["after_id"], = decode_cursor(cursor, int)
+    return after_stmt, params
+
+
+# Сессия текущего HTTP запроса (Database.request_scope): методы чтения берут её вместо новой
+_request_session: ContextVar[AsyncSession | None] = ContextVar("request_session", default=None)
+
+def _hashable(value: Any) -> Any:
+    return tuple(value) if isinstance(value, list) else value
+
+def coalesced(*coordinates: str):
+    ''' Одинаковые параллельные вызовы метода ждут один запрос (Database.set_coalescing).
+    coordinates — параметры-координаты: они округляются и в ключе, и в самом запросе, поэтому почти
+    совпадающие точки дают один запрос, а все его ждущие получают ответ ровно для своих аргументов '''
+    def decorator(fn):
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        async def wrapper(cls, *args, **kwargs):
+            if cls._flights is None:
+                return await fn(cls, *args, **kwargs)
+            
+            bound = signature.bind(cls, *args, **kwargs)
+            bound.apply_defaults()
+            for name in coordinates:
+                bound.arguments[name] = round(bound.arguments[name], cls._coord_digits)
+            key = (fn.__qualname__, *(_hashable(value) for value in list(bound.arguments.values())[1:]))
+            return await cls._coalesce(key, lambda: fn(*bound.args, **bound.kwargs))
+        return wrapper
+    return decorator
 
 class Database:
     _engine = None
     _sessionmaker = None
+    _engine_options: Dict[str, Any] = {}
+    _cache: CacheBackend = LRUCache(0, 0) # выключен, пока не задан через set_cache
+    _documents = False # JSON организаций из organization_documents, а не сборкой по четырём таблицам
+    _flights: SingleFlight | None = None # склейка одинаковых параллельных запросов, None — выключена
+    _coord_digits = 5
+    _default_timeout = 0 # statement_timeout соединений пула в мс (0 — без ограничения)
+    _timeouts: Dict[str, int] = {} # метод DAO (Database.nearest_organizations) -> свой statement_timeout в мс
     
     @classmethod
-    async def init(cls, db_url: str, max_conn: int):
-        cls._engine = create_async_engine(db_url, echo=False, pool_size=max_conn)
+    async def init(cls, db_url: str, max_conn: int, prewarm: int = 1, **engine_options):
+        # Схема целиком на миграциях alembic (alembic upgrade head), при старте никакого DDL.
+        # engine_options (max_overflow, pool_timeout, ...) применяются и к пулам реплик
+        cls._engine_options = engine_options
+        cls._engine = cls._create_engine(db_url, max_conn)
         cls._sessionmaker = async_sessionmaker(cls._engine, expire_on_commit=False)
-        async with cls._engine.begin() as conn:
-            '''await conn.execute(text(
-                "CREATE EXTENSION IF NOT EXISTS ltree;"  Генерируется в generate_test_data, при проде нужно вернуть
-            ))
-            await conn.run_sync(Base.metadata.create_all)''' 
-            ...
+        await cls.prewarm(min(max(prewarm, 1), max_conn))
         logger.info(
             "[+] Database engine initialized with max {} connections;", max_conn
         )
         return cls._engine
 
+    @classmethod
+    async def init_replicas(
+        cls, replica_urls: List[str], max_conn: int, balance: str, max_lag: float | None, check_interval: float,
+        prewarm: int = 1
+    ):
+        # Все методы чтения идут на реплики; без реплик (или без здоровых) — на primary
+        engines = [cls._create_engine(url, max_conn) for url in replica_urls]
+        await Replicas.init(engines, balance, max_lag, check_interval)
+        for replica in Replicas.healthy():
+            await cls.prewarm(min(max(prewarm, 1), max_conn), replica.engine)
+
+    @classmethod
+    def _create_engine(cls, db_url: str, max_conn: int):
+        engine = create_async_engine(
+            db_url, echo=False, pool_size=max_conn, poolclass=TimedPool, **cls._engine_options
+        )
+        Metrics.instrument(engine)
+        return engine
+
+    @classmethod
+    def _read_session(cls) -> AsyncSession:
+        session = Replicas.session()
+        return session if session is not None else cls._sessionmaker()
+
+    @classmethod
+    @asynccontextmanager
+    async def request_scope(cls) -> AsyncIterator[AsyncSession]:
+        ''' Одна сессия (и одно соединение из пула) на весь запрос, сколько бы методов Database он ни вызвал.
+        Соединение берётся лениво, при первом запросе к базе. Сессию нельзя использовать из параллельных задач '''
+        session = cls._read_session()
+        token = _request_session.set(session)
+        try:
+            yield session
+        finally:
+            _request_session.reset(token)
+            await session.close()
+
+    @classmethod
+    @asynccontextmanager
+    async def _session(cls) -> AsyncIterator[AsyncSession]:
+        session = _request_session.get()
+        if session is not None:
+            await cls._apply_timeout(session)
+            yield session
+            return
+        
+        async with cls._read_session() as session:
+            await cls._apply_timeout(session)
+            yield session
+
+    @classmethod
+    def set_statement_timeouts(cls, default: int, per_method: Dict[str, int]):
+        ''' default уже выставлен соединениям (server_settings при создании пула), здесь он нужен,
+        чтобы вернуть его методу без своего бюджета после метода с бюджетом в той же сессии '''
+        cls._default_timeout = default
+        cls._timeouts = per_method
+
+    @classmethod
+    async def _apply_timeout(cls, session: AsyncSession):
+        # SET LOCAL через set_config: действует до конца транзакции сессии, соседние запросы пула не задевает.
+        # Лишний запрос уходит, только если бюджет метода отличается от уже выставленного в этой сессии
+        if not cls._timeouts:
+            return
+        
+        timeout = cls._timeouts.get(current_method(), cls._default_timeout)
+        if session.info.get("statement_timeout", cls._default_timeout) != timeout:
+            await session.execute(_SET_TIMEOUT, {"value": f"{timeout}ms"})
+            session.info["statement_timeout"] = timeout
+
+    @classmethod
+    async def _stream(cls, stmt: Select, limit: int, batch: int) -> AsyncIterator[Row]:
+        ''' Строки по мере чтения из серверного курсора, по batch за раз. Сессия своя, а не запроса:
+        ответ дочитывается уже после выхода из request_scope. Соединение занято, пока поток не закончится '''
+        async with cls._read_session() as session:
+            await cls._apply_timeout(session)
+            result = await session.stream(stmt.limit(limit).execution_options(yield_per=batch))
+            async for partition in result.partitions():
+                for row in partition:
+                    yield row
+
+    @classmethod
+    @instrumented
+    async def prewarm(cls, size: int, engine=None):
+        # Открываем соединения заранее и одновременно: первые запросы не платят за TCP/auth/handshake.
+        # Закрытые AsyncConnection возвращаются в пул и остаются открытыми (до pool_size)
+        engine = engine or cls._engine
+        conns = await asyncio.gather(*(engine.connect() for _ in range(size)), return_exceptions=True)
+        try:
+            for conn in conns:
+                if isinstance(conn, BaseException):
+                    raise conn
+            await asyncio.gather(*(conn.execute(text("SELECT 1")) for conn in conns))
+        finally:
+            await asyncio.gather(*(conn.close() for conn in conns if not isinstance(conn, BaseException)))
+
+    @classmethod
+    @instrumented
+    async def preload_cache(cls, limit: int, raw: bool):
+        # Прогрев кэша org-by-id одним запросом вместо limit отдельных
+        if limit <= 0:
+            return
+        
+        since = cls._cache.version()
+        async with cls._session() as session:
+            if raw:
+                rows = (await session.execute(
+                    select(OrgORM.id, OrgORM.b_id, _org_document().label("doc"))
+                    .join(OrgORM.building)
+                    .order_by(OrgORM.id)
+                    .limit(limit)
+                )).all()
+                for row in rows:
+                    await cls._cache.set(
+                        f"org-by-id-json:{row.id}", row.doc.encode(),
+                        [f"org:{row.id}", f"building:{row.b_id}"], since
+                    )
+            else:
+                rows = (await session.execute(
+                    select(OrgORM)
+                    .options(
+                        selectinload(OrgORM.activities),
+                        joinedload(OrgORM.building)
+                    )
+                    .order_by(OrgORM.id)
+                    .limit(limit)
+                )).scalars().all()
+                for model in rows:
+                    await cls._cache.set(
+                        f"org-by-id:{model.id}", model,
+                        [f"org:{model.id}", f"building:{model.b_id}"], since
+                    )
+        
+        logger.info("[+] Cache preloaded with {} organizations;", len(rows))
+
     @classmethod
     async def close(cls):
+        await Replicas.close()
         if cls._engine:
             await cls._engine.dispose()
             logger.info("[+] Database engine successfully closed;")
+
+    @classmethod
+    def set_cache(cls, cache: CacheBackend):
+        cls._cache = cache
+
+    @classmethod
+    def use_documents(cls, enabled: bool):
+        cls._documents = enabled
+
+    @classmethod
+    def set_coalescing(cls, enabled: bool, coord_digits: int = 5):
+        ''' coord_digits — знаков после запятой у координат в радиусных запросах (5 — около метра) '''
+        cls._flights = SingleFlight() if enabled else None
+        cls._coord_digits = coord_digits
+
+    @classmethod
+    def coalesce_stats(cls) -> Tuple[Dict[str, int], Dict[str, int]] | None:
+        return cls._flights.stats() if cls._flights is not None else None
+
+    @classmethod
+    async def _coalesce(cls, key: Any, load):
+        # Ведущий вызов идёт сессией своего запроса, ждущие получают его результат без похода в базу
+        if cls._flights is None:
+            return await load()
+        return await cls._flights.run(current_method(), key, load)
+
+    @classmethod
+    async def _read_through(cls, key: str, load):
+        # load() -> (значение, теги); по тегам запись снимается уведомлениями из postgres.
+        # Промахи по одному ключу склеиваются: в базу идёт один запрос, остальные ждут его
+        value = await cls._cache.get(key)
+        if value is MISSING:
+            async def fill():
+                since = cls._cache.version()
+                value, tags = await load()
+                await cls._cache.set(key, value, tags, since)
+                return value
             
+            value = await cls._coalesce(key, fill)
+        return value
+
     @classmethod
-    async def get_organization_by_id(cls, org_id: int) -> OrgORM | None:
-        async with cls._sessionmaker() as session:
-            stmt = (
-                select(OrgORM)
-                .where(OrgORM.id == org_id)
-                .options(
-                    selectinload(OrgORM.activities),
-                    joinedload(OrgORM.building)
-                )
+    async def on_directory_change(cls, payload: str | None):
+        # payload от триггеров notify_*_changed: {"table": ..., "org": [...], "building": [...]} или {"all": true}
+        change = json.loads(payload) if payload else {"all": True}
+        if change.get("all"):
+            await cls._invalidate(None)
+            return
+        
+        await cls._invalidate(
+            [f"org:{org_id}" for org_id in change.get("org") or ()]
+            + [f"building:{building_id}" for building_id in change.get("building") or ()]
+        )
+
+    @classmethod
+    async def _invalidate(cls, tags: List[str] | None):
+        # tags=None — сбросить всё
+        if cls._flights is not None:
+            cls._flights.forget()
+        await (cls._cache.clear() if tags is None else cls._cache.invalidate(tags))
+        if Replicas.enabled():
+            # Уведомление приходит с primary раньше, чем реплика применит изменение: промах в этом окне
+            # закэшировал бы старое значение. Повторный сброс после settle_delay его убирает
+            asyncio.get_running_loop().call_later(
+                Replicas.settle_delay(),
+                lambda: asyncio.ensure_future(cls._cache.clear() if tags is None else cls._cache.invalidate(tags))
             )
+
+    @classmethod
+    async def on_activities_change(cls, payload: str | None):
+        # Деятельности меняются крайне редко, а попадают почти в каждый документ — проще сбросить всё
+        await cls._invalidate(None)
             
-            result = await session.execute(stmt)
-            return result.scalar_one_or_none()
+    @classmethod
+    @instrumented
+    async def get_organization_by_id(cls, org_id: int, fields: Fields = None) -> OrgORM | None:
+        async def load():
+            async with cls._session() as session:
+                model = (await session.execute(_org_by_id(fields), {"org_id": org_id})).scalar_one_or_none()
+                tags = [f"org:{org_id}"] + ([f"building:{model.b_id}"] if model else [])
+                return model, tags
+        
+        return await cls._read_through(f"org-by-id:{org_id}{_fields_key(fields)}", load)
 
     @classmethod
-    async def get_organizations_by_bid(cls, building_id: int) -> List[OrgORM] | None:
-        async with cls._sessionmaker() as session:
-            stmt = (
-                select(OrgORM)
-                .where(OrgORM.b_id == building_id)
-                .options(
-                    selectinload(OrgORM.activities),
-                    joinedload(OrgORM.building)
-                )
+    @instrumented
+    async def get_organization_by_id_json(cls, org_id: int) -> bytes | None:
+        async def load():
+            async with cls._session() as session:
+                stmt = _DOC_BY_ID if cls._documents else _ORG_BY_ID_JSON
+                row = (await session.execute(stmt, {"org_id": org_id})).one_or_none()
+                if row is None:
+                    return None, [f"org:{org_id}"]
+                return row.doc.encode(), [f"org:{org_id}", f"building:{row.b_id}"]
+        
+        return await cls._read_through(f"org-by-id-json:{org_id}", load)
+
+    @classmethod
+    async def _org_page_json(
+        cls, stmt, params: Dict[str, Any], limit: int, key=lambda row: (row.id,)
+    ) -> Tuple[bytes | None, List[int]]:
+        # stmt выбирает (id, doc, ...) с limit + 1; key — ключ курсора, по умолчанию id
+        async with cls._session() as session:
+            rows, next_cursor = split_page((await session.execute(stmt, params)).all(), limit, key)
+            body = _page_json([row.doc for row in rows], next_cursor) if rows else None
+            return body, [row.id for row in rows]
+
+    @classmethod
+    @instrumented
+    async def get_organizations_by_bid_json(
+        cls, building_id: int, limit: int, cursor: str | None = None
+    ) -> bytes | None:
+        async def load():
+            stmt, after_stmt = (
+                (_DOCS_BY_BID, _DOCS_BY_BID_AFTER) if cls._documents else (_ORGS_BY_BID_JSON, _ORGS_BY_BID_JSON_AFTER)
+            )
+            body, org_ids = await cls._org_page_json(
+                *_id_page(stmt, after_stmt, limit, cursor, building_id=building_id), limit
+            )
+            return body, [f"building:{building_id}"] + [f"org:{org_id}" for org_id in org_ids]
+        
+        return await cls._read_through(f"org-by-bid-json:{building_id}:{limit}:{cursor}", load)
+
+    @classmethod
+    @instrumented
+    @coalesced()
+    async def get_organizations_by_activity_json(
+        cls, label: str, limit: int, cursor: str | None = None, strict: bool = False
+    ) -> bytes | None:
+        if cls._documents:
+            stmt = keyset_page(
+                select(OrgDocumentORM.org_id.label("id"), _DOC.label("doc"))
+                .where(_doc_in_activity_subtree(label, strict=strict)),
+                (OrgDocumentORM.org_id,), limit, cursor, int
+            )
+        else:
+            stmt = keyset_page(
+                select(OrgORM.id, _org_document().label("doc"))
+                .join(OrgORM.building)
+                .where(_in_activity_subtree(label, strict=strict)),
+                (OrgORM.id,), limit, cursor, int
+            )
+        body, _ = await cls._org_page_json(stmt, {}, limit)
+        return body
+
+    @classmethod
+    @instrumented
+    @coalesced()
+    async def search_for_organizations_json(
+        cls, query: str, limit: int, cursor: str | None = None, prefix: bool = False
+    ) -> bytes | None:
+        ''' Только в режиме документов: совпадения ищутся по индексам organizations, документ берётся по PK '''
+        sort_key, where, order = _title_search(query, cursor, prefix)
+        stmt = (
+            select(OrgDocumentORM.org_id.label("id"), _DOC.label("doc"), sort_key.label("sort_key"))
+            .join(OrgORM, OrgORM.id == OrgDocumentORM.org_id)
+            .where(*where)
+            .order_by(*order)
+            .limit(limit + 1)
+        )
+        body, _ = await cls._org_page_json(stmt, {}, limit, key=lambda row: (row.sort_key, row.id))
+        return body
+
+    @classmethod
+    @instrumented
+    @coalesced()
+    async def get_organizations_by_phone_json(
+        cls, phone: str, limit: int, cursor: str | None = None, prefix: bool = False
+    ) -> bytes | None:
+        ''' phone в любом формате, сравниваются только цифры; prefix — номера, начинающиеся с них '''
+        digits = normalize_phone(phone)
+        if not digits:
+            return None
+        
+        if cls._documents:
+            stmt = select(OrgDocumentORM.org_id.label("id"), _DOC.label("doc")).where(
+                _has_phone(OrgDocumentORM.org_id, digits, prefix)
+            )
+            stmt = keyset_page(stmt, (OrgDocumentORM.org_id,), limit, cursor, int)
+        else:
+            stmt = keyset_page(
+                select(OrgORM.id, _org_document().label("doc"))
+                .join(OrgORM.building)
+                .where(_has_phone(OrgORM.id, digits, prefix)),
+                (OrgORM.id,), limit, cursor, int
+            )
+        body, _ = await cls._org_page_json(stmt, {}, limit)
+        return body
+
+    @classmethod
+    @instrumented
+    @coalesced("lat", "lon")
+    async def organizations_within_radius_json(
+        cls, lat: float, lon: float, radius: float, limit: int, cursor: str | None = None
+    ) -> bytes | None:
+        ''' Только в режиме документов: ST_DWithin по ix_organization_documents_geog, без join '''
+        point = _geog_point(lat, lon)
+        distance = func.ST_Distance(OrgDocumentORM.geog, point)
+        stmt = keyset_page(
+            select(
+                OrgDocumentORM.org_id.label("id"), distance.label("distance"), _doc_with_distance(distance).label("doc")
             )
+            .where(func.ST_DWithin(OrgDocumentORM.geog, point, radius)),
+            (distance, OrgDocumentORM.org_id), limit, cursor, float, int
+        )
+        body, _ = await cls._org_page_json(stmt, {}, limit, key=lambda row: (row.distance, row.id))
+        return body
+
+    @classmethod
+    @instrumented
+    @coalesced("lat", "lon")
+    async def nearest_organizations_json(
+        cls, lat: float, lon: float, limit: int, cursor: str | None = None, label: str | None = None
+    ) -> bytes | None:
+        ''' Только в режиме документов: KNN по ix_organization_documents_geog '''
+        point = _geog_point(lat, lon)
+        # Порядок и курсор — по <-> (индекс), в ответ — точное ST_Distance по сфероиду
+        knn = OrgDocumentORM.geog.op("<->", return_type=Float)(point)
+        distance = func.ST_Distance(OrgDocumentORM.geog, point)
+        stmt = select(
+            OrgDocumentORM.org_id.label("id"), knn.label("knn"), _doc_with_distance(distance).label("doc")
+        )
+        if label is not None:
+            stmt = stmt.where(_doc_in_activity_subtree(label))
+        stmt = keyset_page(stmt, (knn, OrgDocumentORM.org_id), limit, cursor, float, int)
+        body, _ = await cls._org_page_json(stmt, {}, limit, key=lambda row: (row.knn, row.id))
+        return body
+
+    @classmethod
+    @instrumented
+    async def get_organizations_by_bid(
+        cls, building_id: int, limit: int, cursor: str | None = None, fields: Fields = None
+    ) -> Tuple[List[OrgORM], str | None]:
+        async def load():
+            async with cls._session() as session:
+                stmt, params = _id_page(*_orgs_by_bid(fields), limit, cursor, building_id=building_id)
+                result = await session.execute(stmt, params)
+                page = split_page(result.scalars().all(), limit, lambda org: (org.id,))
+                return page, [f"building:{building_id}"] + [f"org:{org.id}" for org in page[0]]
+        
+        return await cls._read_through(f"org-by-bid:{building_id}:{limit}:{cursor}{_fields_key(fields)}", load)
+    
+    @classmethod
+    @instrumented
+    @coalesced()
+    async def get_organizations_by_activity(
+        cls, label: str, limit: int, cursor: str | None = None, strict: bool = False, fields: Fields = None
+    ) -> Tuple[List[OrgORM], str | None]:
+        async with cls._session() as session:
+            stmt = keyset_page(_orgs_by_activity(label, strict, fields), (OrgORM.id,), limit, cursor, int)
             
             result = await session.execute(stmt)
-            return result.scalars().all() if result else None
-    
+            return split_page(result.scalars().all(), limit, lambda org: (org.id,))
+
     @classmethod
-    async def get_organizations_by_activity(cls, label: str, strict: bool = False) -> List[OrgORM] | None:
-        async with cls._sessionmaker() as session:
-            if strict:
-                stmt = (
-                    select(OrgORM)
-                    .join(OrgORM.activities)
-                    .options(
-                        selectinload(OrgORM.activities),
-                        joinedload(OrgORM.building)
-                    )
-                    .where(ActORM.label == label)
-                )
-            else:
-                parent_path = (await session.execute(
-                    select(ActORM.path)
-                    .where(ActORM.label == label)
-                )).scalar_one_or_none()
-                
-                if parent_path is None:
-                    return None
-                
-                allowed_act_ids = (await session.execute(
-                    select(ActORM.id)
-                    .where(ActORM.path.descendant_of(parent_path))
-                )).scalars().all()
-                
-                stmt = (
-                    select(OrgORM)
-                    .join(OrgORM.activities)
-                    .options(
-                        selectinload(OrgORM.activities),
-                        joinedload(OrgORM.building)
-                    )
-                    .where(ActORM.id.in_(allowed_act_ids))
-                )
+    @instrumented
+    async def stream_organizations_by_activity(
+        cls, label: str, limit: int, cursor: str | None = None, strict: bool = False, batch: int = 500,
+        fields: Fields = None
+    ) -> AsyncIterator[OrgORM]:
+        stmt = keyset_after(_orgs_by_activity(label, strict, fields), (OrgORM.id,), cursor, int)
+        async for row in cls._stream(stmt, limit, batch):
+            yield row[0]
+        
+    @classmethod
+    @instrumented
+    @coalesced()
+    async def get_organizations_by_phone(
+        cls, phone: str, limit: int, cursor: str | None = None, prefix: bool = False, fields: Fields = None
+    ) -> Tuple[List[OrgORM], str | None]:
+        digits = normalize_phone(phone)
+        if not digits:
+            return [], None
+        
+        async with cls._session() as session:
+            stmt = keyset_page(_orgs_by_phone(digits, prefix, fields), (OrgORM.id,), limit, cursor, int)
             
             result = await session.execute(stmt)
-            return result.scalars().all() if result else None
+            return split_page(result.scalars().all(), limit, lambda org: (org.id,))
+
+    @classmethod
+    @instrumented
+    @coalesced()
+    async def search_for_organizations(
+        cls, query: str, limit: int, cursor: str | None = None, prefix: bool = False, fields: Fields = None
+    ) -> Tuple[List[OrgORM], str | None]:
+        sort_key, where, order = _title_search(query, cursor, prefix)
+        stmt = (
+            select(OrgORM, sort_key)
+            .where(*where)
+            .order_by(*order)
+            .options(*_org_options(fields))
+            .limit(limit + 1)
+        )
         
+        async with cls._session() as session:
+            result = await session.execute(stmt)
+            rows, next_cursor = split_page(result.all(), limit, lambda row: (row[1], row[0].id))
+            return [row[0] for row in rows], next_cursor
+
     @classmethod
-    async def search_for_organizations(cls, query: str) -> List[OrgORM] | None:
-        async with cls._sessionmaker() as session:
-            stmt = (
-                select(OrgORM)
-                .where(
-                    OrgORM.title.ilike(f"%{query}%")
-                )
-                .options(
-                    selectinload(OrgORM.activities),
-                    joinedload(OrgORM.building)
-                )
-            )
+    @instrumented
+    @coalesced("lat", "lon")
+    async def organizations_within_radius(
+        cls, lat: float, lon: float, radius: float, limit: int, cursor: str | None = None, fields: Fields = None
+    ) -> Tuple[List[Tuple[OrgORM, float]], str | None]:
+        stmt, keys = _orgs_within_radius(lat, lon, radius, fields)
+        async with cls._session() as session:
+            result = await session.execute(keyset_page(stmt, keys, limit, cursor, float, int))
+            
+            return split_page(result.all(), limit, lambda row: (row.distance, row[0].id))
+
+    @classmethod
+    @instrumented
+    async def stream_organizations_within_radius(
+        cls, lat: float, lon: float, radius: float, limit: int, cursor: str | None = None, batch: int = 500,
+        fields: Fields = None
+    ) -> AsyncIterator[Tuple[OrgORM, float]]:
+        stmt, keys = _orgs_within_radius(lat, lon, radius, fields)
+        async for row in cls._stream(keyset_after(stmt, keys, cursor, float, int), limit, batch):
+            yield row[0], row.distance
+    
+    @classmethod
+    @instrumented
+    @coalesced("lat", "lon")
+    async def buildings_within_radius(
+        cls, lat: float, lon: float, radius: float, limit: int, cursor: str | None = None, fields: Fields = None
+    ) -> Tuple[List[BuildORM], str | None]:
+        stmt, keys = _buildings_within_radius(lat, lon, radius, fields)
+        async with cls._session() as session:
+            stmt = keyset_page(stmt, keys, limit, cursor, float, int)
             
             result = await session.execute(stmt)
-            return result.scalars().all() if result else None
+            rows, next_cursor = split_page(result.all(), limit, lambda row: (row.distance, row[0].id))
+            
+            return [row[0] for row in rows], next_cursor
 
     @classmethod
-    async def organizations_within_radius(cls, lat: float, lon: float, radius: float) -> List[OrgORM] | None:
-        print(lat, lon, radius)
-        async with cls._sessionmaker() as session:
-            stmt = (
-                select(OrgORM)
-                .join(BuildORM, BuildORM.id == OrgORM.b_id)
-                .options(
-                    joinedload(OrgORM.building),
-                    selectinload(OrgORM.activities)
-                )
-                .where(
-                    func.ST_DWithin(
-                        cast(func.ST_SetSRID(
-                            func.ST_MakePoint(BuildORM.lon, BuildORM.lat),
-                            4326
-                        ), Geography),
-                        cast(func.ST_SetSRID(
-                            func.ST_MakePoint(lon, lat),
-                            4326
-                        ), Geography),
-                        radius
-                    )
-                )
-                .options(
-                    selectinload(OrgORM.activities)
-                )
+    @instrumented
+    async def stream_buildings_within_radius(
+        cls, lat: float, lon: float, radius: float, limit: int, cursor: str | None = None, batch: int = 500,
+        fields: Fields = None
+    ) -> AsyncIterator[BuildORM]:
+        stmt, keys = _buildings_within_radius(lat, lon, radius, fields)
+        async for row in cls._stream(keyset_after(stmt, keys, cursor, float, int), limit, batch):
+            yield row[0]
+
+    @classmethod
+    @instrumented
+    @coalesced()
+    async def buildings_in_bbox(
+        cls, min_lon: float, min_lat: float, max_lon: float, max_lat: float, limit: int, cursor: str | None = None,
+        fields: Fields = None
+    ) -> Tuple[List[BuildORM], str | None]:
+        async with cls._session() as session:
+            stmt = keyset_page(
+                select(BuildORM)
+                .where(_in_bbox(min_lon, min_lat, max_lon, max_lat))
+                .options(*_building_options(fields)),
+                (BuildORM.id,), limit, cursor, int
             )
             
             result = await session.execute(stmt)
-            
-            return result.scalars().all() if result else None
-    
+            return split_page(result.scalars().all(), limit, lambda building: (building.id,))
+
+    @classmethod
+    @instrumented
+    @coalesced()
+    async def building_clusters(
+        cls, min_lon: float, min_lat: float, max_lon: float, max_lat: float, cell: float
+    ) -> List[Dict[str, Any]]:
+        # Сетка cell x cell градусов считается в базе, наружу уходят только непустые ячейки
+        orgs = select(func.count()).where(OrgORM.b_id == BuildORM.id).scalar_subquery()
+        buildings = (
+            select(
+                BuildORM.id, BuildORM.lat, BuildORM.lon,
+                orgs.label("orgs"),
+                func.floor(BuildORM.lon / cell).label("gx"),
+                func.floor(BuildORM.lat / cell).label("gy")
+            )
+            .where(_in_bbox(min_lon, min_lat, max_lon, max_lat))
+            .subquery()
+        )
+        count = func.count()
+        stmt = (
+            select(
+                func.avg(buildings.c.lat).label("lat"),
+                func.avg(buildings.c.lon).label("lon"),
+                count.label("buildings"),
+                func.sum(buildings.c.orgs).label("organizations"),
+                # Одиночное здание фронтенд рисует как здание, а не как кластер
+                case((count == 1, func.min(buildings.c.id)), else_=null()).label("building_id")
+            )
+            .group_by(buildings.c.gx, buildings.c.gy)
+            .order_by(buildings.c.gy, buildings.c.gx)
+        )
+        
+        async with cls._session() as session:
+            return [
+                {
+                    "lat": row.lat,
+                    "lon": row.lon,
+                    "buildings": row.buildings,
+                    "organizations": int(row.organizations),
+                    "building_id": row.building_id
+                }
+                for row in (await session.execute(stmt)).all()
+            ]
+
+    @classmethod
+    @instrumented
+    @coalesced()
+    async def activity_counts(cls) -> Dict[int, Tuple[int, int]]:
+        ''' act_id -> (direct, subtree) из activity_counts, которую ведут триггеры; узлов без организаций нет '''
+        async with cls._session() as session:
+            rows = (await session.execute(_ACTIVITY_COUNTS)).all()
+            return {row.act_id: (row.direct, row.subtree) for row in rows}
+
     @classmethod
-    async def buildings_within_radius(cls, lat: float, lon: float, radius: float) -> List[BuildORM] | None:
-        async with cls._sessionmaker() as session:
+    @instrumented
+    @coalesced("lat", "lon")
+    async def activity_counts_within_radius(cls, lat: float, lon: float, radius: float) -> Dict[int, Tuple[int, int]]:
+        point = _geog_point(lat, lon)
+        async with cls._session() as session:
+            rows = (await session.execute(
+                _activity_counts_where(func.ST_DWithin(BuildORM.geog, point, radius))
+            )).all()
+            return {row.act_id: (row.direct, row.subtree) for row in rows}
+
+    @classmethod
+    @instrumented
+    @coalesced()
+    async def activity_counts_in_bbox(
+        cls, min_lon: float, min_lat: float, max_lon: float, max_lat: float
+    ) -> Dict[int, Tuple[int, int]]:
+        async with cls._session() as session:
+            rows = (await session.execute(
+                _activity_counts_where(_in_bbox(min_lon, min_lat, max_lon, max_lat))
+            )).all()
+            return {row.act_id: (row.direct, row.subtree) for row in rows}
+
+    @classmethod
+    @instrumented
+    @coalesced("lat", "lon")
+    async def nearest_organizations(
+        cls, lat: float, lon: float, limit: int, cursor: str | None = None, label: str | None = None,
+        fields: Fields = None
+    ) -> Tuple[List[Tuple[OrgORM, float]], str | None]:
+        point = _geog_point(lat, lon)
+        # KNN: порядок отдаёт сам GiST индекс по buildings.geog. <-> считает по сфере, поэтому он
+        # только для порядка и курсора, а в ответ идёт ST_Distance по сфероиду, как в inRadius
+        knn = BuildORM.geog.op("<->", return_type=Float)(point)
+        distance = func.ST_Distance(BuildORM.geog, point)
+        async with cls._session() as session:
             stmt = (
-                select(BuildORM)
-                .where(
-                    func.ST_DWithin(
-                        cast(func.ST_SetSRID(
-                            func.ST_MakePoint(BuildORM.lon, BuildORM.lat),
-                            4326
-                        ), Geography),
-                        cast(func.ST_SetSRID(
-                            func.ST_MakePoint(lon, lat),
-                            4326
-                        ), Geography),
-                        radius
-                    )
-                ).options(
-                    selectinload(BuildORM.orgs)
-                )
+                select(OrgORM, distance.label("distance"), knn.label("knn"))
+                .join(OrgORM.building)
+                .options(*_org_options(fields, building=contains_eager))
             )
+            if label is not None:
+                stmt = stmt.where(_in_activity_subtree(label))
+            stmt = keyset_page(stmt, (knn, OrgORM.id), limit, cursor, float, int)
             
             result = await session.execute(stmt)
+            rows, next_cursor = split_page(result.all(), limit, lambda row: (row.knn, row[0].id))
             
-            return result.scalars().all() if result else None
+            return [(row[0], row.distance) for row in rows], next_cursor
+
+    @classmethod
+    @instrumented
+    async def get_organizations_by_ids(
+        cls, org_ids: List[int], fields: Fields = None
+    ) -> Tuple[Dict[int, OrgORM], List[int]]:
+        org_ids = list(dict.fromkeys(org_ids))
+        async with cls._session() as session:
+            result = await session.execute(_orgs_by_ids(fields), {"org_ids": org_ids})
+            found = {org.id: org for org in result.scalars().all()}
+            return found, [org_id for org_id in org_ids if org_id not in found]
+
+    @classmethod
+    @instrumented
+    async def get_organizations_by_ids_json(cls, org_ids: List[int]) -> bytes:
+        org_ids = list(dict.fromkeys(org_ids))
+        async with cls._session() as session:
+            stmt = _DOCS_BY_IDS if cls._documents else _ORGS_BY_IDS_JSON
+            docs = (await session.execute(stmt, {"org_ids": org_ids})).all()
+            found = {row.id for row in docs}
+            return _batch_json(docs, [org_id for org_id in org_ids if org_id not in found])
+
+    @classmethod
+    @instrumented
+    async def get_buildings_by_ids(
+        cls, building_ids: List[int], fields: Fields = None
+    ) -> Tuple[Dict[int, BuildORM], List[int]]:
+        building_ids = list(dict.fromkeys(building_ids))
+        async with cls._session() as session:
+            result = await session.execute(_buildings_by_ids(fields), {"building_ids": building_ids})
+            found = {building.id: building for building in result.scalars().all()}
+            return found, [building_id for building_id in building_ids if building_id not in found]
@@ -0,0 +1,90 @@
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.future import select
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from loguru import logger
+from typing import Awaitable, Callable, Set
+import asyncio
+
+from database.orm import DataVersionORM
+from metrics import instrumented
+
+
+class DataVersion:
+    ''' Версия справочника из таблицы data_version (её двигают триггеры). Из неё строятся ETag и Last-Modified,
+    поэтому они совпадают у всех процессов и реплик приложения '''
+    _sessionmaker: async_sessionmaker | None = None
+    _settle: Callable[[], float] | None = None
+    _version: int | None = None
+    _etag: str | None = None
+    _last_modified: str | None = None
+    _pending: Set[asyncio.Task] = set() # обработчики before_bump, которые ещё выполняются
+
+    @classmethod
+    async def load(cls, sessionmaker: async_sessionmaker, settle: Callable[[], float] | None = None):
+        ''' settle — через сколько секунд новая версия становится видна на репликах: до этого ответы,
+        прочитанные с отстающей реплики, не должны получить новый ETag '''
+        cls._sessionmaker = sessionmaker
+        cls._settle = settle
+        await cls.refresh()
+
+    @classmethod
+    @instrumented
+    async def refresh(cls):
+        async with cls._sessionmaker() as session:
+            row = (await session.execute(
+                select(DataVersionORM.version, DataVersionORM.changed_at)
+            )).one()
+
+        cls._set(row.version, row.changed_at, force=True)
+        logger.info("[+] Data version {} loaded;", row.version)
+
+    @classmethod
+    def before_bump(cls, handler: Callable[[str | None], Awaitable[None]]) -> Callable[[str | None], Awaitable[None]]:
+        ''' Обработчик уведомления, от которого зависят ответы (дерево деятельностей, сброс кэша): новая версия
+        выставляется только после того, как закончатся все такие обработчики, начатые раньше её уведомления '''
+        async def tracked(payload: str | None):
+            task = asyncio.current_task()
+            cls._pending.add(task)
+            try:
+                await handler(payload)
+            finally:
+                cls._pending.discard(task)
+        return tracked
+
+    @classmethod
+    async def on_change(cls, payload: str | None):
+        # payload от bump_data_version: "<version> <epoch>"; None — после переподключения, читаем заново.
+        # Триггеры *_changed срабатывают раньше *_version (по имени), их уведомления приходят раньше, а задачи
+        # обработчиков стартуют в порядке создания: к этому моменту все они уже в _pending
+        pending = set(cls._pending)
+        if pending:
+            await asyncio.wait(pending)
+
+        if payload is None:
+            await cls.refresh()
+            return
+
+        version, epoch = payload.split(" ", 1)
+        if cls._settle is not None:
+            await asyncio.sleep(cls._settle())
+        cls._set(int(version), datetime.fromtimestamp(float(epoch), timezone.utc))
+
+    @classmethod
+    def etag(cls) -> str | None:
+        return cls._etag
+
+    @classmethod
+    def last_modified(cls) -> str | None:
+        return cls._last_modified
+
+    @classmethod
+    def _set(cls, version: int, changed_at: datetime, force: bool = False):
+        # Уведомления одной транзакции приходят пачкой и могут обогнать друг друга — версия только растёт
+        if not force and cls._version is not None and version <= cls._version:
+            return
+
+        cls._version = version
+        # Слабый: тело под одной версией может отличаться сжатием
+        cls._etag = f'W/"v{version}"'
+        cls._last_modified = format_datetime(changed_at.astimezone(timezone.utc), usegmt=True)
@@ -0,0 +1,87 @@
+''' Сверка organization_documents с исходными таблицами.
+
+Эталон собирает та же функция organization_documents_build, что и триггеры, поэтому расхождение означает
+пропущенную или устаревшую пересборку, а не разницу в форме документа. Сверка идёт в одном снимке
+(REPEATABLE READ), параллельные правки не дают ложных расхождений. '''
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+from loguru import logger
+import asyncpg
+import time
+
+MAX_IDS = 20 # сколько id каждого вида попадает в отчёт
+
+_CHECK = """
+    WITH expected AS MATERIALIZED (
+        SELECT * FROM organization_documents_build(ARRAY(SELECT id FROM organizations))
+    )
+    SELECT
+        (SELECT count(*) FROM expected) AS organizations,
+        ARRAY(
+            SELECT e.org_id FROM expected e
+            WHERE NOT EXISTS (SELECT FROM organization_documents d WHERE d.org_id = e.org_id)
+            ORDER BY 1
+        ) AS missing,
+        ARRAY(
+            SELECT e.org_id FROM expected e JOIN organization_documents d USING (org_id)
+            WHERE (d.b_id, d.act_ids, d.act_paths, d.doc, ST_AsBinary(d.geog))
+                IS DISTINCT FROM (e.b_id, e.act_ids, e.act_paths, e.doc, ST_AsBinary(e.geog))
+            ORDER BY 1
+        ) AS stale,
+        ARRAY(
+            SELECT d.org_id FROM organization_documents d
+            WHERE NOT EXISTS (SELECT FROM organizations o WHERE o.id = d.org_id)
+            ORDER BY 1
+        ) AS orphaned
+"""
+
+
+@dataclass
+class DocumentsReport:
+    organizations: int = 0
+    missing: List[int] = field(default_factory=list) # организация есть, документа нет
+    stale: List[int] = field(default_factory=list) # документ не совпадает с исходными таблицами
+    orphaned: List[int] = field(default_factory=list) # документ остался от удалённой организации
+    fixed: bool = False
+    seconds: float = 0.0
+
+    def consistent(self) -> bool:
+        return not (self.missing or self.stale or self.orphaned)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "organizations": self.organizations,
+            "missing": len(self.missing),
+            "stale": len(self.stale),
+            "orphaned": len(self.orphaned),
+            "examples": {
+                "missing": self.missing[:MAX_IDS],
+                "stale": self.stale[:MAX_IDS],
+                "orphaned": self.orphaned[:MAX_IDS]
+            },
+            "fixed": self.fixed,
+            "seconds": round(self.seconds, 3)
+        }
+
+
+async def check_documents(conn: asyncpg.Connection, fix: bool = False) -> DocumentsReport:
+    ''' fix=True пересобирает найденные документы (отдельной транзакцией, после сверки) '''
+    started = time.perf_counter()
+    async with conn.transaction(isolation="repeatable_read", readonly=True):
+        row = await conn.fetchrow(_CHECK)
+    report = DocumentsReport(row["organizations"], row["missing"], row["stale"], row["orphaned"])
+
+    if fix and not report.consistent():
+        async with conn.transaction():
+            await conn.execute(
+                "SELECT refresh_organization_documents($1::int[])",
+                report.missing + report.stale + report.orphaned
+            )
+        report.fixed = True
+
+    report.seconds = time.perf_counter() - started
+    if report.consistent():
+        logger.info("[+] Organization documents consistent: {};", report.as_dict())
+    else:
+        logger.warning("[-] Organization documents diverged: {};", report.as_dict())
+    return report
@@ -1,5 +1,6 @@
-from pydantic import BaseModel, ConfigDict, Field, validator
-from typing import List, Any, Optional
+from pydantic import BaseModel, ConfigDict, Field, validator, create_model
+from typing import Annotated, Dict, FrozenSet, List, Any, Optional, Generic, TypeVar
+import functools
 from sqlalchemy_utils import Ltree
     
 
@@ -34,7 +35,89 @@ class OrganizationOut(BaseModel):
     phone: list[str]
     building: BuildingOut
     activities: Optional[List[ActivityOut]] = Field(default=None)
+    distance: Optional[float] = Field(default=None, description="Расстояние до точки запроса в метрах")
+    
+class ActivityNodeOut(BaseModel):
+    id: int
+    label: str
+    path: str
+    depth: int
+    children: List['ActivityNodeOut'] = Field(default_factory=list)
+
+class ActivityFacetOut(BaseModel):
+    id: int
+    label: str
+    path: str
+    depth: int
+    direct: int = Field(description="Организаций, привязанных к самой деятельности")
+    subtree: int = Field(description="Организаций в деятельности и её потомках, каждая учтена один раз")
+    children: List['ActivityFacetOut'] = Field(default_factory=list)
+
+class ClusterOut(BaseModel):
+    lat: float = Field(description="Центроид зданий ячейки")
+    lon: float
+    buildings: int
+    organizations: int
+    building_id: Optional[int] = Field(default=None, description="ID здания, если оно в ячейке одно")
+
+class ClustersOut(BaseModel):
+    cell_deg: float = Field(description="Размер ячейки сетки в градусах")
+    items: List[ClusterOut]
+
+T = TypeVar("T")
+
+class Page(BaseModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str] = Field(default=None, description="Передайте в cursor, чтобы получить следующую страницу")
+
+
+class BatchIn(BaseModel):
+    # Границы int4: id больше 2**31 - 1 дают 422, а не ошибку asyncpg на параметре запроса
+    ids: List[Annotated[int, Field(ge=1, le=2**31 - 1)]] = Field(..., min_length=1, description="Список ID")
+
+class BatchOut(BaseModel, Generic[T]):
+    items: Dict[int, T]
+    missing: List[int] = Field(description="ID, которых нет в базе")
     
 OrganizationOut.model_rebuild()
 ActivityOut.model_rebuild()
-BuildingOut.model_rebuild()
\ No newline at end of file
+BuildingOut.model_rebuild()
+ActivityNodeOut.model_rebuild()
+ActivityFacetOut.model_rebuild()
+
+# Sparse fieldsets (?fields=&include=): какие поля можно запросить и какие отдаются без параметров
+ORGANIZATION_FIELDS = ("id", "title", "phone", "building", "activities", "distance")
+ORGANIZATION_DEFAULT = frozenset(ORGANIZATION_FIELDS)
+BUILDING_FIELDS = ("id", "addr", "lat", "lon", "organizations")
+BUILDING_DEFAULT = frozenset(("id", "addr", "lat", "lon"))
+
+class BuildingOrganizationOut(BaseModel):
+    # Организация внутри здания: без обратной ссылки на здание и без деятельностей
+    model_config = ConfigDict(from_attributes=True)
+    
+    id: int
+    title: str
+    phone: list[str]
+
+# Поля, которые в урезанной модели устроены иначе, чем в полной: у BuildORM связь называется orgs
+_SPARSE_OVERRIDES = {
+    BuildingOut: {
+        "organizations": (
+            Optional[List[BuildingOrganizationOut]], Field(default=None, validation_alias="orgs")
+        )
+    }
+}
+
+@functools.cache
+def sparse_model(base: type[BaseModel], fields: FrozenSet[str]) -> type[BaseModel]:
+    ''' Модель только с полями fields: from_attributes читает лишь их, поэтому незагруженные
+    колонки и связи (load_only / noload) не трогаются. Все поля необязательные '''
+    overrides = _SPARSE_OVERRIDES.get(base, {})
+    return create_model(
+        f"{base.__name__}Sparse",
+        __config__=ConfigDict(from_attributes=True),
+        **{
+            name: overrides.get(name, (Optional[field.annotation], Field(default=None)))
+            for name, field in base.model_fields.items() if name in fields
+        }
+    )
@@ -0,0 +1,88 @@
+from typing import Awaitable, Callable, Dict, List, Set
+from loguru import logger
+import asyncio
+import asyncpg
+
+# payload=None означает, что уведомления могли потеряться (переподключение) и нужна полная пересинхронизация
+Handler = Callable[[str | None], Awaitable[None]]
+
+
+class Notifier:
+    ''' Одно выделенное asyncpg соединение под LISTEN, вне пула Database '''
+    _dsn: str | None = None
+    _conn: asyncpg.Connection | None = None
+    _handlers: Dict[str, List[Handler]] = {}
+    _tasks: Set[asyncio.Task] = set()
+    _closing = False
+
+    @classmethod
+    async def start(cls, dsn: str):
+        cls._dsn = dsn
+        cls._closing = False
+        await cls._connect()
+        logger.info("[+] Notifier listening on {} channels;", len(cls._handlers))
+
+    @classmethod
+    async def close(cls):
+        cls._closing = True
+        for task in list(cls._tasks):
+            task.cancel()
+        if cls._conn is not None and not cls._conn.is_closed():
+            await cls._conn.close()
+        cls._conn = None
+
+    @classmethod
+    async def subscribe(cls, channel: str, handler: Handler):
+        first = channel not in cls._handlers
+        cls._handlers.setdefault(channel, []).append(handler)
+        if first and cls._conn is not None and not cls._conn.is_closed():
+            await cls._conn.add_listener(channel, cls._on_notify)
+
+    @classmethod
+    async def _connect(cls):
+        cls._conn = await asyncpg.connect(cls._dsn)
+        cls._conn.add_termination_listener(cls._on_terminate)
+        for channel in cls._handlers:
+            await cls._conn.add_listener(channel, cls._on_notify)
+
+    @classmethod
+    def _spawn(cls, coro: Awaitable[None]):
+        task = asyncio.ensure_future(coro)
+        cls._tasks.add(task)
+        task.add_done_callback(cls._on_done)
+
+    @classmethod
+    def _on_done(cls, task: asyncio.Task):
+        cls._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.opt(exception=task.exception()).error("[-] Notification handler failed;")
+
+    @classmethod
+    def _on_notify(cls, conn, pid: int, channel: str, payload: str):
+        for handler in cls._handlers.get(channel, ()):
+            cls._spawn(handler(payload))
+
+    @classmethod
+    def _on_terminate(cls, conn):
+        if cls._closing:
+            return
+        logger.warning("[-] Notifier connection lost, reconnecting;")
+        cls._spawn(cls._reconnect())
+
+    @classmethod
+    async def _reconnect(cls):
+        delay = 1
+        while not cls._closing:
+            try:
+                await cls._connect()
+            except (OSError, asyncpg.PostgresError) as e:
+                logger.warning("[-] Notifier reconnect failed: {}; retry in {}s", e, delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+                continue
+
+            logger.info("[+] Notifier reconnected;")
+            for handlers in cls._handlers.values():
+                for handler in handlers:
+                    cls._spawn(handler(None))
+            return
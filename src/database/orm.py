@@ -1,10 +1,12 @@
-from sqlalchemy import Integer, String, Float, ForeignKey, Sequence
+from sqlalchemy import Integer, String, Float, ForeignKey, Sequence, Computed, Index, BigInteger, DateTime, text
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.postgresql import JSONB, ARRAY
 from sqlalchemy.ext.mutable import MutableList
 from sqlalchemy.ext.asyncio import AsyncAttrs
 from sqlalchemy.schema import CheckConstraint
 from sqlalchemy_utils import LtreeType, Ltree
+from geoalchemy2 import Geography, WKBElement
+from datetime import datetime
 from typing import List
 
 class Base(AsyncAttrs, DeclarativeBase):
@@ -12,6 +14,9 @@ class Base(AsyncAttrs, DeclarativeBase):
 
 class Relationship_AO(Base):
     __tablename__ = "rel_ao"
+    __table_args__ = (
+        Index("ix_rel_ao_act_id", "act_id", "org_id"),
+    )
 
     org_id: Mapped[int] = mapped_column(
         ForeignKey("organizations.id", ondelete="CASCADE"),
@@ -26,10 +31,11 @@ class ActORM(Base):
     __tablename__ = "activities"
     __table_args__ = (
         CheckConstraint("nlevel(path) <= 3", name="ck_activity_path_nlevel"),
+        Index("ix_activities_path_gist", "path", postgresql_using="gist"),
     )
 
     id: Mapped[int] = mapped_column(Sequence("activities_id_seq"), primary_key=True)
-    label: Mapped[str] = mapped_column(nullable=False)
+    label: Mapped[str] = mapped_column(nullable=False, index=True)
     path: Mapped[Ltree] = mapped_column(LtreeType, nullable=False, index=True)
     
     orgs: Mapped[List["OrgORM"]] = relationship(
@@ -39,11 +45,20 @@ class ActORM(Base):
 
 class BuildORM(Base):
     __tablename__ = "buildings"
+    __table_args__ = (
+        Index("ix_buildings_geog", "geog", postgresql_using="gist"),
+    )
 
     id: Mapped[int] = mapped_column(Sequence("buildings_id_seq"), primary_key=True)
     addr: Mapped[str] = mapped_column(String, nullable=False, unique=True)
     lat: Mapped[float] = mapped_column(nullable=False)
     lon: Mapped[float] = mapped_column(nullable=False)
+    # Поддерживается самим postgres из lat/lon, используется в радиусных запросах через GiST
+    geog: Mapped[WKBElement] = mapped_column(
+        Geography(geometry_type="POINT", srid=4326, spatial_index=False),
+        Computed("ST_SetSRID(ST_MakePoint(lon, lat), 4326)::geography", persisted=True),
+        deferred=True
+    )
 
     orgs: Mapped[List["OrgORM"]] = relationship(
         back_populates="building",
@@ -52,6 +67,14 @@ class BuildORM(Base):
 
 class OrgORM(Base):
     __tablename__ = "organizations"
+    __table_args__ = (
+        Index(
+            "ix_organizations_title_trgm", "title",
+            postgresql_using="gin", postgresql_ops={"title": "gin_trgm_ops"}
+        ),
+        Index("ix_organizations_title_prefix", text('lower(title) COLLATE "C"'), "id"),
+        Index("ix_organizations_b_id", "b_id", "id"),
+    )
 
     id: Mapped[int] = mapped_column(Sequence("organizations_id_seq"), primary_key=True)
     title: Mapped[str] = mapped_column(unique=True, nullable=False)
@@ -68,3 +91,54 @@ class OrgORM(Base):
         secondary="rel_ao",
         back_populates="orgs"
     )
+
+class DataVersionORM(Base):
+    # Одна строка; version двигают триггеры bump_data_version на таблицах справочника
+    __tablename__ = "data_version"
+    __table_args__ = (
+        CheckConstraint("id", name="ck_data_version_single_row"),
+    )
+
+    id: Mapped[bool] = mapped_column(primary_key=True, server_default=text("true"))
+    version: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    changed_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+
+class OrgDocumentORM(Base):
+    # Готовый документ организации в форме OrganizationOut; пересобирается триггерами
+    # (refresh_organization_documents) при изменении organizations, buildings, activities и rel_ao
+    __tablename__ = "organization_documents"
+    __table_args__ = (
+        Index("ix_organization_documents_b_id", "b_id", "org_id"),
+        Index("ix_organization_documents_geog", "geog", postgresql_using="gist"),
+        Index("ix_organization_documents_act_ids", "act_ids", postgresql_using="gin"),
+        Index("ix_organization_documents_act_paths", "act_paths", postgresql_using="gist"),
+    )
+
+    org_id: Mapped[int] = mapped_column(primary_key=True)
+    b_id: Mapped[int] = mapped_column(nullable=False)
+    geog: Mapped[WKBElement] = mapped_column(
+        Geography(geometry_type="POINT", srid=4326, spatial_index=False), nullable=False
+    )
+    act_ids: Mapped[List[int]] = mapped_column(ARRAY(Integer), nullable=False)
+    act_paths: Mapped[List[Ltree]] = mapped_column(ARRAY(LtreeType), nullable=False)
+    doc: Mapped[dict] = mapped_column(JSONB, nullable=False)
+
+class ActivityCountORM(Base):
+    # Число организаций у деятельности: direct — привязанных к ней самой, subtree — к ней или к потомкам
+    # (организация считается один раз). Поддерживается триггерами на rel_ao и activities
+    __tablename__ = "activity_counts"
+
+    act_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    direct: Mapped[int] = mapped_column(nullable=False, server_default=text("0"))
+    subtree: Mapped[int] = mapped_column(nullable=False, server_default=text("0"))
+
+class OrgPhoneORM(Base):
+    # Телефоны организаций только цифрами ('8-923-666-13-13' -> '89236661313'), по строке на номер.
+    # Ведётся триггерами на organizations (phone_digits), для поиска по номеру и его началу
+    __tablename__ = "org_phones"
+    __table_args__ = (
+        Index("ix_org_phones_org_id", "org_id"),
+    )
+
+    digits: Mapped[str] = mapped_column(String(collation="C"), primary_key=True)
+    org_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
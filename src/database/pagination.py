@@ -0,0 +1,69 @@
+from typing import Any, Callable, List, Sequence, Tuple
+from sqlalchemy import Select, tuple_
+import base64
+import binascii
+import json
+import math
+
+INT4_MIN, INT4_MAX = -2**31, 2**31 - 1
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(*values: Any) -> str:
+    raw = json.dumps(values, separators=(",", ":"), ensure_ascii=False).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str, *types: type) -> List[Any]:
+    ''' Разбирает курсор и проверяет, что значения ключа совпадают по количеству и типам '''
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor(cursor)
+
+    if not isinstance(values, list) or len(values) != len(types):
+        raise InvalidCursor(cursor)
+
+    for i, (value, tp) in enumerate(zip(values, types)):
+        if isinstance(value, bool):
+            raise InvalidCursor(cursor)
+        if tp is float and isinstance(value, (int, float)):
+            try:
+                values[i] = value = float(value)
+            except OverflowError:
+                raise InvalidCursor(cursor)
+            if not math.isfinite(value):
+                raise InvalidCursor(cursor)
+        elif not isinstance(value, tp):
+            raise InvalidCursor(cursor)
+        elif tp is int and not INT4_MIN <= value <= INT4_MAX:
+            # id — int4: иначе asyncpg упадёт на параметре запроса и клиент получит 500 вместо 400
+            raise InvalidCursor(cursor)
+
+    return values
+
+
+def split_page(rows: Sequence[Any], limit: int, key: Callable[[Any], tuple]) -> Tuple[List[Any], str | None]:
+    ''' Запрос делается с limit + 1: лишняя строка означает, что есть следующая страница '''
+    rows = list(rows)
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    return rows, encode_cursor(*key(rows[-1]))
+
+
+def keyset_after(stmt: Select, keys: Sequence[Any], cursor: str | None, *types: type) -> Select:
+    ''' ORDER BY (sort_key, id) и WHERE (sort_key, id) > курсора, без limit: для потоковой выдачи '''
+    if cursor is not None:
+        stmt = stmt.where(tuple_(*keys) > tuple_(*decode_cursor(cursor, *types)))
+    return stmt.order_by(*keys)
+
+
+def keyset_page(stmt: Select, keys: Sequence[Any], limit: int, cursor: str | None, *types: type) -> Select:
+    ''' ORDER BY (sort_key, id) и WHERE (sort_key, id) > курсора вместо OFFSET — глубокие страницы стоят как первая '''
+    return keyset_after(stmt, keys, cursor, *types).limit(limit + 1)
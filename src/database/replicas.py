@@ -0,0 +1,154 @@
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+from sqlalchemy.engine import make_url
+from sqlalchemy import event, text
+from dataclasses import dataclass, field
+from loguru import logger
+from typing import List
+import asyncio
+import itertools
+
+from metrics import instrumented
+
+# Отставание реплики в секундах; 0, если она догнала primary (или это вообще не реплика)
+_LAG = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END::float8
+""")
+
+BALANCE = ("round_robin", "least_busy")
+
+
+@dataclass
+class Replica:
+    name: str
+    engine: AsyncEngine
+    sessionmaker: async_sessionmaker
+    healthy: bool | None = None # None — ещё не проверялась
+    lag: float | None = None
+    error: str | None = field(default=None, repr=False)
+
+
+class Replicas:
+    ''' Реплики только для чтения, у каждой свой пул. Фоновая проверка раз в check_interval снимает с
+    балансировки недоступные и отставшие больше max_lag; если здоровых нет — читает primary '''
+    _replicas: List[Replica] = []
+    _balance = "round_robin"
+    _max_lag: float | None = None
+    _check_interval = 5.0
+    _counter = itertools.count()
+    _task: asyncio.Task | None = None
+
+    @classmethod
+    async def init(cls, engines: List[AsyncEngine], balance: str, max_lag: float | None, check_interval: float):
+        if balance not in BALANCE:
+            raise ValueError(f"unknown balance {balance!r}, expected one of {', '.join(BALANCE)}")
+
+        cls._balance = balance
+        cls._max_lag = max_lag
+        cls._check_interval = check_interval
+        cls._replicas = []
+        for engine in engines:
+            url = make_url(engine.url)
+            replica = Replica(
+                name=f"{url.host}:{url.port or 5432}/{url.database}",
+                engine=engine,
+                sessionmaker=async_sessionmaker(engine, expire_on_commit=False)
+            )
+            event.listen(engine.sync_engine, "handle_error", cls._on_error(replica))
+            cls._replicas.append(replica)
+
+        if cls._replicas:
+            await cls.check()
+            cls._task = asyncio.create_task(cls._watch())
+            logger.info(
+                "[+] Read replicas: {} of {} healthy, balance {};",
+                len(cls.healthy()), len(cls._replicas), balance
+            )
+
+    @classmethod
+    async def close(cls):
+        if cls._task is not None:
+            cls._task.cancel()
+            cls._task = None
+        await asyncio.gather(*(replica.engine.dispose() for replica in cls._replicas))
+        cls._replicas = []
+
+    @classmethod
+    def enabled(cls) -> bool:
+        return bool(cls._replicas)
+
+    @classmethod
+    def all(cls) -> List[Replica]:
+        return list(cls._replicas)
+
+    @classmethod
+    def healthy(cls) -> List[Replica]:
+        return [replica for replica in cls._replicas if replica.healthy]
+
+    @classmethod
+    def settle_delay(cls) -> float:
+        ''' Через сколько изменение с primary заведомо видно на репликах, которые остаются в балансировке '''
+        return cls._max_lag if cls._max_lag is not None else cls._check_interval
+
+    @classmethod
+    def session(cls) -> AsyncSession | None:
+        ''' Сессия на выбранной реплике или None, если читать нужно с primary '''
+        healthy = cls.healthy()
+        if not healthy:
+            return None
+
+        start = next(cls._counter) % len(healthy)
+        rotated = healthy[start:] + healthy[:start]
+        if cls._balance == "least_busy":
+            # При равной загрузке побеждает первая по ротации, поэтому простаивающие реплики чередуются
+            replica = min(rotated, key=lambda replica: replica.engine.pool.checkedout())
+        else:
+            replica = rotated[0]
+        return replica.sessionmaker()
+
+    @classmethod
+    async def check(cls):
+        was_healthy = bool(cls.healthy())
+        await asyncio.gather(*(cls._check_one(replica) for replica in cls._replicas))
+        if was_healthy and not cls.healthy() or cls._task is None and not cls.healthy():
+            logger.warning("[-] No healthy replicas, reading from primary;")
+
+    @classmethod
+    @instrumented
+    async def _check_one(cls, replica: Replica):
+        try:
+            async with asyncio.timeout(max(cls._check_interval, 1)):
+                async with replica.engine.connect() as conn:
+                    lag = (await conn.execute(_LAG)).scalar_one()
+        except Exception as e:
+            healthy, lag, error = False, None, f"{type(e).__name__}: {e}"
+        else:
+            too_far = cls._max_lag is not None and lag > cls._max_lag
+            healthy, error = not too_far, f"lag {lag:.1f}s > {cls._max_lag}s" if too_far else None
+
+        if healthy != replica.healthy:
+            if healthy:
+                logger.info("[+] Replica {} is back, lag {:.1f}s;", replica.name, lag)
+            else:
+                logger.warning("[-] Replica {} ejected: {};", replica.name, error)
+        replica.healthy, replica.lag, replica.error = healthy, lag, error
+
+    @classmethod
+    async def _watch(cls):
+        while True:
+            await asyncio.sleep(cls._check_interval)
+            try:
+                await cls.check()
+            except Exception:
+                logger.exception("[-] Replica health check failed;")
+
+    @classmethod
+    def _on_error(cls, replica: Replica):
+        def handle_error(exception_context):
+            # Обрыв соединения: снимаем реплику сразу, не дожидаясь фоновой проверки
+            if exception_context.is_disconnect and replica.healthy:
+                replica.healthy = False
+                logger.warning("[-] Replica {} ejected: connection lost;", replica.name)
+        return handle_error
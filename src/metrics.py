@@ -0,0 +1,278 @@
+''' Метрики процесса в текстовом формате Prometheus (/metrics).
+
+На горячем пути только инкременты счётчиков в памяти процесса: без блокировок (всё в одном event loop)
+и без внешних зависимостей. Состояние пула и кэша не копится, а читается в момент выдачи /metrics. '''
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy import event
+from contextvars import ContextVar
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Tuple
+import functools
+import inspect
+import time
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Метод DAO, внутри которого сейчас выполняются запросы; проставляется декоратором instrumented
+_dao_method: ContextVar[str] = ContextVar("dao_method", default="other")
+
+def current_method() -> str:
+    return _dao_method.get()
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[Any, ...], **extra: Any) -> str:
+    pairs = [*zip(names, values), *extra.items()]
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}" if pairs else ""
+
+
+def _histogram_lines(name: str, doc: str, names: Tuple[str, ...], series: Dict[tuple, Histogram]) -> List[str]:
+    lines = [f"# HELP {name} {doc}", f"# TYPE {name} histogram"]
+    for values, histogram in series.items():
+        cumulative = 0
+        for le, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels(names, values, le=le)} {cumulative}")
+        lines.append(f"{name}_bucket{_labels(names, values, le='+Inf')} {histogram.count}")
+        lines.append(f"{name}_sum{_labels(names, values)} {histogram.sum}")
+        lines.append(f"{name}_count{_labels(names, values)} {histogram.count}")
+    return lines
+
+
+def _simple_lines(name: str, doc: str, kind: str, names: Tuple[str, ...], series: Iterable[Tuple[tuple, Any]]) -> List[str]:
+    lines = [f"# HELP {name} {doc}", f"# TYPE {name} {kind}"]
+    lines.extend(f"{name}{_labels(names, values)} {value}" for values, value in series)
+    return lines
+
+
+class Metrics:
+    _requests: Dict[Tuple[str, str, int], int] = {}
+    _request_latency: Dict[Tuple[str, str], Histogram] = {}
+    _query_latency: Dict[Tuple[str], Histogram] = {}
+    _query_errors: Dict[Tuple[str], int] = {}
+    _pool_wait = Histogram()
+
+    @classmethod
+    def observe_request(cls, route: str, method: str, status: int, seconds: float):
+        key = (route, method)
+        histogram = cls._request_latency.get(key)
+        if histogram is None:
+            histogram = cls._request_latency[key] = Histogram()
+        histogram.observe(seconds)
+
+        key = (route, method, status)
+        cls._requests[key] = cls._requests.get(key, 0) + 1
+
+    @classmethod
+    def observe_query(cls, method: str, seconds: float):
+        histogram = cls._query_latency.get((method,))
+        if histogram is None:
+            histogram = cls._query_latency[(method,)] = Histogram()
+        histogram.observe(seconds)
+
+    @classmethod
+    def query_failed(cls, method: str):
+        cls._query_errors[(method,)] = cls._query_errors.get((method,), 0) + 1
+
+    @classmethod
+    def observe_pool_wait(cls, seconds: float):
+        cls._pool_wait.observe(seconds)
+
+    @classmethod
+    def instrument(cls, engine: AsyncEngine):
+        ''' Время каждого запроса к базе с меткой метода DAO, который его выполнил '''
+        sync_engine = engine.sync_engine
+
+        @event.listens_for(sync_engine, "before_cursor_execute")
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            context._metrics_started = time.perf_counter()
+
+        @event.listens_for(sync_engine, "after_cursor_execute")
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            cls.observe_query(_dao_method.get(), time.perf_counter() - context._metrics_started)
+
+        @event.listens_for(sync_engine, "handle_error")
+        def handle_error(exception_context):
+            cls.query_failed(_dao_method.get())
+
+    @classmethod
+    def render(
+        cls, pool: Any = None, cache_stats: Dict[str, int] | None = None, replicas: List[Any] = (),
+        coalesce_stats: Tuple[Dict[str, int], Dict[str, int]] | None = None,
+        admission_stats: List[Tuple[str, int, int, int]] = ()
+    ) -> str:
+        lines = [
+            *_histogram_lines(
+                "http_request_duration_seconds", "HTTP request latency by route template",
+                ("route", "method"), cls._request_latency
+            ),
+            *_simple_lines(
+                "http_requests_total", "HTTP responses by route template and status", "counter",
+                ("route", "method", "status"), cls._requests.items()
+            ),
+            *_histogram_lines(
+                "db_query_duration_seconds", "Statement execution time by DAO method",
+                ("method",), cls._query_latency
+            ),
+            *_simple_lines(
+                "db_query_errors_total", "Failed statements by DAO method", "counter",
+                ("method",), cls._query_errors.items()
+            ),
+            *_histogram_lines(
+                "db_pool_wait_seconds", "Time spent getting a connection from the pool, including connects",
+                (), {(): cls._pool_wait}
+            ),
+        ]
+
+        if pool is not None:
+            for name, doc, value in (
+                ("db_pool_size", "Configured pool size", pool.size()),
+                ("db_pool_checked_out", "Connections currently checked out", pool.checkedout()),
+                ("db_pool_checked_in", "Idle connections in the pool", pool.checkedin()),
+                ("db_pool_overflow", "Connections above pool_size (negative while the pool is not full)", pool.overflow()),
+            ):
+                lines.extend(_simple_lines(name, doc, "gauge", (), [((), value)]))
+
+        if replicas:
+            lines.extend(_simple_lines(
+                "db_replica_healthy", "1 if the replica takes reads", "gauge", ("replica",),
+                [((replica.name,), int(bool(replica.healthy))) for replica in replicas]
+            ))
+            lines.extend(_simple_lines(
+                "db_replica_lag_seconds", "Replication lag seen by the last health check", "gauge", ("replica",),
+                [((replica.name,), replica.lag) for replica in replicas if replica.lag is not None]
+            ))
+            lines.extend(_simple_lines(
+                "db_replica_checked_out", "Connections currently checked out from the replica pool", "gauge",
+                ("replica",), [((replica.name,), replica.engine.pool.checkedout()) for replica in replicas]
+            ))
+
+        if coalesce_stats is not None:
+            flights, coalesced = coalesce_stats
+            lines.extend(_simple_lines(
+                "db_coalesce_flights_total", "Queries actually run, one per group of identical concurrent calls",
+                "counter", ("method",), [((method,), value) for method, value in flights.items()]
+            ))
+            lines.extend(_simple_lines(
+                "db_coalesced_calls_total", "Calls that waited for an identical in-flight query instead of running it",
+                "counter", ("method",), [((method,), value) for method, value in coalesced.items()]
+            ))
+
+        if admission_stats:
+            lines.extend(_simple_lines(
+                "http_admission_active", "Requests currently running, per admission-controlled route", "gauge",
+                ("route",), [((route,), active) for route, active, _, _ in admission_stats]
+            ))
+            lines.extend(_simple_lines(
+                "http_admission_waiting", "Requests queued for a free slot, per route", "gauge",
+                ("route",), [((route,), waiting) for route, _, waiting, _ in admission_stats]
+            ))
+            lines.extend(_simple_lines(
+                "http_admission_rejected_total", "Requests answered 503 because the route queue was full or timed out",
+                "counter", ("route",), [((route,), rejected) for route, _, _, rejected in admission_stats]
+            ))
+
+        for name, value in (cache_stats or {}).items():
+            kind = "gauge" if name == "size" else "counter"
+            metric = "cache_entries" if name == "size" else f"cache_{name}_total"
+            lines.extend(_simple_lines(metric, f"Read-through cache {name}", kind, (), [((), value)]))
+
+        return "\n".join(lines) + "\n"
+
+
+def instrumented(fn):
+    ''' Помечает запросы, выполненные внутри метода, его именем (Database.get_organization_by_id и т.п.) '''
+    name = fn.__qualname__
+
+    if inspect.isasyncgenfunction(fn):
+        # Генератор выполняется шагами в контексте потребителя: метка ставится на каждый шаг, а не на всё время
+        @functools.wraps(fn)
+        async def gen_wrapper(*args, **kwargs):
+            agen = fn(*args, **kwargs)
+            try:
+                while True:
+                    token = _dao_method.set(name)
+                    try:
+                        item = await agen.__anext__()
+                    except StopAsyncIteration:
+                        return
+                    finally:
+                        _dao_method.reset(token)
+                    yield item
+            finally:
+                token = _dao_method.set(name)
+                try:
+                    await agen.aclose()
+                finally:
+                    _dao_method.reset(token)
+        return gen_wrapper
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        token = _dao_method.set(name)
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            _dao_method.reset(token)
+    return wrapper
+
+
+class TimedPool(AsyncAdaptedQueuePool):
+    ''' Пул, замеряющий ожидание свободного соединения (и открытие нового, если пул ещё не заполнен) '''
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            Metrics.observe_pool_wait(time.perf_counter() - started)
+
+
+class MetricsMiddleware:
+    ''' Чистый ASGI middleware: без BaseHTTPMiddleware и лишней задачи на запрос.
+    Метка маршрута — шаблон пути (scope["route"]), а не сам путь, чтобы число рядов было ограничено '''
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            # 304 от ConditionalMiddleware отдаётся до маршрутизации, шаблона пути у него нет
+            default = "not_modified" if status == 304 else "unmatched"
+            Metrics.observe_request(
+                getattr(route, "path", default), scope["method"], status, time.perf_counter() - started
+            )
@@ -1,21 +1,74 @@
 from fastapi import FastAPI
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, JSONResponse, PlainTextResponse
+from sqlalchemy.exc import DBAPIError
 from contextlib import asynccontextmanager
+from loguru import logger
 import uvicorn
 import asyncio
+import time
 
 from config import Config
 from database.dao import Database
-from api import router
-from test_data import create_test_data
+from database.replicas import Replicas
+from database.activity_tree import ActivityTree
+from database.notify import Notifier
+from database.cache import LRUCache
+from database.pagination import InvalidCursor
+from database.data_version import DataVersion
+from metrics import Metrics, MetricsMiddleware
+from conditional import ConditionalMiddleware
+from compression import CompressionMiddleware
+from admission import AdmissionMiddleware
+from api import router, key_scope, NEGOTIATED, accept_variant
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> None:
-    await Database.init(Config.DB_URL, Config.DB_MAXCON)
-    await create_test_data()
+    # Без DDL и сида: схема — alembic upgrade head, тестовые данные — python test_data.py
+    app.state.ready = False
+    started = time.perf_counter()
+    
+    await Database.init(
+        Config.DB_URL, Config.DB_MAXCON, prewarm=Config.DB_PREWARM,
+        max_overflow=Config.DB_MAX_OVERFLOW,
+        pool_timeout=Config.DB_POOL_TIMEOUT,
+        pool_pre_ping=Config.DB_POOL_PRE_PING,
+        pool_recycle=Config.DB_POOL_RECYCLE,
+        query_cache_size=Config.DB_QUERY_CACHE_SIZE,
+        connect_args={
+            "prepared_statement_cache_size": Config.DB_STATEMENT_CACHE_SIZE,
+            # Общий бюджет ставится на соединение, отдельные методы переопределяют его в своей транзакции
+            **({"server_settings": {"statement_timeout": str(Config.DB_STATEMENT_TIMEOUT)}}
+               if Config.DB_STATEMENT_TIMEOUT > 0 else {})
+        }
+    )
+    Database.set_statement_timeouts(Config.DB_STATEMENT_TIMEOUT, Config.DB_STATEMENT_TIMEOUTS)
+    await Database.init_replicas(
+        Config.DB_REPLICA_URLS, Config.DB_MAXCON, Config.DB_REPLICA_BALANCE,
+        Config.DB_REPLICA_MAX_LAG, Config.DB_REPLICA_CHECK_INTERVAL, prewarm=Config.DB_PREWARM
+    )
+    Database.set_cache(LRUCache(Config.CACHE_SIZE, Config.CACHE_TTL))
+    Database.use_documents(Config.ORG_DOCUMENTS)
+    Database.set_coalescing(Config.COALESCE, Config.COALESCE_COORD_DIGITS)
+    await ActivityTree.load(Database._sessionmaker)
+    # Новая версия (ETag) выставляется только после перезагрузки дерева и сброса кэша
+    await Notifier.subscribe("activities_changed", DataVersion.before_bump(ActivityTree.on_change))
+    await Notifier.subscribe("activities_changed", DataVersion.before_bump(Database.on_activities_change))
+    await Notifier.subscribe("directory_changed", DataVersion.before_bump(Database.on_directory_change))
+    await Notifier.subscribe("data_version", DataVersion.on_change)
+    await Notifier.start(Config.DB_URL_SYNC)
+    # После LISTEN: изменение между чтением и подпиской не потеряется
+    await DataVersion.load(Database._sessionmaker, Replicas.settle_delay if Replicas.enabled() else None)
+    await Database.preload_cache(Config.CACHE_PRELOAD, raw=Config.RAW_JSON)
+    
+    app.state.startup_ms = round((time.perf_counter() - started) * 1000, 1)
+    app.state.ready = True
+    logger.info("[+] Startup finished in {} ms;", app.state.startup_ms)
     
     yield
     
+    app.state.ready = False
+    
+    await Notifier.close()
     await Database.close()
 
 app = FastAPI(
@@ -27,7 +80,72 @@ app = FastAPI(
 )
 
 app.include_router(router)
+if Config.COMPRESS_MIN_SIZE > 0:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=Config.COMPRESS_MIN_SIZE,
+        gzip_level=Config.COMPRESS_GZIP_LEVEL,
+        brotli_quality=Config.COMPRESS_BROTLI_QUALITY
+    )
+if Config.ADMISSION_CONCURRENCY > 0:
+    # Внутри ConditionalMiddleware: ответ 304 из кэша версий слота не занимает
+    app.add_middleware(
+        AdmissionMiddleware,
+        routes=router.routes,
+        default=(Config.ADMISSION_CONCURRENCY, Config.ADMISSION_QUEUE),
+        limits=Config.ADMISSION_ROUTES,
+        queue_timeout=Config.ADMISSION_QUEUE_TIMEOUT,
+        retry_after=Config.ADMISSION_RETRY_AFTER
+    )
+app.add_middleware(
+    ConditionalMiddleware,
+    authorized=lambda api_key: key_scope(api_key) == "api-access",
+    cache_control=Config.HTTP_CACHE_CONTROL,
+    exclude=("/api/token", "/api/admin/"),
+    negotiated=NEGOTIATED,
+    variant=accept_variant
+)
+app.add_middleware(MetricsMiddleware) # снаружи, чтобы учитывать и ответы 304
+
+@app.exception_handler(InvalidCursor)
+async def invalid_cursor_handler(req, exc: InvalidCursor):
+    return JSONResponse(
+        {
+            'status': 'failed',
+            'message': 'Invalid cursor'
+        }, status_code=400
+    )
+
+@app.exception_handler(DBAPIError)
+async def statement_timeout_handler(req, exc: DBAPIError):
+    # 57014 — query_canceled: запрос превысил statement_timeout
+    if getattr(exc.orig, "sqlstate", None) != "57014":
+        raise exc
+    return JSONResponse(
+        {
+            'status': 'failed',
+            'message': 'Query timed out, retry later'
+        }, status_code=503, headers={"Retry-After": str(Config.ADMISSION_RETRY_AFTER)}
+    )
 
 @app.get("/")
 async def root():
-    return RedirectResponse("/docs")
\ No newline at end of file
+    return RedirectResponse("/docs")
+
+@app.get("/ready", include_in_schema=False)
+async def ready():
+    # Готов только после прогрева пула, дерева деятельностей и кэша
+    if getattr(app.state, "ready", False):
+        return {"status": "ready", "startup_ms": app.state.startup_ms}
+    return JSONResponse({"status": "starting"}, status_code=503)
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    engine = Database._engine
+    return PlainTextResponse(
+        Metrics.render(
+            engine.pool if engine is not None else None, Database._cache.stats(), Replicas.all(),
+            Database.coalesce_stats(), AdmissionMiddleware.stats()
+        ),
+        media_type="text/plain; version=0.0.4"
+    )
\ No newline at end of file
@@ -1,3 +1,9 @@
+''' Тестовые данные. Запускается явно, поверх схемы из миграций (alembic upgrade head):
+
+    cd src && python test_data.py
+
+Все текущие данные справочника будут удалены.
+'''
 import asyncio
 from sqlalchemy import insert, text
 from database.dao import Database
@@ -7,16 +13,13 @@ from config import Config
 
 async def create_test_data():
     async with Database._engine.begin() as conn:
-        
+        # Только данные: таблицы, индексы и триггеры принадлежат миграциям
         await conn.execute(
             text(
-                "CREATE EXTENSION IF NOT EXISTS ltree;"
+                "TRUNCATE rel_ao, organizations, buildings, activities;"
             )
         )
         
-        await conn.run_sync(Base.metadata.drop_all)
-        await conn.run_sync(Base.metadata.create_all)
-        
     async with Database._sessionmaker() as session:
         builds = [
             BuildORM(addr=f"ул. Пушкина, дом {i}", lat=55.0 + i, lon=37.0 + i)
@@ -59,4 +62,16 @@ async def create_test_data():
             ))
         session.add_all(rels)
 
-        await session.commit()
\ No newline at end of file
+        await session.commit()
+
+
+async def main():
+    await Database.init(Config.DB_URL, 1)
+    try:
+        await create_test_data()
+    finally:
+        await Database.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
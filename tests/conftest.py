@@ -0,0 +1,4 @@
+import os
+
+# Config читает SECRET при импорте; тестам достаточно любого значения
+os.environ.setdefault("SECRET", "test")
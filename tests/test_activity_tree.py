@@ -0,0 +1,32 @@
+import json
+
+from database.activity_tree import ActivityTree
+
+# Отсортировано по path, как из базы; "Еда" встречается в двух ветках
+ROWS = [
+    (1, "Еда", "food"),
+    (2, "Мясо", "food.meat"),
+    (5, "Колбасы", "food.meat.sausage"),
+    (3, "Еда", "shop"),
+    (4, "Молоко", "shop.milk"),
+]
+
+
+def test_duplicate_labels_merge_subtrees():
+    snapshot = ActivityTree._build(ROWS)
+    assert snapshot.ids_by_label["Еда"] == (1, 3)
+    assert snapshot.subtree_by_label["Еда"] == (1, 2, 3, 4, 5)
+    assert snapshot.subtree_by_label["Мясо"] == (2, 5)
+
+
+def test_paths_and_depth():
+    snapshot = ActivityTree._build(ROWS)
+    assert snapshot.subtree_by_path["food"] == (1, 2, 5)
+    assert snapshot.subtree_by_path["food.meat.sausage"] == (5,)
+    assert snapshot.depth == {1: 1, 2: 2, 5: 3, 3: 1, 4: 2}
+
+
+def test_tree_json():
+    roots = json.loads(ActivityTree._build(ROWS).tree_json)
+    assert [root["id"] for root in roots] == [1, 3]
+    assert roots[0]["children"][0]["children"][0]["label"] == "Колбасы"
@@ -0,0 +1,31 @@
+import asyncio
+
+from admission import _Gate
+
+
+def test_queue_full_is_rejected():
+    async def main():
+        gate = _Gate(1, 1)
+        assert await gate.enter(1)
+        queued = asyncio.ensure_future(gate.enter(1))
+        await asyncio.sleep(0)
+        assert gate.waiting == 1
+        assert not await gate.enter(1) # очередь занята — отказ сразу
+
+        gate.leave()
+        assert await queued
+        return gate
+
+    gate = asyncio.run(main())
+    assert (gate.active, gate.waiting, gate.rejected) == (1, 0, 1)
+
+
+def test_queue_timeout():
+    async def main():
+        gate = _Gate(1, 5)
+        assert await gate.enter(1)
+        assert not await gate.enter(0.01)
+        return gate
+
+    gate = asyncio.run(main())
+    assert (gate.active, gate.waiting, gate.rejected) == (1, 0, 1)
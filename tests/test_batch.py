@@ -0,0 +1,14 @@
+import pytest
+from pydantic import ValidationError
+
+from database.models import BatchIn
+
+
+@pytest.mark.parametrize("ids", [[], [0], [2**31], [1, -5]])
+def test_bad_ids(ids):
+    with pytest.raises(ValidationError):
+        BatchIn(ids=ids)
+
+
+def test_int4_ids():
+    assert BatchIn(ids=[1, 2**31 - 1]).ids == [1, 2**31 - 1]
@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+from database.bulk import KINDS, ImportReport, RejectedRow, _int, _phones, _records, detect_format
+
+
+def _write(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_detect_format():
+    assert detect_format("orgs.ndjson") == "ndjson"
+    assert detect_format("orgs.jsonl") == "ndjson"
+    assert detect_format("orgs.csv") == "csv"
+
+
+@pytest.mark.parametrize("value, expected", [
+    ('["2-222-222", " 3-333-333 "]', ["2-222-222", "3-333-333"]),
+    ("2-222-222;8-923-666-13-13", ["2-222-222", "8-923-666-13-13"]),
+    (["2-222-222", ""], ["2-222-222"]),
+])
+def test_phones(value, expected):
+    assert json.loads(_phones(value)) == expected
+
+
+def test_csv_records(tmp_path):
+    path = _write(tmp_path, "buildings.csv", (
+        "id,addr,lat,lon\n"
+        "1,Ленина 1,55.75,37.61\n"
+        "x,Ленина 2,55.75,37.61\n"
+        "3,Ленина 3,95,37.61\n"
+    ))
+    report = ImportReport("buildings")
+    records = list(_records(KINDS["buildings"], path, "csv", report))
+
+    assert records == [(2, 1, "Ленина 1", 55.75, 37.61)]
+    assert report.read == 3 and report.rejected == 2
+    assert report.errors[0].startswith("line 3: not an integer")
+    assert report.errors[1].startswith("line 4: out of range")
+
+
+def test_ndjson_records(tmp_path):
+    path = _write(tmp_path, "organizations.ndjson", "\n".join([
+        json.dumps({"id": 1, "title": "Рога", "phone": ["2-222-222"], "b_id": 1}),
+        "{broken",
+        "[1, 2]",
+        json.dumps({"id": 2, "title": "Копыта", "b_id": 1}),
+        "",
+    ]))
+    report = ImportReport("organizations")
+    records = list(_records(KINDS["organizations"], path, "ndjson", report))
+
+    assert records == [(1, 1, "Рога", '["2-222-222"]', 1)]
+    assert report.rejected == 3
+    assert report.errors[0].startswith("line 2: bad json")
+    assert report.errors[1] == "line 3: not an object"
+    assert report.errors[2] == "line 4: missing column 'phone'"
+
+
+def test_activity_path_depth(tmp_path):
+    path = _write(tmp_path, "activities.ndjson", "\n".join([
+        json.dumps({"id": 1, "label": "Еда", "path": "food.meat.sausage"}),
+        json.dumps({"id": 2, "label": "Глубже", "path": "a.b.c.d"}),
+    ]))
+    report = ImportReport("activities")
+    assert [record[1] for record in _records(KINDS["activities"], path, "ndjson", report)] == [1]
+    assert report.errors == ["line 2: bad activity path: 'a.b.c.d'"]
+
+
+@pytest.mark.parametrize("value", ["2147483648", -2**31 - 1, 10**20])
+def test_int_out_of_int4(value):
+    with pytest.raises(RejectedRow, match="out of range"):
+        _int(value)
@@ -0,0 +1,62 @@
+import asyncio
+
+from database import cache
+from database.cache import MISSING, LRUCache
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_hit_and_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    lru = LRUCache(10, ttl=5)
+
+    _run(lru.set("a", 1, (), lru.version()))
+    assert _run(lru.get("a")) == 1
+
+    now[0] += 5
+    assert _run(lru.get("a")) is MISSING
+    assert lru.stats()["expirations"] == 1
+
+
+def test_lru_eviction():
+    lru = LRUCache(2, ttl=60)
+    _run(lru.set("a", 1, (), 0))
+    _run(lru.set("b", 2, (), 0))
+    _run(lru.get("a")) # "b" становится самым старым
+    _run(lru.set("c", 3, (), 0))
+
+    assert _run(lru.get("b")) is MISSING
+    assert _run(lru.get("a")) == 1
+    assert _run(lru.get("c")) == 3
+    assert lru.stats()["evictions"] == 1
+
+
+def test_invalidate_by_tag():
+    lru = LRUCache(10, ttl=60)
+    _run(lru.set("org-1", 1, ("org:1", "building:5"), 0))
+    _run(lru.set("org-2", 2, ("org:2", "building:5"), 0))
+    _run(lru.set("org-3", 3, ("org:3",), 0))
+
+    _run(lru.invalidate(["building:5"]))
+
+    assert _run(lru.get("org-1")) is MISSING
+    assert _run(lru.get("org-2")) is MISSING
+    assert _run(lru.get("org-3")) == 3
+
+
+def test_set_after_invalidation_is_dropped():
+    # Значение прочитано до инвалидации: класть его в кэш нельзя
+    lru = LRUCache(10, ttl=60)
+    since = lru.version()
+    _run(lru.invalidate(["org:1"]))
+    _run(lru.set("org-1", "stale", ("org:1",), since))
+    assert _run(lru.get("org-1")) is MISSING
+
+
+def test_disabled_cache_stores_nothing():
+    lru = LRUCache(0, ttl=60)
+    _run(lru.set("a", 1, (), 0))
+    assert _run(lru.get("a")) is MISSING
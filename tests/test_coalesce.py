@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from database.coalesce import SingleFlight
+
+
+def _counting(calls, result=42, delay=0.01):
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return result
+    return load
+
+
+def test_concurrent_calls_share_one_load():
+    async def main():
+        flight, calls = SingleFlight(), []
+        load = _counting(calls)
+        return await asyncio.gather(*(flight.run("m", "k", load) for _ in range(3))), calls, flight.stats()
+
+    results, calls, (flights, coalesced) = asyncio.run(main())
+    assert results == [42, 42, 42]
+    assert len(calls) == 1
+    assert flights == {"m": 1} and coalesced == {"m": 2}
+
+
+def test_error_reaches_every_waiter():
+    async def main():
+        flight = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        return await asyncio.gather(flight.run("m", "k", fail), flight.run("m", "k", fail), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_forget_starts_a_new_flight():
+    async def main():
+        flight, calls = SingleFlight(), []
+        load = _counting(calls)
+        first = asyncio.ensure_future(flight.run("m", "k", load))
+        await asyncio.sleep(0)
+        flight.forget()
+        second = asyncio.ensure_future(flight.run("m", "k", load))
+        await asyncio.gather(first, second)
+        return calls
+
+    assert len(asyncio.run(main())) == 2
+
+
+def test_cancelled_leader_does_not_cancel_waiters():
+    async def main():
+        flight, calls = SingleFlight(), []
+        load = _counting(calls, delay=0.05)
+        leader = asyncio.ensure_future(flight.run("m", "k", load))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(flight.run("m", "k", load))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await waiter, calls
+
+    result, calls = asyncio.run(main())
+    assert result == 42
+    assert len(calls) == 2 # ждавший повторил запрос сам
+
+
+def test_disabled_runs_every_call():
+    async def main():
+        flight, calls = SingleFlight(enabled=False), []
+        load = _counting(calls)
+        await asyncio.gather(flight.run("m", "k", load), flight.run("m", "k", load))
+        return calls
+
+    assert len(asyncio.run(main())) == 2
@@ -0,0 +1,78 @@
+import asyncio
+import gzip
+import zlib
+
+import pytest
+
+import compression
+from compression import negotiate
+
+
+@pytest.fixture
+def with_brotli(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", object())
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip, deflate, br", "br"),
+    ("br;q=0.5, gzip", "gzip"),
+    ("*", "br"),
+    ("*, br;q=0", "gzip"),
+    ("gzip;q=0, br;q=0", None),
+    ("identity", None),
+    ("", None),
+])
+def test_negotiate(with_brotli, header, expected):
+    assert negotiate(header) == expected
+
+
+def test_no_brotli_falls_back_to_gzip(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    assert negotiate("br, gzip") == "gzip"
+    assert negotiate("br") is None
+
+
+def _respond(chunks, accept_encoding="gzip", headers=()):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", b"application/json"), *headers
+        ]})
+        for i, chunk in enumerate(chunks):
+            await send({"type": "http.response.body", "body": chunk, "more_body": i < len(chunks) - 1})
+
+    middleware = compression.CompressionMiddleware(app, minimum_size=16)
+    scope = {"type": "http", "headers": [(b"accept-encoding", accept_encoding.encode())]}
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(middleware(scope, None, send))
+    return dict(messages[0]["headers"]), [message["body"] for message in messages[1:]]
+
+
+def test_small_response_is_not_compressed():
+    headers, bodies = _respond([b"{}"])
+    assert b"content-encoding" not in headers and bodies == [b"{}"]
+
+
+def test_gzip_whole_body():
+    body = b'{"items": []}' * 10
+    headers, bodies = _respond([body])
+    assert headers[b"content-encoding"] == b"gzip"
+    assert headers[b"content-length"] == str(len(bodies[0])).encode()
+    assert b"Accept-Encoding" in headers[b"vary"]
+    assert gzip.decompress(bodies[0]) == body
+
+
+def test_gzip_stream_flushes_every_chunk():
+    headers, bodies = _respond([b'{"id": 1}\n', b'{"id": 2}\n', b""], headers=[(b"content-length", b"20")])
+    assert headers[b"content-encoding"] == b"gzip" and b"content-length" not in headers
+    # sync flush: первая строка разжимается, не дожидаясь конца потока
+    assert zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(bodies[0]) == b'{"id": 1}\n'
+    assert gzip.decompress(b"".join(bodies)) == b'{"id": 1}\n{"id": 2}\n'
+
+
+def test_already_encoded_passes_through():
+    headers, bodies = _respond([b"x" * 100], headers=[(b"content-encoding", b"br")])
+    assert headers[b"content-encoding"] == b"br" and bodies == [b"x" * 100]
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from conditional import ConditionalMiddleware, _etag_matches, _not_modified_since
+from database.data_version import DataVersion
+
+LAST_MODIFIED = "Sun, 18 Oct 2026 12:00:00 GMT"
+
+
+@pytest.mark.parametrize("header, expected", [
+    ('*', True),
+    ('W/"v5"', True),
+    ('"v5"', True), # слабое сравнение
+    ('"v4", W/"v5"', True),
+    ('"v4"', False),
+    ('', False),
+])
+def test_etag_matches(header, expected):
+    assert _etag_matches(header, 'W/"v5"') is expected
+
+
+@pytest.mark.parametrize("header, expected", [
+    (LAST_MODIFIED, True),
+    ("Mon, 19 Oct 2026 12:00:00 GMT", True),
+    ("Sat, 17 Oct 2026 12:00:00 GMT", False),
+    ("вчера", False),
+])
+def test_not_modified_since(header, expected):
+    assert _not_modified_since(header, LAST_MODIFIED) is expected
+
+
+async def _app(scope, receive, send):
+    status = 200 if scope["path"].endswith("/ok/") else 404
+    await send({"type": "http.response.start", "status": status, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def _get(path, **headers):
+    middleware = ConditionalMiddleware(
+        _app, authorized=lambda api_key: True, cache_control="",
+        negotiated=("/api/ok/", "/api/missing/"), variant=lambda accept: "ndjson" if "ndjson" in accept else None
+    )
+    scope = {
+        "type": "http", "method": "GET", "path": path,
+        "headers": [(name.encode(), value.encode()) for name, value in headers.items()]
+    }
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(middleware(scope, None, send))
+    return messages[0]["status"], dict(messages[0]["headers"])
+
+
+@pytest.fixture
+def version(monkeypatch):
+    monkeypatch.setattr(DataVersion, "_etag", 'W/"v5"')
+    monkeypatch.setattr(DataVersion, "_last_modified", LAST_MODIFIED)
+
+
+def test_etag_per_variant(version):
+    assert _get("/api/ok/")[1][b"etag"] == b'W/"v5"'
+    assert _get("/api/ok/", accept="application/x-ndjson")[1][b"etag"] == b'W/"v5-ndjson"'
+    assert _get("/api/ok/", accept="application/x-ndjson", **{"if-none-match": 'W/"v5"'})[0] == 200
+    assert _get("/api/ok/", accept="application/x-ndjson", **{"if-none-match": 'W/"v5-ndjson"'})[0] == 304
+
+
+def test_vary_on_every_negotiated_response(version):
+    assert _get("/api/ok/")[1][b"vary"] == b"Accept"
+    assert _get("/api/ok/", **{"if-none-match": 'W/"v5"'})[1][b"vary"] == b"Accept" # 304
+    status, headers = _get("/api/missing/")
+    assert status == 404 and headers == {b"vary": b"Accept"}
+
+
+def test_vary_without_version(monkeypatch):
+    monkeypatch.setattr(DataVersion, "_etag", None)
+    assert _get("/api/ok/")[1] == {b"vary": b"Accept"}
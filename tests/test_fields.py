@@ -0,0 +1,34 @@
+import pytest
+from fastapi import HTTPException
+
+from api import building_fields, organization_fields
+from database.models import BuildingOut, OrganizationOut, sparse_model
+
+
+def test_no_params_keeps_full_response():
+    assert organization_fields(fields=None, include=None) is None
+
+
+def test_fields_and_include():
+    assert organization_fields(fields="id, title", include=None) == {"id", "title"}
+    assert building_fields(fields=None, include="organizations") == {"id", "addr", "lat", "lon", "organizations"}
+
+
+@pytest.mark.parametrize("fields, include", [("id,secret", None), (",", None), (None, "secret")])
+def test_bad_fields(fields, include):
+    with pytest.raises(HTTPException) as error:
+        organization_fields(fields=fields, include=include)
+    assert error.value.status_code == 400
+
+
+def test_sparse_model():
+    model = sparse_model(OrganizationOut, frozenset(("id", "title")))
+    assert model is sparse_model(OrganizationOut, frozenset(("id", "title")))
+    assert set(model.model_fields) == {"id", "title"}
+    assert model.model_validate({"id": 1}).model_dump(exclude_none=True) == {"id": 1}
+
+
+def test_sparse_building_reads_orgs():
+    model = sparse_model(BuildingOut, frozenset(("id", "organizations")))
+    building = model.model_validate({"id": 1, "orgs": [{"id": 2, "title": "Рога", "phone": ["2-222-222"]}]})
+    assert building.organizations[0].id == 2
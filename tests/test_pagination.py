@@ -0,0 +1,45 @@
+import base64
+
+import pytest
+
+from database.pagination import InvalidCursor, decode_cursor, encode_cursor, split_page
+
+
+def test_cursor_roundtrip():
+    assert decode_cursor(encode_cursor(12.5, 7), float, int) == [12.5, 7]
+    assert decode_cursor(encode_cursor("кафе", 3), str, int) == ["кафе", 3]
+
+
+def test_int_is_accepted_as_float():
+    assert decode_cursor(encode_cursor(3, 7), float, int) == [3.0, 7]
+
+
+@pytest.mark.parametrize("cursor, types", [
+    ("not base64 at all!", (int,)),
+    (encode_cursor(1, 2), (int,)), # лишнее значение
+    (encode_cursor("1"), (int,)), # не тот тип
+    (encode_cursor(True), (int,)), # bool — не int
+    (encode_cursor(1.5), (int,)),
+    (encode_cursor(1e3, 99999999999), (float, int)), # id вне int4
+    (encode_cursor(1.0, -2**31 - 1), (float, int)),
+    (encode_cursor(10**400, 1), (float, int)), # не помещается во float
+    (base64.urlsafe_b64encode(b"[NaN]").decode(), (float,)),
+])
+def test_bad_cursor(cursor, types):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor, *types)
+
+
+def test_split_page_without_next():
+    assert split_page([1, 2, 3], 3, lambda row: (row,)) == ([1, 2, 3], None)
+
+
+def test_split_page_with_next():
+    rows, cursor = split_page([1, 2, 3, 4], 3, lambda row: (row,))
+    assert rows == [1, 2, 3]
+    assert decode_cursor(cursor, int) == [3]
+
+
+def test_int4_bounds():
+    assert decode_cursor(encode_cursor(2**31 - 1), int) == [2**31 - 1]
+    assert decode_cursor(encode_cursor(-2**31), int) == [-2**31]
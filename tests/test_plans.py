@@ -0,0 +1,46 @@
+''' Планы радиусных запросов на синтетическом справочнике (нужна база с данными benchmarks.generate):
+
+    cd src && python -m benchmarks.generate --scale 1 --out bench_data --load --truncate
+    PLANS_MANIFEST=src/bench_data/manifest.json python -m pytest tests/test_plans.py
+
+Без PLANS_MANIFEST тесты пропускаются; в CI их запускает job plans (.github/workflows/tests.yml):
+python -m pytest -m postgres. '''
+import asyncio
+import json
+import os
+
+import pytest
+
+MANIFEST = os.environ.get("PLANS_MANIFEST")
+
+pytestmark = [pytest.mark.postgres, pytest.mark.skipif(not MANIFEST, reason="PLANS_MANIFEST is not set")]
+
+
+def _run(names):
+    from benchmarks import plans
+    from config import Config
+    from database.dao import Database
+
+    with open(MANIFEST, encoding="utf-8") as file:
+        manifest = json.load(file)
+
+    async def run():
+        await Database.init(Config.DB_URL, 1)
+        plans.event.listen(Database._engine.sync_engine, "before_cursor_execute", plans._capture)
+        try:
+            return {
+                case.name: await plans.run_case(case, manifest, 1.0, 100.0)
+                for case in plans.CASES if case.name in names
+            }
+        finally:
+            await Database.close()
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("name", ["buildings_within_radius", "organizations_within_radius"])
+def test_radius_uses_geog_index(name):
+    result = _run({name})[name]
+    plan = "\n".join(result["annotated"])
+    assert any("using ix_buildings_geog on buildings" in line for line in result["shape"]), plan
+    assert not result["problems"], plan